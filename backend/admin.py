@@ -35,8 +35,14 @@ class AffectationAdmin(admin.ModelAdmin):
     search_fields = ('eleve_aff__fullname', 'eleve_aff__matricule')
     autocomplete_fields = ['eleve_aff', 'classe_aff', 'annee_aff']
 
+class VersementInline(admin.TabularInline):
+    model = TableVersement
+    extra = 1
+    readonly_fields = ('dateajout',)
+
 @admin.register(TableRecouvrement)
 class RecouvrementAdmin(admin.ModelAdmin):
+    inlines = [VersementInline]
     list_display = ('get_eleve', 'get_classe', 'total_paye', 'reduction')
     search_fields = ('eleve_aff__fullname', 'eleve_aff__matricule')
     autocomplete_fields = ['affectation']
@@ -55,4 +61,6 @@ admin.site.register(TableNiveau)
 admin.site.register(TableOption)
 admin.site.register(TableRole)
 admin.site.register(TablePermission)
-admin.site.register(TableUtilisateur)
\ No newline at end of file
+admin.site.register(TableUtilisateur)
+admin.site.register(TableStatRecouvrement)
+admin.site.register(TableCompteurModif)
@@ -1,5 +1,14 @@
+import atexit
+
 from django.apps import AppConfig
 
 
 class BackendConfig(AppConfig):
     name = 'backend'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .models import TableUtilisateur
+
+        # Dernières connexions encore en attente à l'arrêt du processus
+        atexit.register(TableUtilisateur._enregistrer_connexions_en_tache)
@@ -0,0 +1,125 @@
+"""
+Exports en flux (StreamingHttpResponse) : CSV et XLSX écrits ligne à ligne à partir d'un
+itérable, sans jamais tenir tout le fichier en mémoire.
+
+Le XLSX est un zip écrit dans un tampon vidé au fur et à mesure (zipfile accepte un
+flux sans seek : descripteurs de données après chaque fichier), avec une seule feuille
+en chaînes inline : pas de sharedStrings à construire avant d'écrire.
+"""
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+LIGNES_PAR_MORCEAU = 500
+
+CARACTERES_INTERDITS_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : writerow() renvoie directement la ligne formatée"""
+    def write(self, valeur):
+        return valeur
+
+
+def flux_csv(entetes, lignes, separateur=';'):
+    """
+    Morceaux de texte d'un CSV (BOM UTF-8 et ';' : ouverture directe dans Excel en français),
+    LIGNES_PAR_MORCEAU lignes à la fois.
+    """
+    ecrivain = csv.writer(_Echo(), delimiter=separateur)
+    yield '\ufeff' + ecrivain.writerow(entetes)
+    morceau = []
+    for ligne in lignes:
+        morceau.append(ecrivain.writerow(ligne))
+        if len(morceau) >= LIGNES_PAR_MORCEAU:
+            yield ''.join(morceau)
+            morceau = []
+    if morceau:
+        yield ''.join(morceau)
+
+
+class _Tampon:
+    """Fichier en écriture seule dont flux_xlsx récupère le contenu au fur et à mesure"""
+
+    def __init__(self):
+        self.morceaux = []
+
+    def write(self, donnees):
+        self.morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def flush(self):
+        pass
+
+    def vider(self):
+        donnees = b''.join(self.morceaux)
+        self.morceaux = []
+        return donnees
+
+
+NS_RELATIONS = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_TYPES_DOC = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_FEUILLE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+TYPE_OOXML = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+ENTETE_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+def _parties_xlsx(feuille):
+    return {
+        '[Content_Types].xml': (
+            f'{ENTETE_XML}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{TYPE_OOXML}.sheet.main+xml"/>'
+            f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{TYPE_OOXML}.worksheet+xml"/>'
+            '</Types>'
+        ),
+        '_rels/.rels': (
+            f'{ENTETE_XML}<Relationships xmlns="{NS_RELATIONS}">'
+            f'<Relationship Id="rId1" Type="{NS_TYPES_DOC}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/workbook.xml': (
+            f'{ENTETE_XML}<workbook xmlns="{NS_FEUILLE}" xmlns:r="{NS_TYPES_DOC}">'
+            f'<sheets><sheet name="{escape(feuille[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            f'{ENTETE_XML}<Relationships xmlns="{NS_RELATIONS}">'
+            f'<Relationship Id="rId1" Type="{NS_TYPES_DOC}/worksheet" Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'
+        ),
+    }
+
+
+def _cellule(valeur):
+    if valeur is None:
+        return '<c/>'
+    if isinstance(valeur, (int, float, Decimal)) and not isinstance(valeur, bool):
+        return f'<c><v>{valeur}</v></c>'
+    texte = escape(CARACTERES_INTERDITS_XML.sub('', str(valeur)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texte}</t></is></c>'
+
+
+def _ligne_xml(valeurs):
+    return ('<row>' + ''.join(_cellule(v) for v in valeurs) + '</row>').encode('utf-8')
+
+
+def flux_xlsx(feuille, entetes, lignes):
+    """Morceaux binaires d'un classeur XLSX d'une feuille : entêtes puis `lignes`"""
+    tampon = _Tampon()
+    with zipfile.ZipFile(tampon, 'w', compression=zipfile.ZIP_DEFLATED) as classeur:
+        for nom, contenu in _parties_xlsx(feuille).items():
+            classeur.writestr(nom, contenu)
+        yield tampon.vider()
+
+        with classeur.open('xl/worksheets/sheet1.xml', 'w') as xml:
+            xml.write(f'{ENTETE_XML}<worksheet xmlns="{NS_FEUILLE}"><sheetData>'.encode('utf-8'))
+            xml.write(_ligne_xml(entetes))
+            for i, ligne in enumerate(lignes, 1):
+                xml.write(_ligne_xml(ligne))
+                if i % LIGNES_PAR_MORCEAU == 0:
+                    yield tampon.vider()
+            xml.write(b'</sheetData></worksheet>')
+    yield tampon.vider()
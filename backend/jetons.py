@@ -0,0 +1,118 @@
+"""
+Jetons d'API signés sans état (HMAC-SHA256 avec SECRET_KEY, django.core.signing).
+
+- accès   : {"id", "u", "r"} (id, username, rôle), valable ECO_JETONS['ACCES_TTL'] s
+            -> en-tête `Authorization: Bearer <jeton>`, vérifié sans requête en base
+- refresh : {"id"}, valable ECO_JETONS['REFRESH_TTL'] s
+            -> POST /api/token/refresh/ : relit l'utilisateur et renvoie une nouvelle paire
+
+Révocation : ensemble en mémoire des ids d'utilisateurs désactivés (statut 'Off') ou
+supprimés. Tenu à jour par signal dans ce processus, et relu en base au plus toutes
+les ECO_JETONS['REVOCATION_TTL'] s pour suivre les changements faits par d'autres workers.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+SEL_ACCES = 'backend.jetons.acces'
+SEL_REFRESH = 'backend.jetons.refresh'
+
+
+def _config(cle, defaut):
+    return getattr(settings, 'ECO_JETONS', {}).get(cle, defaut)
+
+
+class UtilisateurJeton:
+    """Utilisateur décrit par un jeton d'accès (request.user), sans lecture en base"""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, charge):
+        self.id = self.pk = charge['id']
+        self.username = charge['u']
+        self.role = charge['r']
+
+    def __str__(self):
+        return self.username
+
+
+def emettre(utilisateur):
+    """Paire de jetons pour un TableUtilisateur (LoginView, rafraîchissement)"""
+    role = utilisateur.role.role if utilisateur.role else "Utilisateur"
+    return {
+        "access": signing.dumps({"id": utilisateur.id, "u": utilisateur.username, "r": role}, salt=SEL_ACCES),
+        "refresh": signing.dumps({"id": utilisateur.id}, salt=SEL_REFRESH),
+        "expires_in": _config('ACCES_TTL', 900),
+    }
+
+
+def lire_acces(jeton):
+    """Charge d'un jeton d'accès ; signing.BadSignature / SignatureExpired sinon"""
+    return signing.loads(jeton, salt=SEL_ACCES, max_age=_config('ACCES_TTL', 900))
+
+
+def lire_refresh(jeton):
+    return signing.loads(jeton, salt=SEL_REFRESH, max_age=_config('REFRESH_TTL', 12 * 3600))
+
+
+# ---------- Révocation ----------
+_revoques = set()
+_supprimes = set()
+_relu_a = None
+_verrou = threading.Lock()
+
+
+def recharger_revocations():
+    global _revoques, _relu_a
+    from .models import TableUtilisateur
+
+    desactives = set(TableUtilisateur.objects.filter(statut='Off').values_list('id', flat=True))
+    with _verrou:
+        _revoques = desactives | _supprimes
+        _relu_a = time.monotonic()
+
+
+def est_revoque(utilisateur_id):
+    if _relu_a is None or time.monotonic() - _relu_a > _config('REVOCATION_TTL', 60):
+        recharger_revocations()
+    return utilisateur_id in _revoques
+
+
+def revoquer(utilisateur_id, supprime=False):
+    with _verrou:
+        _revoques.add(utilisateur_id)
+        if supprime:
+            _supprimes.add(utilisateur_id)
+
+
+def retablir(utilisateur_id):
+    with _verrou:
+        _revoques.discard(utilisateur_id)
+
+
+class JetonAuthentication(BaseAuthentication):
+    """`Authorization: Bearer <jeton d'accès>` : signature, expiration et révocation, sans requête"""
+    mot_cle = b'bearer'
+
+    def authenticate(self, request):
+        entete = get_authorization_header(request).split()
+        if not entete or entete[0].lower() != self.mot_cle:
+            return None
+        if len(entete) != 2:
+            raise AuthenticationFailed("En-tête Authorization invalide")
+        try:
+            charge = lire_acces(entete[1].decode())
+        except signing.SignatureExpired:
+            raise AuthenticationFailed("Jeton expiré")
+        except (signing.BadSignature, UnicodeDecodeError):
+            raise AuthenticationFailed("Jeton invalide")
+        if est_revoque(charge['id']):
+            raise AuthenticationFailed("Compte désactivé")
+        return UtilisateurJeton(charge), charge
+
+    def authenticate_header(self, request):
+        return 'Bearer'
@@ -0,0 +1,384 @@
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from backend.jetons import emettre, lire_acces
+from backend.models import (
+    TableAffectation, TableAnnee, TableClasse, TableEleve, TableFraisScolarite, TableRecouvrement, TableRole,
+    TableStatRecouvrement, TableUtilisateur, TableVersement,
+)
+from backend import views
+
+
+def donnees_synthetiques(nb_recouvrements, nb_classes=30):
+    """
+    Crée une année, `nb_classes` classes et `nb_recouvrements` élèves affectés avec leur
+    dossier, en bulk_create (sans passer par save()). Retourne la liste des recouvrements.
+    """
+    annee = TableAnnee.objects.create(debut=2090, fin=2091)
+    niveaux = [c for c, _ in TableClasse.niveau_choix]
+    options = [c for c, _ in TableClasse.option_choix]
+    classes = TableClasse.objects.bulk_create(
+        TableClasse(code_classe=f"BENCH{i}", lib_classe=f"Classe {i}",
+                    niveau_classe=niveaux[i % len(niveaux)], option_classe=options[i % len(options)])
+        for i in range(nb_classes)
+    )
+    TableFraisScolarite.objects.bulk_create(
+        TableFraisScolarite(annee_fs=annee, classe_fs=c, frais_annuel=300000, t1_fs=100000, t2_fs=100000, t3_fs=100000)
+        for c in classes
+    )
+    eleves = TableEleve.objects.bulk_create(
+        (TableEleve(nom=f"Nom{i}", prenom1=f"Prenom{i}", fullname=f"Prenom{i} Nom{i}", matricule=f"BENCH{i}")
+         for i in range(nb_recouvrements)),
+        batch_size=2000,
+    )
+    affectations = TableAffectation.objects.bulk_create(
+        (TableAffectation(annee_aff=annee, classe_aff=classes[i % nb_classes], eleve_aff=e, etat_aff='Nouv')
+         for i, e in enumerate(eleves)),
+        batch_size=2000,
+    )
+    recs = TableRecouvrement.objects.bulk_create(
+        (TableRecouvrement(affectation=a, frais_paiement=300000, tranche1_paiement=100000,
+                           tranche2_paiement=100000, tranche3_paiement=100000)
+         for a in affectations),
+        batch_size=2000,
+    )
+    TableStatRecouvrement.reconstruire()
+    return recs
+
+
+def appeler(vue, params=None):
+    """Appelle une APIView authentifiée et renvoie (réponse, secondes, nb requêtes)"""
+    requete = APIRequestFactory().get('/', params or {})
+    force_authenticate(requete, user=User(username='bench'))
+    with CaptureQueriesContext(connection) as ctx:
+        debut = time.perf_counter()
+        reponse = vue.as_view()(requete)
+        duree = time.perf_counter() - debut
+    return reponse, duree, len(ctx.captured_queries)
+
+
+def bench_encaissements(cmd, nb):
+    nb = nb or 100000
+    recs = donnees_synthetiques(max(1, nb // 5))
+    debut_annee = date(2090, 10, 1)
+    random.seed(0)
+    TableVersement.objects.bulk_create(
+        (TableVersement(recouvrement=random.choice(recs), montant=random.randrange(5000, 100000, 5000),
+                        date_versement=debut_annee + timedelta(days=random.randrange(270)))
+         for _ in range(nb)),
+        batch_size=5000,
+    )
+    cmd.stdout.write(f"{nb} versements synthétiques")
+
+    for params in ({}, {'du': '2090-11-01', 'au': '2090-11-30'}, {'niveau': 'clg'}):
+        reponse, duree, nb_requetes = appeler(views.EncaissementsAPIView, params)
+        cmd.stdout.write(
+            f"  {params or 'sans filtre'} : {duree * 1000:.1f} ms, {nb_requetes} requête(s), "
+            f"{len(reponse.data['par_jour'])} jours, total {reponse.data['total']}"
+        )
+    plan = TableVersement.objects.filter(date_versement__gte='2090-11-01').values('date_versement').explain()
+    cmd.stdout.write(f"  plan : {plan}")
+
+
+def bench_stats(cmd, nb):
+    nb = nb or 50000
+    recs = donnees_synthetiques(nb, nb_classes=60)
+    random.seed(0)
+    TableVersement.objects.bulk_create(
+        (TableVersement(recouvrement=r, montant=random.randrange(5000, 300000, 5000), date_versement=date(2090, 11, 1))
+         for r in recs[::3]),
+        batch_size=5000,
+    )
+    TableRecouvrement.objects.filter(pk__in=[r.pk for r in recs[::3]]).update(total_paye=Subquery(
+        TableVersement.objects.filter(recouvrement=OuterRef('pk')).values('recouvrement').annotate(s=Sum('montant')).values('s')
+    ))
+    TableStatRecouvrement.reconstruire()
+    cmd.stdout.write(f"{nb} recouvrements, {TableStatRecouvrement.objects.count()} lignes de statistiques")
+
+    for params in ({}, {'annee': '2090-2091', 'niveau': 'clg'}, {'option': 'sm'}):
+        durees = []
+        for _ in range(20):
+            cache.clear()  # mesure du calcul, pas du cache
+            reponse, duree, nb_requetes = appeler(views.StatsRecouvrementAPIView, params)
+            durees.append(duree)
+        durees.sort()
+        cmd.stdout.write(
+            f"  {params or 'sans filtre'} : médiane {durees[len(durees) // 2] * 1000:.2f} ms, "
+            f"{nb_requetes} requête(s), payé {reponse.data['total_paye']} / {reponse.data['total_frais']}"
+        )
+
+
+def bench_exports(cmd, nb):
+    """Export CSV / XLSX des recouvrements : premier octet, durée totale et pic mémoire Python"""
+    import tracemalloc
+    nb = nb or 100000
+    donnees_synthetiques(nb)
+    client = Client()
+    client.force_login(User.objects.create(username="bench-exports"))
+    for extension in ('csv', 'xlsx'):
+        tracemalloc.start()
+        debut = time.perf_counter()
+        reponse = client.get(f'/api/exports/recouvrements.{extension}')
+        flux = iter(reponse.streaming_content)
+        taille = len(next(flux))
+        premier_octet = time.perf_counter() - debut
+        taille += sum(len(morceau) for morceau in flux)
+        duree = time.perf_counter() - debut
+        pic = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        cmd.stdout.write(
+            f"  {extension:<4} : {nb} lignes, {taille / 1e6:.1f} Mo en {duree:.2f} s, "
+            f"premier octet après {premier_octet * 1000:.0f} ms, pic mémoire {pic / 1e6:.1f} Mo"
+        )
+
+
+def bench_recherche(cmd, nb):
+    nb = nb or 100000
+    prenoms = ["Aïssatou", "Mamadou", "Fatoumata", "Ibrahima", "Mariama", "Sékou", "Kadiatou", "Alpha"]
+    noms = ["Diallo", "Barry", "Bah", "Camara", "Soumah", "Touré", "Condé", "Kéita", "Sylla", "Traoré"]
+    random.seed(0)
+    TableEleve.creer_en_masse(
+        [TableEleve(nom=f"{random.choice(noms)}{i % 997}", prenom1=random.choice(prenoms), sexe='F') for i in range(nb)],
+        batch_size=2000,
+    )
+    cmd.stdout.write(f"{TableEleve.objects.count()} élèves")
+
+    for terme in ("dia", "fatoumata tra", "keita12", "zzz"):
+        for libelle, requete in (
+            ("SearchFilter (LIKE '%x%')", lambda: list(TableEleve.objects.filter(
+                Q(fullname__icontains=terme) | Q(matricule__icontains=terme))[:20])),
+            ("rechercher (préfixe)", lambda: list(TableEleve.rechercher(terme, 20))),
+        ):
+            durees = []
+            for _ in range(5):
+                debut = time.perf_counter()
+                resultat = requete()
+                durees.append(time.perf_counter() - debut)
+            cmd.stdout.write(f"  {terme!r:<16} {libelle:<26} : {min(durees) * 1000:7.2f} ms, {len(resultat)} résultat(s)")
+
+
+def bench_import_eleves(cmd, nb):
+    nb = nb or 10000
+    lignes = [
+        {'nom': f"Traoré{i}", 'prenom1': "Fatoumata", 'prenom2': "Aïcha", 'sexe': 'F',
+         'jour_naissance': i % 28 + 1, 'mois_naissance': i % 12 + 1, 'annee_naissance': 2010 + i % 8}
+        for i in range(nb)
+    ]
+
+    echantillon = min(nb, 1000)
+    debut = time.perf_counter()
+    for ligne in lignes[:echantillon]:
+        TableEleve.objects.create(**ligne)
+    un_par_un = (time.perf_counter() - debut) / echantillon
+    cmd.stdout.write(f"  save() un par un : {1 / un_par_un:.0f} élèves/s (échantillon de {echantillon})")
+
+    requete = APIRequestFactory().post('/', lignes, format='json')
+    with CaptureQueriesContext(connection) as ctx:
+        debut = time.perf_counter()
+        reponse = views.EleveViewSet.as_view({'post': 'bulk'})(requete)
+        duree = time.perf_counter() - debut
+    cmd.stdout.write(
+        f"  /api/eleves/bulk/ : {reponse.data['crees']} élèves en {duree:.2f} s "
+        f"({nb / duree:.0f} élèves/s, {len(ctx.captured_queries)} requêtes)"
+    )
+
+
+def bench_promotion(cmd, nb):
+    nb = nb or 5000
+    recs = donnees_synthetiques(nb)
+    source = recs[0].affectation.annee_aff_id
+    cible = TableAnnee.objects.create(debut=2091, fin=2092)
+    classes = sorted({r.affectation.classe_aff_id for r in recs})
+    promotions = dict(zip(classes, classes[1:]))
+    redoublants = [r.affectation.eleve_aff_id for r in recs[::10]]
+
+    for dry_run in (True, False):
+        r = TableAffectation.promouvoir(source, cible.pk, promotions, redoublants, dry_run=dry_run)
+        cmd.stdout.write(
+            f"  {'dry-run' if dry_run else 'réel   '} : {r['affectations_creees']} affectations, "
+            f"{r['recouvrements_crees']} recouvrements en {r['durees']['total']} s"
+        )
+
+
+def bench_auth(cmd, nb):
+    """
+    Coût par requête de l'authentification, pile Django complète (middlewares compris) :
+    GET /api/stats/cache/ (IsAuthenticated) avec une session Django puis avec un jeton signé.
+    """
+    nb = nb or 2000
+    role = TableRole.objects.create(role="BENCH")
+    utilisateur = TableUtilisateur.objects.create(username="bench", contact="BENCH", password="bench", role=role)
+    jeton = emettre(utilisateur)['access']
+
+    client_session = Client()
+    client_session.force_login(User.objects.create(username="bench-session"))
+    client_jeton = Client(HTTP_AUTHORIZATION=f"Bearer {jeton}")
+
+    for libelle, client in (("session Django", client_session), ("jeton signé", client_jeton)):
+        client.get('/api/stats/cache/')  # échauffement (cache, relecture des révocations)
+        with CaptureQueriesContext(connection) as ctx:
+            debut = time.perf_counter()
+            for _ in range(nb):
+                assert client.get('/api/stats/cache/').status_code == 200
+            duree = time.perf_counter() - debut
+        cmd.stdout.write(
+            f"  {libelle:<15} : {duree / nb * 1e6:6.0f} µs/requête, {len(ctx.captured_queries) / nb:.1f} requête(s) SQL par requête"
+        )
+
+    debut = time.perf_counter()
+    for _ in range(nb):
+        lire_acces(jeton)
+    cmd.stdout.write(f"  vérification seule du jeton (HMAC + JSON) : {(time.perf_counter() - debut) / nb * 1e6:.1f} µs")
+
+
+def bench_connexions(cmd, nb):
+    """
+    Débit de POST /api/login/ avec plusieurs postes qui se connectent en même temps :
+    date de connexion écrite à chaque connexion (délai 0) puis par lot.
+    Le hachage (PBKDF2, ~0,5 s de CPU par connexion) n'est pas touché par l'écriture par
+    lot : il est remplacé ici par MD5 pour mesurer le reste du chemin (lecture, écriture).
+    Hors transaction globale : les comptes synthétiques sont supprimés à la fin.
+    """
+    nb = nb or 2000
+    nb_postes = 8
+    hachage_rapide = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    hachage_rapide.enable()
+    comptes = [
+        TableUtilisateur.objects.create(username=f"bench{i}", contact=f"BENCH{i}", password="bench")
+        for i in range(nb_postes * 4)
+    ]
+
+    def poste(numero, a_faire, erreurs):
+        client = Client()
+        try:
+            for i in range(a_faire):
+                compte = comptes[(numero + i * nb_postes) % len(comptes)]
+                reponse = client.post('/api/login/', {'username': compte.username, 'password': 'bench'},
+                                      content_type='application/json')
+                if reponse.status_code != 200:
+                    erreurs.append(reponse.status_code)
+        except Exception as e:
+            erreurs.append(e)
+        finally:
+            connection.close()
+
+    try:
+        for profil, delai in (('UPDATE par connexion', 0), ('écriture par lot', 3600)):
+            with override_settings(ECO_DERNIERE_CONNEXION_DELAI=delai):
+                erreurs = []
+                postes = [threading.Thread(target=poste, args=(n, nb // nb_postes, erreurs)) for n in range(nb_postes)]
+                debut = time.perf_counter()
+                for t in postes:
+                    t.start()
+                for t in postes:
+                    t.join()
+                ecrites = TableUtilisateur.enregistrer_connexions()
+                duree = time.perf_counter() - debut
+            cmd.stdout.write(
+                f"  {profil:<22} : {nb / duree:.0f} connexions/s ({nb} en {duree:.2f} s, {nb_postes} postes, "
+                f"{ecrites} date(s) écrite(s) au vidage final, {len(erreurs)} erreur(s))"
+            )
+    finally:
+        hachage_rapide.disable()
+        connection.close()
+        TableUtilisateur.objects.filter(pk__in=[c.pk for c in comptes]).delete()
+
+
+# Réglages SQLite par défaut (sans ECO_SQLITE_PRAGMAS), pour la mesure "avant"
+PRAGMAS_SQLITE_DEFAUT = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'cache_size': -2000, 'mmap_size': 0, 'temp_store': 'DEFAULT'}
+
+
+def bench_ecritures(cmd, nb):
+    """
+    Débit de TableRecouvrement.save() validés (un commit par enregistrement), par
+    plusieurs caisses en parallèle : réglages SQLite par défaut puis ECO_SQLITE_PRAGMAS.
+    Hors transaction globale : les données synthétiques sont supprimées à la fin.
+    """
+    if connection.vendor != 'sqlite':
+        cmd.stdout.write("  scénario propre à SQLite")
+        return
+    nb = nb or 2000
+    nb_caisses = 4
+    with transaction.atomic():
+        ids = [r.pk for r in donnees_synthetiques(200, nb_classes=4)]
+
+    def caisse(a_faire, erreurs):
+        try:
+            for i in range(a_faire):
+                TableRecouvrement.objects.get(pk=ids[i % len(ids)]).save()
+        except Exception as e:
+            erreurs.append(e)
+        finally:
+            connection.close()
+
+    try:
+        for profil, pragmas in (('défaut SQLite', PRAGMAS_SQLITE_DEFAUT), ('ECO_SQLITE_PRAGMAS', settings.ECO_SQLITE_PRAGMAS)):
+            with override_settings(ECO_SQLITE_PRAGMAS={**pragmas, 'busy_timeout': settings.ECO_SQLITE_PRAGMAS['busy_timeout']}):
+                connection.close()  # les connexions suivantes prennent ces réglages
+                connection.ensure_connection()
+                erreurs = []
+                caisses = [threading.Thread(target=caisse, args=(nb // nb_caisses, erreurs)) for _ in range(nb_caisses)]
+                debut = time.perf_counter()
+                for t in caisses:
+                    t.start()
+                for t in caisses:
+                    t.join()
+                duree = time.perf_counter() - debut
+            cmd.stdout.write(
+                f"  {profil:<20} : {nb / duree:.0f} enregistrements/s ({nb} en {duree:.2f} s, "
+                f"{nb_caisses} caisses, {len(erreurs)} erreur(s))"
+            )
+    finally:
+        connection.close()
+        TableAnnee.objects.filter(debut=2090).delete()
+        TableClasse.objects.filter(code_classe__startswith='BENCH').delete()
+        TableEleve.objects.filter(matricule__startswith='BENCH').delete()
+        TableStatRecouvrement.reconstruire()
+
+
+SCENARIOS = {
+    'auth': bench_auth,
+    'connexions': bench_connexions,
+    'ecritures': bench_ecritures,
+    'encaissements': bench_encaissements,
+    'exports': bench_exports,
+    'import_eleves': bench_import_eleves,
+    'promotion': bench_promotion,
+    'recherche': bench_recherche,
+    'stats': bench_stats,
+}
+
+# Scénarios qui mesurent des commits : ils nettoient eux-mêmes leurs données
+SANS_TRANSACTION = {'connexions', 'ecritures'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesures de performance sur données synthétiques. "
+        "Tout est fait dans une transaction annulée à la fin : la base n'est pas modifiée "
+        "(sauf 'connexions' et 'ecritures', qui suppriment leurs données synthétiques à la fin)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--nb', type=int, default=None, help="Volume de données (selon le scénario)")
+
+    def handle(self, *args, **options):
+        if options['scenario'] in SANS_TRANSACTION:
+            SCENARIOS[options['scenario']](self, options['nb'])
+            return
+        with transaction.atomic():
+            SCENARIOS[options['scenario']](self, options['nb'])
+            transaction.set_rollback(True)
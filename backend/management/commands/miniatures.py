@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+
+from backend.miniatures import traiter
+from backend.models import TableEleve, TableUtilisateur
+
+
+def _traiter(args):
+    try:
+        return traiter(*args)
+    finally:
+        connection.close()  # connexion propre au thread
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les miniatures manquantes (ou toutes avec --toutes) des photos élèves et "
+        "utilisateurs, en parallèle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="threads de génération (4 par défaut, 1 = séquentiel)")
+        parser.add_argument('--toutes', action='store_true', help="régénère aussi les miniatures existantes")
+
+    def handle(self, *args, **options):
+        taches = []
+        for modele in (TableEleve, TableUtilisateur):
+            qs = modele.objects.exclude(photo='').exclude(photo__isnull=True)
+            if not options['toutes']:
+                qs = qs.exclude(photo_miniatures__startswith=Concat(F('photo'), Value('#')))  # voir version_miniatures()
+            taches += [(modele, pk, nom) for pk, nom in qs.values_list('pk', 'photo').iterator()]
+
+        chrono = time.perf_counter()
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                resultats = list(pool.map(_traiter, taches))
+        else:
+            resultats = [traiter(*tache) for tache in taches]
+
+        echecs = resultats.count(False)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(taches) - echecs} photo(s) traitée(s) en {time.perf_counter() - chrono:.2f} s"
+        ))
+        if echecs:
+            self.stdout.write(self.style.WARNING(f"{echecs} photo(s) illisible(s) ou introuvable(s), voir les logs"))
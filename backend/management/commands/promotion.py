@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.models import TableAffectation
+
+
+class Command(BaseCommand):
+    help = (
+        "Réaffecte tous les élèves d'une année scolaire vers la suivante "
+        "(admis -> classe suivante, redoublants -> même classe) et crée leurs recouvrements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('annee_source', help="id ou libellé, ex. 2024-2025")
+        parser.add_argument('annee_cible', help="id ou libellé, ex. 2025-2026")
+        parser.add_argument('--plan', required=True,
+                            help='Fichier JSON {"classe": "classe suivante", ...} (ids ou codes de classe)')
+        parser.add_argument('--redoublants', default='',
+                            help="ids d'élèves séparés par des virgules, ou @fichier (un id par ligne)")
+        parser.add_argument('--dry-run', action='store_true', help="Calcule les comptes sans rien enregistrer")
+
+    def handle(self, *args, **options):
+        with open(options['plan'], encoding='utf-8') as f:
+            promotions = json.load(f)
+
+        redoublants = options['redoublants']
+        if redoublants.startswith('@'):
+            with open(redoublants[1:], encoding='utf-8') as f:
+                redoublants = [l.strip() for l in f if l.strip()]
+        else:
+            redoublants = [e for e in redoublants.split(',') if e.strip()]
+
+        try:
+            parametres = TableAffectation.parametres_promotion(options['annee_source'], options['annee_cible'], promotions, redoublants)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        r = TableAffectation.promouvoir(*parametres, dry_run=options['dry_run'])
+
+        titre = "SIMULATION (rien n'est enregistré)" if r['dry_run'] else "Promotion effectuée"
+        self.stdout.write(self.style.WARNING(titre) if r['dry_run'] else self.style.SUCCESS(titre))
+        self.stdout.write(f"  admis : {r['admis']}, redoublants : {r['redoublants']}, sortants : {r['sortants']}")
+        self.stdout.write(f"  affectations créées : {r['affectations_creees']} (déjà présentes : {r['affectations_existantes']})")
+        self.stdout.write(f"  recouvrements créés : {r['recouvrements_crees']} (déjà présents : {r['recouvrements_existants']})")
+        if r['conflits']:
+            self.stdout.write(self.style.WARNING(f"  conflits (déjà affectés dans une autre classe) : {len(r['conflits'])}"))
+        d = r['durees']
+        self.stdout.write(f"  durée : {d['total']} s (lecture {d['lecture']} s, écriture {d['ecriture']} s)")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import TableStatRecouvrement
+
+
+class Command(BaseCommand):
+    help = "Reconstruit entièrement la table des statistiques de recouvrement (TableStatRecouvrement)"
+
+    def handle(self, *args, **options):
+        nb = TableStatRecouvrement.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{nb} ligne(s) (année, classe) reconstruite(s)"))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.models import TableFraisScolarite, TableRecouvrement
+
+
+class Command(BaseCommand):
+    help = (
+        "Réapplique les grilles de frais (TableFraisScolarite) aux dossiers de recouvrement existants, "
+        "un UPDATE par (année, classe)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annee', type=int, help="id de l'année (toutes par défaut)")
+        parser.add_argument('--classe', type=int, help="id de la classe (toutes par défaut)")
+
+    def handle(self, *args, **options):
+        grilles = TableFraisScolarite.objects.all()
+        if options['annee']:
+            grilles = grilles.filter(annee_fs_id=options['annee'])
+        if options['classe']:
+            grilles = grilles.filter(classe_fs_id=options['classe'])
+
+        chrono = time.perf_counter()
+        total = 0
+        for annee_id, classe_id in grilles.order_by().values_list('annee_fs_id', 'classe_fs_id').distinct():
+            nb, duree = TableRecouvrement.recalculer_frais(annee_id, classe_id)
+            total += nb
+            self.stdout.write(f"  année {annee_id} / classe {classe_id} : {nb} dossier(s) en {duree * 1000:.0f} ms")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} dossier(s) recalculé(s) en {time.perf_counter() - chrono:.2f} s"
+        ))
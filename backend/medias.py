@@ -0,0 +1,132 @@
+"""
+Service des fichiers de MEDIA_ROOT (photos, miniatures) selon settings.ECO_MEDIA['MODE'] :
+- django     : réponse fichier depuis le processus Django (installation sur un seul poste)
+- x-accel    : Django valide et pose les en-têtes, nginx envoie le fichier (X-Accel-Redirect)
+- x-sendfile : idem pour Apache / lighttpd (X-Sendfile)
+- aucun      : pas de route, le proxy sert MEDIA_URL directement
+
+Dans tous les cas : ETag / Last-Modified tirés du stat() du fichier, réponses 304, et
+Cache-Control `private` (photos d'élèves mineurs : jamais dans un cache partagé) :
+- miniatures/ : nommées d'après leur contenu (voir miniatures.py), jamais réécrites
+  -> ECO_MEDIA['MAX_AGE'] (long)
+- le reste (photos téléversées) : un nom peut resservir (photo supprimée puis téléversée
+  à nouveau sous le même nom) -> ECO_MEDIA['MAX_AGE_PHOTOS'] (0 par défaut) et
+  must-revalidate : le navigateur revalide à chaque affichage, 304 sans corps si inchangée.
+Le mode django gère en plus une plage `Range: bytes=a-b` (206).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+TAILLE_BLOC = 64 * 1024
+PLAGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _config(cle, defaut):
+    return getattr(settings, 'ECO_MEDIA', {}).get(cle, defaut)
+
+
+def _cache_control(chemin):
+    if chemin.startswith('miniatures/'):
+        return f"private, max-age={_config('MAX_AGE', 31536000)}"
+    return f"private, max-age={_config('MAX_AGE_PHOTOS', 0)}, must-revalidate"
+
+
+def _etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _plage(entete, taille):
+    """(début, fin incluse) d'un en-tête Range à une seule plage ; None si absent ou non géré ; False si hors fichier"""
+    trouve = PLAGE.match(entete.replace(' ', ''))
+    if not trouve or trouve.groups() == ('', ''):
+        return None  # plusieurs plages ou syntaxe inconnue : réponse complète (RFC 9110)
+    debut, fin = trouve.groups()
+    if not debut:  # bytes=-500 : les 500 derniers octets
+        debut, fin = max(taille - int(fin), 0), taille - 1
+    else:
+        debut, fin = int(debut), min(int(fin), taille - 1) if fin else taille - 1
+    if debut >= taille or debut > fin:
+        return False
+    return debut, fin
+
+
+def _lire(chemin, debut, longueur):
+    with open(chemin, 'rb') as f:
+        f.seek(debut)
+        while longueur > 0:
+            bloc = f.read(min(TAILLE_BLOC, longueur))
+            if not bloc:
+                break
+            longueur -= len(bloc)
+            yield bloc
+
+
+@require_safe
+def servir_media(request, chemin):
+    try:
+        chemin_complet = safe_join(settings.MEDIA_ROOT, chemin)
+        stat = os.stat(chemin_complet)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("Fichier introuvable")
+    if not os.path.isfile(chemin_complet):
+        raise Http404("Fichier introuvable")
+
+    etag = _etag(stat)
+    entetes = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': _cache_control(chemin),
+    }
+
+    inm = request.headers.get('If-None-Match')
+    if inm is not None:
+        non_modifie = inm.strip() == '*' or etag in [e.strip().removeprefix('W/') for e in inm.split(',')]
+    else:
+        non_modifie = not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime)
+    if non_modifie:
+        reponse = HttpResponseNotModified()
+        for nom, valeur in entetes.items():
+            reponse[nom] = valeur
+        return reponse
+
+    type_mime = mimetypes.guess_type(chemin_complet)[0] or 'application/octet-stream'
+    mode = _config('MODE', 'django')
+
+    if mode == 'x-accel':
+        # location interne nginx, ex. : location /media-interne/ { internal; alias <MEDIA_ROOT>/; }
+        reponse = HttpResponse(content_type=type_mime)
+        reponse['X-Accel-Redirect'] = _config('X_ACCEL_PREFIX', '/media-interne/') + quote(chemin)
+    elif mode == 'x-sendfile':
+        reponse = HttpResponse(content_type=type_mime)
+        reponse['X-Sendfile'] = chemin_complet
+    else:
+        plage = None
+        if 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+            plage = _plage(request.headers['Range'], stat.st_size)
+        if plage is False:
+            reponse = HttpResponse(status=416)
+            reponse['Content-Range'] = f"bytes */{stat.st_size}"
+            return reponse
+        if plage:
+            debut, fin = plage
+            reponse = StreamingHttpResponse(_lire(chemin_complet, debut, fin - debut + 1), status=206, content_type=type_mime)
+            reponse['Content-Range'] = f"bytes {debut}-{fin}/{stat.st_size}"
+            reponse['Content-Length'] = fin - debut + 1
+        else:
+            # FileResponse : wsgi.file_wrapper (sendfile) quand le serveur le propose
+            reponse = FileResponse(open(chemin_complet, 'rb'), content_type=type_mime)
+        reponse['Accept-Ranges'] = 'bytes'
+
+    for nom, valeur in entetes.items():
+        reponse[nom] = valeur
+    return reponse
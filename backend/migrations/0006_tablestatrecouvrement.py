@@ -0,0 +1,66 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def remplir_stats(apps, schema_editor):
+    TableAffectation = apps.get_model('backend', 'TableAffectation')
+    TableRecouvrement = apps.get_model('backend', 'TableRecouvrement')
+    TableStatRecouvrement = apps.get_model('backend', 'TableStatRecouvrement')
+
+    lignes = {}
+    for r in TableAffectation.objects.order_by().values('annee_aff_id', 'classe_aff_id').annotate(nb=models.Count('id')):
+        lignes.setdefault((r['annee_aff_id'], r['classe_aff_id']), {})['nb_affectations'] = r['nb']
+
+    rec_rows = (
+        TableRecouvrement.objects.order_by()
+        .values('affectation__annee_aff_id', 'affectation__classe_aff_id')
+        .annotate(
+            nb=models.Count('id'),
+            nb_paye=models.Count('id', filter=models.Q(total_paye__gt=0)),
+            frais=models.Sum('frais_paiement'),
+            paye=models.Sum('total_paye'),
+        )
+    )
+    for r in rec_rows:
+        lignes.setdefault((r['affectation__annee_aff_id'], r['affectation__classe_aff_id']), {}).update(
+            nb_recouvrements=r['nb'],
+            nb_avec_paiement=r['nb_paye'],
+            total_frais=r['frais'] or 0,
+            total_paye=r['paye'] or 0,
+        )
+
+    TableStatRecouvrement.objects.bulk_create(
+        TableStatRecouvrement(annee_id=annee_id, classe_id=classe_id, **totaux)
+        for (annee_id, classe_id), totaux in lignes.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0005_tablerecouvrement_unique_rec'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableStatRecouvrement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nb_affectations', models.IntegerField(default=0, verbose_name='Affectations')),
+                ('nb_recouvrements', models.IntegerField(default=0, verbose_name='Recouvrements')),
+                ('nb_avec_paiement', models.IntegerField(default=0, verbose_name='Dossiers avec paiement')),
+                ('total_frais', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Total frais')),
+                ('total_paye', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Total payé')),
+                ('annee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='backend.tableannee', verbose_name='Année scolaire')),
+                ('classe', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='backend.tableclasse', verbose_name='Classe')),
+            ],
+            options={
+                'verbose_name': 'Statistique de recouvrement',
+                'verbose_name_plural': 'Statistiques de recouvrement',
+                'constraints': [models.UniqueConstraint(fields=('annee', 'classe'), name='unique_stat_rec')],
+            },
+        ),
+        migrations.RunPython(remplir_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,164 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:14
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+NB_COLONNES = 12
+
+
+def colonnes_vers_journal(apps, schema_editor):
+    TableRecouvrement = apps.get_model('backend', 'TableRecouvrement')
+    TableVersement = apps.get_model('backend', 'TableVersement')
+    champs = [f'{p}{n}' for n in range(1, NB_COLONNES + 1) for p in ('v', 'd')]
+
+    lot = []
+    for rec in TableRecouvrement.objects.values('id', *champs).iterator(chunk_size=2000):
+        for n in range(1, NB_COLONNES + 1):
+            if rec[f'v{n}']:
+                lot.append(TableVersement(recouvrement_id=rec['id'], montant=rec[f'v{n}'], date_versement=rec[f'd{n}']))
+        if len(lot) >= 2000:
+            TableVersement.objects.bulk_create(lot)
+            lot = []
+    TableVersement.objects.bulk_create(lot)
+
+
+def journal_vers_colonnes(apps, schema_editor):
+    TableRecouvrement = apps.get_model('backend', 'TableRecouvrement')
+    TableVersement = apps.get_model('backend', 'TableVersement')
+
+    par_rec = {}
+    for v in TableVersement.objects.order_by('recouvrement_id', 'id'):
+        par_rec.setdefault(v.recouvrement_id, []).append(v)
+    for rec_id, versements in par_rec.items():
+        valeurs = {}
+        # Les versements au-delà du 12ème sont cumulés dans v12
+        for n, v in enumerate(versements[:NB_COLONNES], start=1):
+            valeurs[f'v{n}'] = v.montant
+            valeurs[f'd{n}'] = v.date_versement
+        if len(versements) > NB_COLONNES:
+            valeurs[f'v{NB_COLONNES}'] = sum(v.montant for v in versements[NB_COLONNES - 1:])
+        TableRecouvrement.objects.filter(pk=rec_id).update(**valeurs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_tablestatrecouvrement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('montant', models.DecimalField(decimal_places=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Montant')),
+                ('date_versement', models.DateField(blank=True, null=True, verbose_name='Date de versement')),
+                ('dateajout', models.DateTimeField(auto_now_add=True, verbose_name="Date d'ajout")),
+                ('recouvrement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versements', to='backend.tablerecouvrement', verbose_name='Recouvrement')),
+            ],
+            options={
+                'verbose_name': 'Versement',
+                'verbose_name_plural': 'Versements',
+                'ordering': ['date_versement', 'id'],
+                'indexes': [models.Index(fields=['date_versement'], name='versement_date_idx'), models.Index(fields=['recouvrement', 'date_versement'], name='versement_rec_date_idx')],
+            },
+        ),
+        migrations.RunPython(colonnes_vers_journal, journal_vers_colonnes),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v1',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d1',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v2',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d2',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v3',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d3',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v4',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d4',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v5',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d5',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v6',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d6',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v7',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d7',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v8',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d8',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v9',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d9',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v10',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d10',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v11',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d11',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='v12',
+        ),
+        migrations.RemoveField(
+            model_name='tablerecouvrement',
+            name='d12',
+        ),
+    ]
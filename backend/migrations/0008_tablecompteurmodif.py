@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_tableversement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableCompteurModif',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=50, unique=True, verbose_name='Table')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Compteur de modifications',
+                'verbose_name_plural': 'Compteurs de modifications',
+            },
+        ),
+    ]
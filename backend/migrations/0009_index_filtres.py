@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0008_tablecompteurmodif'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tableaffectation',
+            index=models.Index(fields=['annee_aff', 'classe_aff'], name='aff_annee_classe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tableannee',
+            index=models.Index(fields=['annee_scolaire'], name='annee_scolaire_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tableclasse',
+            index=models.Index(fields=['lib_classe'], name='classe_lib_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tableclasse',
+            index=models.Index(fields=['niveau_classe', 'option_classe'], name='classe_niveau_option_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tableeleve',
+            index=models.Index(fields=['prenom1'], name='eleve_prenom1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tableeleve',
+            index=models.Index(fields=['fullname'], name='eleve_fullname_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+from backend.models import cle_recherche
+
+
+def remplir_cles(apps, schema_editor):
+    TableEleve = apps.get_model('backend', 'TableEleve')
+    eleves = list(TableEleve.objects.only('nom', 'prenom1', 'prenom2', 'prenom3'))
+    for e in eleves:
+        prenoms = " ".join(p for p in (e.prenom1, e.prenom2, e.prenom3) if p)
+        e.cle_recherche = cle_recherche(f"{prenoms} {e.nom}")[:100]
+        e.cle_recherche_nom = cle_recherche(f"{e.nom} {prenoms}")[:100]
+    TableEleve.objects.bulk_update(eleves, ['cle_recherche', 'cle_recherche_nom'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0009_index_filtres'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tableeleve',
+            name='cle_recherche',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Clé de recherche'),
+        ),
+        migrations.AddField(
+            model_name='tableeleve',
+            name='cle_recherche_nom',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Clé de recherche (nom)'),
+        ),
+        migrations.AddIndex(
+            model_name='tableeleve',
+            index=models.Index(fields=['cle_recherche'], name='eleve_cle_recherche_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='tableeleve',
+            index=models.Index(fields=['cle_recherche_nom'], name='eleve_cle_recherche_nom_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(remplir_cles, migrations.RunPython.noop),
+    ]
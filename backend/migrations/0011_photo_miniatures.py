@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_eleve_cle_recherche'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tableeleve',
+            name='photo_miniatures',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Miniatures de'),
+        ),
+        migrations.AddField(
+            model_name='tableutilisateur',
+            name='photo_miniatures',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Miniatures de'),
+        ),
+    ]
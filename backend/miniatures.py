@@ -0,0 +1,142 @@
+"""
+Miniatures des photos (TableEleve.photo, TableUtilisateur.photo).
+
+Une miniature par taille de settings.ECO_MINIATURES['TAILLES'] (côté max, en px), nommée
+d'après une empreinte de leur contenu (version) :
+    photoeleves/2026/02/21/abc.jpg -> miniatures/256/photoeleves/2026/02/21/abc.3f9c0a1b2d4e.webp
+
+Générées après le commit dans un pool de threads (Pillow relâche le GIL pendant le
+décodage et le redimensionnement), la requête d'upload n'attend pas. Une fois écrites,
+`photo_miniatures` reçoit "<nom de la photo>#<version>" : tant que le nom diffère de
+`photo` (photo remplacée, génération en cours), urls_miniatures() renvoie None.
+Une régénération au contenu différent (QUALITE, FORMAT...) écrit de nouveaux fichiers :
+une URL déjà servie (et mise en cache, voir medias.py) n'est jamais réécrite.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'WEBP': '.webp', 'JPEG': '.jpg'}
+
+_pool = None
+_verrou_pool = threading.Lock()
+
+
+def _config(cle, defaut):
+    return getattr(settings, 'ECO_MINIATURES', {}).get(cle, defaut)
+
+
+def tailles():
+    return sorted(_config('TAILLES', (64, 256)))
+
+
+def chemin_miniature(nom_photo, taille, version):
+    racine, _ = os.path.splitext(nom_photo)
+    return f"miniatures/{taille}/{racine}.{version}{EXTENSIONS[_config('FORMAT', 'WEBP')]}"
+
+
+def version_miniatures(instance):
+    """Version des miniatures prêtes de instance.photo, ou None (pas de photo / pas encore prêtes)"""
+    nom, separateur, version = instance.photo_miniatures.rpartition('#')
+    if not instance.photo or not separateur or nom != instance.photo.name:
+        return None
+    return version
+
+
+def urls_miniatures(instance, request=None):
+    """{"64": url, "256": url} de la photo de `instance`, ou None (pas de photo / pas encore prêtes)"""
+    version = version_miniatures(instance)
+    if version is None:
+        return None
+    photo = instance.photo
+    urls = {}
+    for taille in tailles():
+        url = photo.storage.url(chemin_miniature(photo.name, taille, version))
+        urls[str(taille)] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def generer(photo):
+    """Écrit les miniatures de `photo` (FieldFile) dans son stockage ; renvoie leur version."""
+    with photo.open('rb'):
+        image = Image.open(photo)
+        # JPEG : décodage directement à l'échelle 1/2, 1/4 ou 1/8 la plus proche (bien plus rapide)
+        image.draft('RGB', (max(tailles()),) * 2)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    format_ = _config('FORMAT', 'WEBP')
+    contenus = {}
+    # De la plus grande à la plus petite : chaque réduction part de la précédente
+    for taille in reversed(tailles()):
+        image.thumbnail((taille, taille), Image.Resampling.LANCZOS)
+        tampon = io.BytesIO()
+        image.save(tampon, format=format_, quality=_config('QUALITE', 80))
+        contenus[taille] = tampon.getvalue()
+
+    version = hashlib.sha256(b''.join(contenus[t] for t in sorted(contenus))).hexdigest()[:12]
+    for taille, contenu in contenus.items():
+        chemin = chemin_miniature(photo.name, taille, version)
+        if not photo.storage.exists(chemin):  # même version déjà écrite : contenu identique
+            photo.storage.save(chemin, ContentFile(contenu))
+    return version
+
+
+def traiter(modele, pk, nom_photo):
+    """
+    Miniatures de la photo `nom_photo` de modele(pk), si c'est toujours la sienne
+    (l'enregistrement a pu être supprimé ou la photo remplacée entre-temps).
+    """
+    instance = modele.objects.filter(pk=pk, photo=nom_photo).first()
+    if instance is None:
+        return False
+    try:
+        version = generer(instance.photo)
+    except (OSError, ValueError):
+        logger.exception("Miniatures impossibles pour %s #%s (%s)", modele.__name__, pk, nom_photo)
+        return False
+    # update() : pas de post_save, donc pas de nouvelle planification
+    modele.objects.filter(pk=pk, photo=nom_photo).update(photo_miniatures=f"{nom_photo}#{version}")
+
+    # Version précédente de la même photo : plus référencée par l'API, fichiers supprimés
+    precedente = version_miniatures(instance)
+    if precedente not in (None, version):
+        for taille in tailles():
+            instance.photo.storage.delete(chemin_miniature(nom_photo, taille, precedente))
+    return True
+
+
+def _tache(modele, pk, nom_photo):
+    try:
+        return traiter(modele, pk, nom_photo)
+    except Exception:
+        logger.exception("Miniatures : échec de la tâche %s #%s", modele.__name__, pk)
+        return False
+    finally:
+        connection.close()  # connexion propre au thread du pool
+
+
+def pool():
+    global _pool
+    with _verrou_pool:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_config('WORKERS', 2), thread_name_prefix='miniatures')
+        return _pool
+
+
+def planifier(instance):
+    """Miniatures de instance.photo après le commit : dans le pool, ou tout de suite si WORKERS = 0."""
+    args = (type(instance), instance.pk, instance.photo.name)
+    if _config('WORKERS', 2) <= 0:
+        transaction.on_commit(lambda: traiter(*args))
+    else:
+        transaction.on_commit(lambda: pool().submit(_tache, *args))
@@ -1,13 +1,49 @@
-from django.db import models, transaction
+from django.conf import settings
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round
+from django.db import connection, models, transaction
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime
-from decimal import Decimal, InvalidOperation
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+import logging
 import re
+import threading
+import time
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 import unicodedata
+from collections import Counter
+from functools import lru_cache
 from django.contrib.auth.models import AbstractUser
-from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.auth.hashers import make_password, check_password, identify_hasher
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=4096)
+def nettoyer_texte(texte):
+    """Sans accents, lettres uniquement, en majuscules : 'Aïssatou' -> 'AISSATOU'"""
+    if not texte: return ""
+    texte_normalise = unicodedata.normalize('NFD', texte)
+    texte_propre = texte_normalise.encode('ascii', 'ignore').decode('utf-8')
+    return re.sub(r'[^a-zA-Z]', '', texte_propre).upper()
+
+def _prefixe(champ, prefixe):
+    """
+    `champ` commence par `prefixe`, sous une forme qui utilise l'index du champ :
+    - PostgreSQL : LIKE 'x%' (index varchar_pattern_ops)
+    - SQLite : intervalle [x, x + U+FFFF[ (LIKE y est insensible à la casse, donc sans index)
+    """
+    if connection.vendor == 'postgresql':
+        return Q(**{f'{champ}__startswith': prefixe})
+    return Q(**{f'{champ}__gte': prefixe, f'{champ}__lt': prefixe + '\uffff'})
+
+
+def cle_recherche(texte):
+    """Clé de recherche : mots sans accents, en majuscules, séparés par un espace ('Marie-Aïcha' -> 'MARIE AICHA')"""
+    if not texte: return ""
+    texte_propre = unicodedata.normalize('NFD', texte).encode('ascii', 'ignore').decode('utf-8')
+    return " ".join(re.split(r'[^A-Z0-9]+', texte_propre.upper())).strip()
 
 # Create your models here.
 class TableAnnee(models.Model):
@@ -32,6 +68,10 @@ class TableAnnee(models.Model):
         verbose_name = "Année scolaire"
         verbose_name_plural = "Années scolaires"
         ordering = ["-debut"]
+        indexes = [
+            # Filtre ?annee=2025-2026 (libellé) des listes et statistiques
+            models.Index(fields=['annee_scolaire'], name='annee_scolaire_idx'),
+        ]
 
     def __str__(self):
         return f'{self.annee_scolaire}'
@@ -95,15 +135,85 @@ class TableUtilisateur(models.Model):
     dateajout = models.DateField(auto_now_add=True, verbose_name="Date d'ajout")
     derniereconnection = models.DateTimeField(null=True, blank=True, verbose_name='Dernière connexion') 
     photo = models.ImageField(upload_to='photousers/', null=True, blank=True, verbose_name="photo")
+    # "<photo>#<version>" des miniatures prêtes (voir backend/miniatures.py)
+    photo_miniatures = models.CharField(max_length=255, blank=True, default="", editable=False, verbose_name="Miniatures de")
     # Champs obligatoires pour Django Auth
 
+    # Dernières connexions pas encore écrites (voir noter_connexion), partagées par les threads du processus
+    _connexions_en_attente = {}
+    _verrou_connexions = threading.Lock()
+    _minuteur_connexions = None
+
+    @staticmethod
+    def est_hache(valeur):
+        """Hachage reconnu par l'un des PASSWORD_HASHERS (pbkdf2, argon2, bcrypt...)"""
+        try:
+            identify_hasher(valeur)
+            return True
+        except ValueError:
+            return False
+
     def save(self, *args, **kwargs):
         # Cette condition vérifie si le mot de passe n'est pas déjà haché
         # pour éviter de hacher un hachage (ce qui rendrait la connexion impossible)
-        if self.password and not self.password.startswith('pbkdf2_sha256$'):
+        if self.password and not self.est_hache(self.password):
             self.password = make_password(self.password)
         super().save(*args, **kwargs)
 
+    def verifier_mot_de_passe(self, mot_de_passe):
+        """
+        check_password, et nouveau hachage transparent si le hacheur préféré ou son
+        nombre d'itérations a changé depuis l'enregistrement (UPDATE de la seule colonne).
+        """
+        def rehacher(brut):
+            self.password = make_password(brut)
+            TableUtilisateur.objects.filter(pk=self.pk).update(password=self.password)
+            logger.info("Mot de passe de %s re-haché (%s)", self.username, identify_hasher(self.password).algorithm)
+
+        return check_password(mot_de_passe, self.password, setter=rehacher)
+
+    @classmethod
+    def noter_connexion(cls, pk, quand=None):
+        """
+        Date de dernière connexion, mise en attente : écrite avec les autres par
+        enregistrer_connexions() ECO_DERNIERE_CONNEXION_DELAI s après la première
+        connexion en attente (0 = tout de suite). Pas d'écriture SQLite par connexion.
+        """
+        delai = getattr(settings, 'ECO_DERNIERE_CONNEXION_DELAI', 30)
+        with cls._verrou_connexions:
+            premiere = not cls._connexions_en_attente
+            cls._connexions_en_attente[pk] = quand or timezone.now()
+            if premiere and delai > 0:
+                cls._minuteur_connexions = threading.Timer(delai, cls._enregistrer_connexions_en_tache)
+                cls._minuteur_connexions.daemon = True
+                cls._minuteur_connexions.start()
+        if delai <= 0:
+            cls.enregistrer_connexions()
+
+    @classmethod
+    def enregistrer_connexions(cls):
+        """Écrit les connexions en attente en un seul UPDATE ; renvoie leur nombre"""
+        with cls._verrou_connexions:
+            attente, cls._connexions_en_attente = cls._connexions_en_attente, {}
+            if cls._minuteur_connexions is not None:
+                cls._minuteur_connexions.cancel()
+                cls._minuteur_connexions = None
+        if not attente:
+            return 0
+        cls.objects.filter(pk__in=attente).update(derniereconnection=Case(
+            *[When(pk=pk, then=Value(quand, output_field=models.DateTimeField())) for pk, quand in attente.items()]
+        ))
+        return len(attente)
+
+    @classmethod
+    def _enregistrer_connexions_en_tache(cls):
+        try:
+            cls.enregistrer_connexions()
+        except Exception:
+            logger.exception("Écriture des dernières connexions impossible")
+        finally:
+            connection.close()  # connexion propre au thread du minuteur
+
     class Meta:
         verbose_name = "Utilisateur"
         verbose_name_plural = "Utilisateurs"
@@ -133,15 +243,18 @@ class TableEleve(models.Model):
     pere = models.CharField(max_length=100,null=True,blank=True, verbose_name="Père")
     mere = models.CharField(max_length=100, null=True, blank=True,verbose_name="Mère")
     photo = models.ImageField(upload_to='photoeleves/%Y/%m/%d/', null=True, blank=True, verbose_name="Photo")
+    # "<photo>#<version>" des miniatures prêtes (voir backend/miniatures.py)
+    photo_miniatures = models.CharField(max_length=255, blank=True, default="", editable=False, verbose_name="Miniatures de")
     dateajout = models.DateField(auto_now_add=True, verbose_name="Date d'ajout")
+    # Recherche par préfixe indexée (voir rechercher) : prénoms puis nom, et nom puis prénoms
+    cle_recherche = models.CharField(max_length=100, blank=True, default="", editable=False, verbose_name="Clé de recherche")
+    cle_recherche_nom = models.CharField(max_length=100, blank=True, default="", editable=False, verbose_name="Clé de recherche (nom)")
 
     def nettoyer_texte(self, texte):
-        if not texte: return ""
-        texte_normalise = unicodedata.normalize('NFD', texte)
-        texte_propre = texte_normalise.encode('ascii', 'ignore').decode('utf-8')
-        return re.sub(r'[^a-zA-Z]', '', texte_propre).upper()
+        return nettoyer_texte(texte)
 
-    def save(self, *args, **kwargs):
+    def calculer_champs(self):
+        """fullname et date_naissance, dérivés des noms / jour / mois / année"""
         prenoms = [self.prenom1]
 
         if self.prenom2:
@@ -150,12 +263,64 @@ class TableEleve(models.Model):
             prenoms.append(self.prenom3)
 
         self.fullname = f"{' '.join(prenoms)} {self.nom}".strip()
+        self.cle_recherche = cle_recherche(self.fullname)[:100]
+        self.cle_recherche_nom = cle_recherche(f"{self.nom} {' '.join(prenoms)}")[:100]
 
         j = str(self.jour_naissance).zfill(2)
         m = str(self.mois_naissance).zfill(2)
         a_full = str(self.annee_naissance).zfill(4)
         self.date_naissance = f"{j}/{m}/{a_full}"
 
+    @classmethod
+    def rechercher(cls, texte, limite=20):
+        """
+        Élèves dont un mot du nom commence par les termes de `texte`, sans accents ni casse :
+        'dia' -> ... DIALLO ; 'aiss dia' -> AISSATOU DIALLO ; ou matricule commençant par `texte`.
+
+        Le premier terme est un préfixe de cle_recherche / cle_recherche_nom (ou du matricule)
+        : parcours d'index ; les termes suivants filtrent ce sous-ensemble. Pas de tri : trier
+        toutes les correspondances d'un préfixe court ('d') coûterait plus que la recherche.
+        """
+        termes = cle_recherche(texte).split()
+        if not termes:
+            return cls.objects.none()
+
+        premier = termes[0]
+        q = _prefixe('cle_recherche', premier) | _prefixe('cle_recherche_nom', premier)
+        if len(termes) == 1:
+            q |= _prefixe('matricule', premier)
+        qs = cls.objects.filter(q)
+        for terme in termes[1:]:
+            qs = qs.filter(Q(cle_recherche__startswith=terme) | Q(cle_recherche__contains=f" {terme}"))
+        return qs.order_by()[:limite]
+
+    def generer_matricule(self, annee_ajout=None):
+        """
+        Lettres des noms + date de naissance + sexe + PK + année d'ajout.
+        Nécessite le PK : appelé après l'insertion (save() ou import en masse).
+        """
+        n = self.nettoyer_texte(self.nom)[:2]
+        p1 = self.nettoyer_texte(self.prenom1)[:2]
+
+        res_lettres = n + p1
+
+        if self.prenom2:
+            res_lettres += self.nettoyer_texte(self.prenom2)[:2]
+        if self.prenom3:
+            res_lettres += self.nettoyer_texte(self.prenom3)[:2]
+
+        j = str(self.jour_naissance).zfill(2)
+        m = str(self.mois_naissance).zfill(2)
+        a_full = str(self.annee_naissance).zfill(4)
+        res_date_naiss = f"{j}{m}{a_full[-2:]}"
+        res_ordre = str(self.pk) # 🔥 utilisation du PK
+        res_annee_ajout = str(annee_ajout or datetime.now().year)[-2:]
+
+        return f"{res_lettres}{res_date_naiss}{self.sexe}{res_ordre}{res_annee_ajout}"
+
+    def save(self, *args, **kwargs):
+        self.calculer_champs()
+
         with transaction.atomic():
             # Sauvegarde initiale pour obtenir le PK
             is_new = self.pk is None
@@ -163,29 +328,46 @@ class TableEleve(models.Model):
 
             # Génération matricule seulement si nouvel élève
             if is_new and not self.matricule:
+                self.matricule = self.generer_matricule()
+                super().save(update_fields=['matricule'])
 
-                n = self.nettoyer_texte(self.nom)[:2]
-                p1 = self.nettoyer_texte(self.prenom1)[:2]
-
-                res_lettres = n + p1
-
-                if self.prenom2:
-                    res_lettres += self.nettoyer_texte(self.prenom2)[:2]
-                if self.prenom3:
-                    res_lettres += self.nettoyer_texte(self.prenom3)[:2]
-
-                res_date_naiss = f"{j}{m}{a_full[-2:]}"
-                res_ordre = str(self.pk) # 🔥 utilisation du PK
-                res_annee_ajout = str(datetime.now().year)[-2:]
-
-                self.matricule = f"{res_lettres}{res_date_naiss}{self.sexe}{res_ordre}{res_annee_ajout}"
+    @classmethod
+    def creer_en_masse(cls, eleves, batch_size=500):
+        """
+        Insère une liste d'élèves non sauvegardés en deux passes groupées :
+        bulk_create (PK), puis mise à jour groupée des matricules (même format que save()).
+        """
+        annee_ajout = datetime.now().year
+        for eleve in eleves:
+            eleve.calculer_champs()
 
-                super().save(update_fields=['matricule'])
+        with transaction.atomic():
+            eleves = cls.objects.bulk_create(eleves, batch_size=batch_size)
+            a_numeroter = [e for e in eleves if not e.matricule]
+            for eleve in a_numeroter:
+                eleve.matricule = eleve.generer_matricule(annee_ajout)
+            # UPDATE ... WHERE id = %s en executemany : bulk_update() construit un CASE WHEN
+            # par ligne, dont le coût Python domine l'import.
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"UPDATE {connection.ops.quote_name(cls._meta.db_table)} SET matricule = %s WHERE id = %s",
+                    [(e.matricule, e.pk) for e in a_numeroter],
+                )
+            TableCompteurModif.incrementer(cls)
+        return eleves
 
     class Meta:
         verbose_name = "Elève"
         verbose_name_plural = "Elèves"
         ordering = ["prenom1"]
+        indexes = [
+            # Tri par défaut (prenom1) et tri secondaire des affectations ; recherche exacte / par préfixe du nom
+            models.Index(fields=['prenom1'], name='eleve_prenom1_idx'),
+            models.Index(fields=['fullname'], name='eleve_fullname_idx'),
+            # TableEleve.rechercher (opclasses : LIKE 'x%' indexé sur PostgreSQL, ignoré ailleurs)
+            models.Index(fields=['cle_recherche'], name='eleve_cle_recherche_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['cle_recherche_nom'], name='eleve_cle_recherche_nom_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"{self.fullname} ({self.matricule})"
@@ -201,6 +383,11 @@ class TableClasse(models.Model):
     class Meta:
         verbose_name = "Classe"
         verbose_name_plural = "Classes"
+        indexes = [
+            # Filtres ?classe=<libellé>, ?niveau=, ?niveau=&option=
+            models.Index(fields=['lib_classe'], name='classe_lib_idx'),
+            models.Index(fields=['niveau_classe', 'option_classe'], name='classe_niveau_option_idx'),
+        ]
 
     def __str__(self):
         return f"{self.code_classe} {self.lib_classe}"
@@ -216,6 +403,30 @@ class TableFraisScolarite(models.Model):
     class Meta:
         verbose_name = "Frais de scolarité"
         verbose_name_plural = "Frais de scolarité"
+
+    # Cache local au processus : (annee_id, classe_id) -> (grille ou None, version lue).
+    # Une entrée ne sert que si la version TableCompteurModif des frais n'a pas bougé
+    # depuis sa lecture : une grille modifiée par un autre worker n'est jamais réappliquée.
+    _cache = {}
+
+    @classmethod
+    def pour(cls, annee_id, classe_id):
+        """
+        Grille de frais de (annee_id, classe_id), comme filter(...).first(), mise en cache.
+        Coût d'un appel servi par le cache : la lecture du compteur (ligne unique indexée).
+        """
+        cle = (annee_id, classe_id)
+        version = TableCompteurModif.versions(cls)[cls._meta.model_name]
+        entree = cls._cache.get(cle)
+        if entree and entree[1] == version:
+            return entree[0]
+        frais = cls.objects.filter(annee_fs_id=annee_id, classe_fs_id=classe_id).order_by('id').first()
+        cls._cache[cle] = (frais, version)
+        return frais
+
+    @classmethod
+    def vider_cache(cls):
+        cls._cache.clear()
     
     def __str__(self):
         return f"{self.annee_fs.annee_scolaire} {self.classe_fs.lib_classe} {self.frais_annuel} {self.t1_fs} {self.t2_fs} {self.t3_fs}"
@@ -235,13 +446,178 @@ class TableAffectation(models.Model):
             models.UniqueConstraint(fields=['eleve_aff', 'classe_aff', 'annee_aff'], name='unique_affectation1'),
             models.UniqueConstraint(fields=['eleve_aff', 'annee_aff'], name='unique_affectation2'),
         ]
+        indexes = [
+            # Filtre année (+ classe) des listes, promotions et stats ; premier terme du tri par défaut
+            models.Index(fields=['annee_aff', 'classe_aff'], name='aff_annee_classe_idx'),
+        ]
 
 
         ordering = ['-annee_aff', 'eleve_aff__prenom1']
 
+    def save(self, *args, **kwargs):
+        ancien = None
+        if self.pk:
+            ancien = TableAffectation.objects.filter(pk=self.pk).values('annee_aff_id', 'classe_aff_id').first()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Mise à jour incrémentale des statistiques (voir TableStatRecouvrement)
+            if ancien is None:
+                TableStatRecouvrement.appliquer(self.annee_aff_id, self.classe_aff_id, nb_affectations=1)
+            elif (ancien['annee_aff_id'], ancien['classe_aff_id']) != (self.annee_aff_id, self.classe_aff_id):
+                TableStatRecouvrement.deplacer_affectation(
+                    self.pk, (ancien['annee_aff_id'], ancien['classe_aff_id']), (self.annee_aff_id, self.classe_aff_id)
+                )
+
     def __str__(self):
         return f"{self.eleve_aff.fullname} {self.eleve_aff.matricule} {self.classe_aff.lib_classe} {self.annee_aff.annee_scolaire}"
 
+    @classmethod
+    def affecter_en_masse(cls, lignes, batch_size=500):
+        """
+        Affecte en une transaction une liste de dicts {eleve_aff, classe_aff, annee_aff, etat_aff}
+        (ids) et crée les dossiers de recouvrement manquants.
+
+        Équivalent groupé de get_or_create sur unique_affectation2 (élève, année) : une
+        affectation existante n'est jamais modifiée ; si sa classe diffère, la ligne est
+        signalée dans `conflits`. Les frais sont lus en une requête pour tout le lot.
+        """
+        uniques = {}
+        for l in lignes:
+            uniques.setdefault((l['eleve_aff'], l['annee_aff']), l)
+        lignes = list(uniques.values())
+        eleves = {l['eleve_aff'] for l in lignes}
+        annees = {l['annee_aff'] for l in lignes}
+
+        with transaction.atomic():
+            existantes = {
+                (a.eleve_aff_id, a.annee_aff_id): a
+                for a in cls.objects.filter(eleve_aff_id__in=eleves, annee_aff_id__in=annees).order_by()
+            }
+            nouvelles = [
+                cls(eleve_aff_id=l['eleve_aff'], classe_aff_id=l['classe_aff'], annee_aff_id=l['annee_aff'],
+                    etat_aff=l.get('etat_aff') or 'Nouv')
+                for l in lignes if (l['eleve_aff'], l['annee_aff']) not in existantes
+            ]
+            conflits = [
+                {**l, 'classe_actuelle': existantes[(l['eleve_aff'], l['annee_aff'])].classe_aff_id}
+                for l in lignes
+                if (l['eleve_aff'], l['annee_aff']) in existantes
+                and existantes[(l['eleve_aff'], l['annee_aff'])].classe_aff_id != l['classe_aff']
+            ]
+            cls.objects.bulk_create(nouvelles, batch_size=batch_size)
+
+            # PK des nouvelles lignes renseignés par bulk_create (RETURNING), comme TableEleve.creer_en_masse
+            nouvelles_par_cle = {(a.eleve_aff_id, a.annee_aff_id): a for a in nouvelles}
+            affectations = [existantes.get(cle) or nouvelles_par_cle[cle] for cle in uniques]
+            recouvrements = TableRecouvrement.creer_pour_affectations(affectations, batch_size=batch_size)
+
+            for (annee_id, classe_id), nb in Counter((a.annee_aff_id, a.classe_aff_id) for a in nouvelles).items():
+                TableStatRecouvrement.appliquer(annee_id, classe_id, nb_affectations=nb)
+            if nouvelles:
+                TableCompteurModif.incrementer(cls)
+
+        return {
+            'affectations_creees': len(nouvelles),
+            'affectations_existantes': len(lignes) - len(nouvelles),
+            'recouvrements_crees': len(recouvrements),
+            'recouvrements_existants': len(affectations) - len(recouvrements),
+            'conflits': conflits,
+        }
+
+    @staticmethod
+    def parametres_promotion(annee_source, annee_cible, promotions, redoublants):
+        """
+        Résout les paramètres d'une promotion (API, commande `promotion`) : années par id ou
+        libellé, classes par id ou code -> arguments de promouvoir() :
+        (annee_source_id, annee_cible_id, {classe_id: classe_id}, [eleve_id]). ValueError si invalide.
+        """
+        def annee_id(valeur, nom):
+            qs = TableAnnee.objects.filter(pk=int(valeur)) if str(valeur).isdigit() else TableAnnee.objects.filter(annee_scolaire=valeur)
+            pk = qs.values_list('pk', flat=True).first()
+            if pk is None:
+                raise ValueError(f"{nom} introuvable : {valeur}")
+            return pk
+
+        source, cible = annee_id(annee_source, "annee_source"), annee_id(annee_cible, "annee_cible")
+        if source == cible:
+            raise ValueError("annee_source et annee_cible doivent être différentes")
+
+        if not isinstance(promotions, dict):
+            raise ValueError("promotions : objet {classe: classe suivante} attendu")
+        if not isinstance(redoublants, (list, tuple)):
+            raise ValueError("redoublants : liste d'ids d'élèves attendue")
+
+        codes = dict(TableClasse.objects.values_list('code_classe', 'pk'))
+        ids = set(codes.values())
+
+        def classe_id(valeur):
+            # Code (toujours une chaîne) ou id ; un code tout en chiffres ne masque jamais l'id d'une autre classe
+            texte = str(valeur).strip()
+            par_code = codes.get(texte)
+            par_id = int(texte) if texte.isdigit() and int(texte) in ids else None
+            if par_code and par_id and par_code != par_id:
+                raise ValueError(f"Classe ambiguë : {texte} (code de la classe {par_code}, id d'une autre classe)")
+            return par_code or par_id
+
+        plan, inconnues = {}, []
+        for classe, suivante in promotions.items():
+            ids_paire = classe_id(classe), classe_id(suivante)
+            inconnues += [str(v) for v, pk in zip((classe, suivante), ids_paire) if pk is None]
+            plan[ids_paire[0]] = ids_paire[1]
+        if inconnues:
+            raise ValueError(f"Classes introuvables : {', '.join(inconnues)}")
+
+        try:
+            redoublants = [int(e) for e in redoublants]
+        except (TypeError, ValueError):
+            raise ValueError("redoublants : liste d'ids d'élèves attendue")
+
+        return source, cible, plan, redoublants
+
+    @classmethod
+    def promouvoir(cls, annee_source, annee_cible, promotions, redoublants=(), dry_run=False):
+        """
+        Réaffecte toute une année scolaire vers la suivante en une passe :
+        - élève dans `redoublants` (ids) -> même classe, etat 'red'
+        - sinon, classe présente dans `promotions` {classe_id: classe_suivante_id} -> classe suivante, etat 'adm'
+        - sinon (classe terminale, classe absente du plan) -> sortant, aucune affectation
+
+        Les affectations et recouvrements sont créés par affecter_en_masse(). En dry_run,
+        tout est exécuté puis annulé : les comptes renvoyés sont exacts.
+        """
+        chrono = time.perf_counter()
+        redoublants = set(redoublants)
+        lignes, sortants = [], 0
+        source = cls.objects.filter(annee_aff_id=annee_source, classe_aff__isnull=False).order_by().values_list('eleve_aff_id', 'classe_aff_id')
+        for eleve_id, classe_id in source:
+            if eleve_id in redoublants:
+                lignes.append({'eleve_aff': eleve_id, 'classe_aff': classe_id, 'annee_aff': annee_cible, 'etat_aff': 'red'})
+            elif classe_id in promotions:
+                lignes.append({'eleve_aff': eleve_id, 'classe_aff': promotions[classe_id], 'annee_aff': annee_cible, 'etat_aff': 'adm'})
+            else:
+                sortants += 1
+        duree_lecture = time.perf_counter() - chrono
+
+        with transaction.atomic():
+            resultat = cls.affecter_en_masse(lignes)
+            if dry_run:
+                transaction.set_rollback(True)
+
+        resultat.update({
+            'dry_run': dry_run,
+            'admis': sum(1 for l in lignes if l['etat_aff'] == 'adm'),
+            'redoublants': sum(1 for l in lignes if l['etat_aff'] == 'red'),
+            'sortants': sortants,
+            'durees': {
+                'lecture': round(duree_lecture, 3),
+                'ecriture': round(time.perf_counter() - chrono - duree_lecture, 3),
+                'total': round(time.perf_counter() - chrono, 3),
+            },
+        })
+        return resultat
+
 class TableRecouvrement(models.Model):
     statut_ar_choix = [('Ins', 'Inscription'),('Reins', 'Réinscription'),('Aut', 'Autre'),]
     affectation = models.ForeignKey(TableAffectation,on_delete=models.CASCADE, null=True, blank=True, verbose_name="Effectation")
@@ -259,30 +635,6 @@ class TableRecouvrement(models.Model):
     adresse_tuteur_paiement = models.CharField(max_length=300, null=True, blank=True, verbose_name="Adresse")
     profession_tuteur_paiement = models.CharField(max_length=100, null=True, blank=True, verbose_name="Profession")
     total_paye = models.DecimalField(max_digits=10, decimal_places=0,default=0, validators=[MinValueValidator(0)], verbose_name="Total payé")
-    v1 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 1")
-    d1 = models.DateField(null=True, blank=True, verbose_name="Date v.1")
-    v2 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 2")
-    d2 = models.DateField(null=True, blank=True, verbose_name="Date v.2")
-    v3 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 3")
-    d3 = models.DateField(null=True, blank=True, verbose_name="Date v.3")
-    v4 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 4")
-    d4 = models.DateField(null=True, blank=True, verbose_name="Date v.4")
-    v5 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 5")
-    d5 = models.DateField(null=True, blank=True, verbose_name="Date v.5")
-    v6 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 6")
-    d6 = models.DateField(null=True, blank=True, verbose_name="Date v.6")
-    v7 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 7")
-    d7 = models.DateField(null=True, blank=True, verbose_name="Date v.7")
-    v8 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 8")
-    d8 = models.DateField(null=True, blank=True, verbose_name="Date v.8")
-    v9 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 9")
-    d9 = models.DateField(null=True, blank=True, verbose_name="Date v.9")
-    v10 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 10")
-    d10 = models.DateField(null=True, blank=True, verbose_name="Date v.10")
-    v11 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 11")
-    d11 = models.DateField(null=True, blank=True, verbose_name="Date v.11")
-    v12 = models.DecimalField(max_digits=10, decimal_places=0, default=0, blank=True, verbose_name="Vers. 12")
-    d12 = models.DateField(null=True, blank=True, verbose_name="Date v.12")
 
     class Meta:
         verbose_name = "Recouvrement"
@@ -291,37 +643,167 @@ class TableRecouvrement(models.Model):
             models.UniqueConstraint(fields=['affectation'], name='unique_rec'),
         ]
 
-    def save(self, *args, **kwargs):
-        if self.affectation and self.affectation.annee_aff and self.affectation.classe_aff:
-            frais = TableFraisScolarite.objects.filter(
-                annee_fs=self.affectation.annee_aff,
-                classe_fs=self.affectation.classe_aff
-            ).first()
+    def save(self, *args, frais=None, **kwargs):
+        """
+        `frais` : grille TableFraisScolarite déjà chargée (appelants en lot) ;
+        sinon lue dans le cache TableFraisScolarite.pour().
+        """
+        if self.affectation and self.affectation.annee_aff_id and self.affectation.classe_aff_id:
+            if frais is None:
+                frais = TableFraisScolarite.pour(self.affectation.annee_aff_id, self.affectation.classe_aff_id)
     
             if frais:
-                reduction = Decimal(self.reduction or 0) / Decimal(100)
-                reduction = max(Decimal(0), min(Decimal(1), reduction))
-                multiplier = Decimal(1) - reduction
-    
-                self.frais_paiement = frais.frais_annuel * multiplier
-                self.tranche1_paiement = frais.t1_fs * multiplier
-                self.tranche2_paiement = frais.t2_fs * multiplier
-                self.tranche3_paiement = frais.t3_fs * multiplier
+                self.appliquer_frais(frais)
             else:
-                print("❌ Aucun frais trouvé pour cette classe et année")
+                logger.warning("Aucun frais trouvé pour l'affectation %s (année / classe)", self.affectation_id)
     
         else:
-            print("❌ Affectation incomplète (année ou classe manquante)")
-    
-        # Total payé
-        versements = [
-            self.v1, self.v2, self.v3, self.v4, self.v5, self.v6,
-            self.v7, self.v8, self.v9, self.v10, self.v11, self.v12
-        ]
-        self.total_paye = sum(v or Decimal(0) for v in versements)
+            logger.warning("Affectation %s incomplète (année ou classe manquante)", self.affectation_id)
     
-        super().save(*args, **kwargs)
+        ancien = None
+        if self.pk:
+            ancien = TableRecouvrement.objects.filter(pk=self.pk).values(
+                'affectation__annee_aff_id', 'affectation__classe_aff_id', 'frais_paiement', 'total_paye'
+            ).first()
+
+        # Total payé : tenu par le journal TableVersement (voir recalculer_total_paye),
+        # jamais par une instance potentiellement périmée.
+        self.total_paye = ancien['total_paye'] if ancien else Decimal(0)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Mise à jour incrémentale des statistiques (voir TableStatRecouvrement),
+            # sans écriture si ni la ligne concernée ni les frais n'ont changé (tuteur, statut...)
+            cle_ancienne = ancien and (ancien['affectation__annee_aff_id'], ancien['affectation__classe_aff_id'])
+            if ancien and cle_ancienne == self.cle_stats() and ancien['frais_paiement'] == self.frais_paiement:
+                return
+            if ancien:
+                TableStatRecouvrement.appliquer(
+                    *cle_ancienne,
+                    **TableStatRecouvrement.contribution(ancien['frais_paiement'], ancien['total_paye'], signe=-1)
+                )
+            TableStatRecouvrement.appliquer(
+                *self.cle_stats(), **TableStatRecouvrement.contribution(self.frais_paiement, self.total_paye)
+            )
+
+    def appliquer_frais(self, frais):
+        """frais_paiement et tranches d'après la grille `frais` (TableFraisScolarite), réduction déduite"""
+        reduction = Decimal(self.reduction or 0) / Decimal(100)
+        reduction = max(Decimal(0), min(Decimal(1), reduction))
+        multiplier = Decimal(1) - reduction
+
+        # Arrondis comme les colonnes (decimal_places=0) : valeur en mémoire = valeur stockée,
+        # sinon les deltas de TableStatRecouvrement mélangeraient les deux
+        def montant(valeur):
+            return (valeur * multiplier).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+
+        self.frais_paiement = montant(frais.frais_annuel)
+        self.tranche1_paiement = montant(frais.t1_fs)
+        self.tranche2_paiement = montant(frais.t2_fs)
+        self.tranche3_paiement = montant(frais.t3_fs)
+
+    def cle_stats(self):
+        """(annee_id, classe_id) de la ligne de TableStatRecouvrement concernée"""
+        if self.affectation_id is None:
+            return (None, None)
+        return (self.affectation.annee_aff_id, self.affectation.classe_aff_id)
+
+    @classmethod
+    def creer_pour_affectations(cls, affectations, batch_size=500):
+        """
+        Crée en masse les dossiers manquants pour `affectations`, frais et tranches
+        calculés d'après une seule lecture des grilles TableFraisScolarite concernées.
+        """
+        deja = set(cls.objects.filter(affectation__in=affectations).values_list('affectation_id', flat=True))
+        a_creer = [a for a in affectations if a.pk not in deja]
+
+        grilles = {}
+        for f in TableFraisScolarite.objects.filter(
+            annee_fs_id__in={a.annee_aff_id for a in a_creer}, classe_fs_id__in={a.classe_aff_id for a in a_creer}
+        ).order_by('id'):
+            grilles.setdefault((f.annee_fs_id, f.classe_fs_id), f)  # comme .first() dans save()
+
+        recouvrements = []
+        for a in a_creer:
+            rec = cls(affectation=a)
+            frais = grilles.get((a.annee_aff_id, a.classe_aff_id))
+            if frais:
+                rec.appliquer_frais(frais)
+            recouvrements.append(rec)
+
+        with transaction.atomic():
+            cls.objects.bulk_create(recouvrements, batch_size=batch_size)
+
+            deltas = {}
+            for rec in recouvrements:
+                cle = (rec.affectation.annee_aff_id, rec.affectation.classe_aff_id)
+                for k, v in TableStatRecouvrement.contribution(rec.frais_paiement, rec.total_paye).items():
+                    deltas.setdefault(cle, Counter())[k] += v
+            for (annee_id, classe_id), d in deltas.items():
+                TableStatRecouvrement.appliquer(annee_id, classe_id, **d)
+            if recouvrements:
+                TableCompteurModif.incrementer(cls)
+        return recouvrements
+
+    @classmethod
+    def recalculer_frais(cls, annee_id, classe_id):
+        """
+        Réapplique la grille de (annee_id, classe_id) à tous ses dossiers en un seul UPDATE,
+        la réduction de chaque ligne étant appliquée par la base :
+            frais = ROUND(grille * (100 - reduction) / 100)
+        (division non entière puis arrondi à l'unité, comme appliquer_frais() : même valeur que save())
+        Sans grille, les dossiers sont laissés tels quels (comme save()).
+        Retourne (nombre de lignes modifiées, durée en secondes).
+        """
+        chrono = time.perf_counter()
+        frais = None
+        if annee_id and classe_id:
+            frais = TableFraisScolarite.objects.filter(annee_fs_id=annee_id, classe_fs_id=classe_id).order_by('id').first()
+        if frais is None:
+            return 0, time.perf_counter() - chrono
 
+        reduction = Greatest(Least(Coalesce(models.F('reduction'), Value(Decimal(0))), Value(Decimal(100))), Value(Decimal(0)))
+
+        def montant(valeur):
+            # Cast en flottant : sur SQLite, entier / 100 serait une division entière.
+            # Puis arrondi à l'unité comme appliquer_frais() (décimal : demi vers le haut aussi sur PostgreSQL)
+            brut = Cast(Value(valeur) * (Value(Decimal(100)) - reduction), models.FloatField()) / Value(100.0)
+            return Round(Cast(brut, models.DecimalField(max_digits=14, decimal_places=2)))
+
+        dossiers = cls.objects.filter(affectation__annee_aff_id=annee_id, affectation__classe_aff_id=classe_id)
+        with transaction.atomic():
+            nb = dossiers.update(
+                frais_paiement=montant(frais.frais_annuel),
+                tranche1_paiement=montant(frais.t1_fs),
+                tranche2_paiement=montant(frais.t2_fs),
+                tranche3_paiement=montant(frais.t3_fs),
+            )
+            TableStatRecouvrement.objects.filter(annee_id=annee_id, classe_id=classe_id).update(
+                total_frais=dossiers.aggregate(total=models.Sum('frais_paiement'))['total'] or 0
+            )
+            if nb:
+                TableCompteurModif.incrementer(cls)
+        return nb, time.perf_counter() - chrono
+
+    def recalculer_total_paye(self):
+        """
+        total_paye = SUM(versements.montant), calculé par la base.
+        Appelé après chaque ajout / modification / suppression de versement.
+        """
+        with transaction.atomic():
+            ancien = TableRecouvrement.objects.select_for_update().filter(pk=self.pk).values_list('total_paye', flat=True).first()
+            if ancien is None:
+                return
+            self.total_paye = self.versements.aggregate(total=models.Sum('montant'))['total'] or Decimal(0)
+            TableRecouvrement.objects.filter(pk=self.pk).update(total_paye=self.total_paye)
+            TableCompteurModif.incrementer(TableRecouvrement)
+
+            TableStatRecouvrement.appliquer(
+                *self.cle_stats(),
+                nb_avec_paiement=int(self.total_paye > 0) - int(ancien > 0),
+                total_paye=self.total_paye - ancien,
+            )
     
     def __str__(self):
         # On initialise avec une valeur par défaut sécurisée
@@ -337,4 +819,216 @@ class TableRecouvrement(models.Model):
             if self.affectation.classe_aff:
                 classe_display = self.affectation.classe_aff.lib_classe
 
-        return f"Paiement de {eleve_display} - {matricule_display} / {classe_display} {self.affectation.annee_aff.annee_scolaire}"
\ No newline at end of file
+        return f"Paiement de {eleve_display} - {matricule_display} / {classe_display} {self.affectation.annee_aff.annee_scolaire}"
+
+
+class TableVersement(models.Model):
+    """
+    Journal des versements d'un dossier de recouvrement (un versement = une ligne).
+    Remplace les anciennes colonnes v1..v12 / d1..d12 de TableRecouvrement.
+    """
+    recouvrement = models.ForeignKey(TableRecouvrement, on_delete=models.CASCADE, related_name='versements', verbose_name="Recouvrement")
+    montant = models.DecimalField(max_digits=10, decimal_places=0, validators=[MinValueValidator(0)], verbose_name="Montant")
+    date_versement = models.DateField(null=True, blank=True, verbose_name="Date de versement")
+    dateajout = models.DateTimeField(auto_now_add=True, verbose_name="Date d'ajout")
+
+    class Meta:
+        verbose_name = "Versement"
+        verbose_name_plural = "Versements"
+        ordering = ['date_versement', 'id']
+        indexes = [
+            models.Index(fields=['date_versement'], name='versement_date_idx'),
+            models.Index(fields=['recouvrement', 'date_versement'], name='versement_rec_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        ancien_rec_id = None
+        if self.pk:
+            ancien_rec_id = TableVersement.objects.filter(pk=self.pk).values_list('recouvrement_id', flat=True).first()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.recouvrement.recalculer_total_paye()
+            if ancien_rec_id and ancien_rec_id != self.recouvrement_id:
+                TableRecouvrement.objects.get(pk=ancien_rec_id).recalculer_total_paye()
+
+    def __str__(self):
+        return f"{self.montant} le {self.date_versement or '?'} ({self.recouvrement_id})"
+
+
+class TableStatRecouvrement(models.Model):
+    """
+    Totaux de recouvrement matérialisés par (année, classe).
+
+    Tenu à jour dans la même transaction que les écritures :
+    - TableAffectation.save() / suppression  -> nb_affectations
+    - TableRecouvrement.save() / suppression -> nb_recouvrements, nb_avec_paiement, total_frais, total_paye
+    Reconstruction complète : `python manage.py rebuild_stats_recouvrement`
+    """
+    annee = models.ForeignKey(TableAnnee, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Année scolaire")
+    classe = models.ForeignKey(TableClasse, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Classe")
+    nb_affectations = models.IntegerField(default=0, verbose_name="Affectations")
+    nb_recouvrements = models.IntegerField(default=0, verbose_name="Recouvrements")
+    nb_avec_paiement = models.IntegerField(default=0, verbose_name="Dossiers avec paiement")
+    total_frais = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="Total frais")
+    total_paye = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="Total payé")
+
+    CHAMPS_TOTAUX = ('nb_affectations', 'nb_recouvrements', 'nb_avec_paiement', 'total_frais', 'total_paye')
+
+    class Meta:
+        verbose_name = "Statistique de recouvrement"
+        verbose_name_plural = "Statistiques de recouvrement"
+        constraints = [
+            models.UniqueConstraint(fields=['annee', 'classe'], name='unique_stat_rec'),
+        ]
+
+    def __str__(self):
+        return f"{self.annee} / {self.classe} : {self.total_paye} / {self.total_frais}"
+
+    @staticmethod
+    def contribution(frais, paye, signe=1):
+        """Part d'un dossier de recouvrement dans les totaux de sa ligne"""
+        paye = paye or Decimal(0)
+        return {
+            'nb_recouvrements': signe,
+            'nb_avec_paiement': signe if paye > 0 else 0,
+            'total_frais': signe * (frais or Decimal(0)),
+            'total_paye': signe * paye,
+        }
+
+    @classmethod
+    def appliquer(cls, annee_id, classe_id, **deltas):
+        """Ajoute `deltas` (positifs ou négatifs) à la ligne (annee_id, classe_id)"""
+        deltas = {k: v for k, v in deltas.items() if v}
+        if not deltas:
+            return
+        ligne = cls.objects.filter(annee_id=annee_id, classe_id=classe_id)
+        maj = {k: models.F(k) + v for k, v in deltas.items()}
+        with transaction.atomic():
+            if not ligne.update(**maj):
+                _, cree = cls.objects.get_or_create(annee_id=annee_id, classe_id=classe_id, defaults=deltas)
+                if not cree:
+                    ligne.update(**maj)
+
+    @classmethod
+    def deplacer_affectation(cls, affectation_id, ancienne_cle, nouvelle_cle):
+        """Une affectation change d'année ou de classe : ses totaux suivent"""
+        deltas = {'nb_affectations': 1}
+        for rec in TableRecouvrement.objects.filter(affectation_id=affectation_id).values('frais_paiement', 'total_paye'):
+            for k, v in cls.contribution(rec['frais_paiement'], rec['total_paye']).items():
+                deltas[k] = deltas.get(k, 0) + v
+        cls.appliquer(*ancienne_cle, **{k: -v for k, v in deltas.items()})
+        cls.appliquer(*nouvelle_cle, **deltas)
+
+    @classmethod
+    def reconstruire(cls):
+        """Recalcule toute la table à partir des affectations et recouvrements"""
+        lignes = {}
+
+        def ligne(cle):
+            return lignes.setdefault(cle, dict.fromkeys(cls.CHAMPS_TOTAUX, 0))
+
+        for r in TableAffectation.objects.order_by().values('annee_aff_id', 'classe_aff_id').annotate(nb=models.Count('id')):
+            ligne((r['annee_aff_id'], r['classe_aff_id']))['nb_affectations'] = r['nb']
+
+        rec_rows = (
+            TableRecouvrement.objects.order_by()
+            .values('affectation__annee_aff_id', 'affectation__classe_aff_id')
+            .annotate(
+                nb=models.Count('id'),
+                nb_paye=models.Count('id', filter=models.Q(total_paye__gt=0)),
+                frais=models.Sum('frais_paiement'),
+                paye=models.Sum('total_paye'),
+            )
+        )
+        for r in rec_rows:
+            l = ligne((r['affectation__annee_aff_id'], r['affectation__classe_aff_id']))
+            l['nb_recouvrements'] = r['nb']
+            l['nb_avec_paiement'] = r['nb_paye']
+            l['total_frais'] = r['frais'] or 0
+            l['total_paye'] = r['paye'] or 0
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                cls(annee_id=annee_id, classe_id=classe_id, **totaux)
+                for (annee_id, classe_id), totaux in lignes.items()
+            )
+            # Pas de signal suivi ici : les statistiques en cache (clés dérivées du
+            # compteur de TableRecouvrement) ne doivent pas survivre à la reconstruction
+            TableCompteurModif.incrementer(TableRecouvrement)
+        return len(lignes)
+
+
+class _IncrementsAuCommit:
+    """Rappel on_commit unique d'une transaction : tables dont la version augmente au commit"""
+
+    def __init__(self):
+        self.tables = set()
+        self.execute = False
+
+    def __call__(self):
+        self.execute = True
+        TableCompteurModif.incrementer_tables(self.tables)
+
+
+class TableCompteurModif(models.Model):
+    """
+    Compteur de modifications par table (une ligne par modèle suivi).
+
+    Incrémenté pour chaque écriture :
+    - save() / suppression unitaires  -> signaux (voir signals.py, MODELES_SUIVIS)
+    - écritures groupées (bulk_create, update) -> appel explicite à incrementer()
+    Dans une transaction, une seule fois par table et au commit : la ligne du compteur
+    n'est pas verrouillée pendant les écritures (caisses concurrentes).
+    Sert à construire des ETag / clés de cache sans relire les tables elles-mêmes.
+    """
+    table = models.CharField(max_length=50, unique=True, verbose_name="Table")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Version")
+
+    # Versions qui valident un cache servant à écrire (TableFraisScolarite.pour) :
+    # incrémentées dans la transaction, atomiquement avec la donnée. Écritures rares.
+    TABLES_IMMEDIATES = {'tablefraisscolarite'}
+
+    class Meta:
+        verbose_name = "Compteur de modifications"
+        verbose_name_plural = "Compteurs de modifications"
+
+    def __str__(self):
+        return f"{self.table} : {self.version}"
+
+    @classmethod
+    def incrementer(cls, *modeles):
+        tables = {m._meta.model_name for m in modeles}
+        immediates = tables & cls.TABLES_IMMEDIATES
+        if immediates:
+            cls.incrementer_tables(immediates)
+        differees = tables - immediates
+        if not differees:
+            return
+        connexion = transaction.get_connection()
+        rappel = next((f for _, f, _ in connexion.run_on_commit if isinstance(f, _IncrementsAuCommit) and not f.execute), None)
+        if rappel is None:
+            # Hors transaction, on_commit() exécute le rappel tout de suite
+            rappel = _IncrementsAuCommit()
+            rappel.tables.update(differees)
+            transaction.on_commit(rappel)
+        else:
+            rappel.tables.update(differees)
+
+    @classmethod
+    def incrementer_tables(cls, tables):
+        """+1 sur la version de chaque table (model_name), tout de suite"""
+        for table in sorted(tables):
+            with transaction.atomic():
+                if not cls.objects.filter(table=table).update(version=models.F('version') + 1):
+                    _, cree = cls.objects.get_or_create(table=table, defaults={'version': 1})
+                    if not cree:
+                        cls.objects.filter(table=table).update(version=models.F('version') + 1)
+
+    @classmethod
+    def versions(cls, *modeles):
+        """{model_name: version} des modèles demandés (0 si jamais modifié), en une requête"""
+        tables = [m._meta.model_name for m in modeles]
+        lues = dict(cls.objects.filter(table__in=tables).values_list('table', 'version'))
+        return {t: lues.get(t, 0) for t in tables}
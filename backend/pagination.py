@@ -0,0 +1,89 @@
+from django.conf import settings
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+def _config(cle, defaut):
+    return getattr(settings, 'ECO_PAGINATION', {}).get(cle, defaut)
+
+
+class PaginationParPage(PageNumberPagination):
+    """
+    ?page=3&page_size=50  ->  OFFSET classique (permet de sauter à une page précise)
+    """
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return _config('MAX_PAGE_SIZE', 500)
+
+
+class PaginationCurseur(CursorPagination):
+    """
+    ?cursor=...  ->  pagination par clé (id croissant)
+
+    Chaque page est un `WHERE id > dernier_id LIMIT n` : coût constant quelle que
+    soit la position, et stable même si des lignes sont insérées entre deux pages.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return _config('MAX_PAGE_SIZE', 500)
+
+
+class EcoPagination(BasePagination):
+    """
+    Pagination par défaut des ViewSets du router.
+
+    - ?mode=cursor (ou ?cursor=...)   -> PaginationCurseur
+    - ?page=... ou ?page_size=...     -> PaginationParPage
+    - aucun paramètre                 -> liste complète si ECO_PAGINATION['OPTIONNELLE']
+                                         (compatibilité avec les pages Next.js actuelles),
+                                         sinon PaginationParPage.
+
+    Pour désactiver la pagination d'une petite table de référence :
+    `pagination_class = None` sur le ViewSet.
+    """
+    mode_query_param = 'mode'
+
+    def __init__(self):
+        self.delegue = None
+
+    def _choisir(self, request):
+        params = request.query_params
+        if params.get(self.mode_query_param) == 'cursor' or PaginationCurseur.cursor_query_param in params:
+            return PaginationCurseur()
+        if PaginationParPage.page_query_param in params or PaginationParPage.page_size_query_param in params:
+            return PaginationParPage()
+        if _config('OPTIONNELLE', True):
+            return None
+        return PaginationParPage()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.delegue = self._choisir(request)
+        if self.delegue is None:
+            return None
+        return self.delegue.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegue.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return PaginationParPage().get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.delegue.to_html() if self.delegue else ''
+
+    def get_results(self, data):
+        return data['results']
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            PaginationParPage().get_schema_operation_parameters(view)
+            + PaginationCurseur().get_schema_operation_parameters(view)[:1]
+        )
+
+    @property
+    def display_page_controls(self):
+        return self.delegue is not None and getattr(self.delegue, 'display_page_controls', False)
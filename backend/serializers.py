@@ -1,53 +1,127 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
+from .miniatures import urls_miniatures
 from .models import *
 
-class AnneeSerializer(serializers.ModelSerializer):
+
+def _noms_param(valeur):
+    return {n.strip() for n in (valeur or '').split(',') if n.strip()}
+
+
+def champs_demandes(params):
+    """(?fields=, ?omit=) de la requête, en ensembles de noms. Vides si absents."""
+    return _noms_param(params.get('fields')), _noms_param(params.get('omit'))
+
+
+class ChampsDynamiquesMixin:
+    """
+    Sérialisation partielle en lecture :
+    - ?fields=id,fullname  -> seulement ces champs
+    - ?omit=versements     -> tous les champs sauf ceux-là
+    Noms inconnus ignorés. Ne s'applique qu'au serializer racine d'un GET : les
+    serializers imbriqués (eleve_details...) et les écritures restent complets.
+
+    `relations_champs` : relations lues par les champs que le serializer ne peut pas
+    déduire de `source` (SerializerMethodField), voir relations_utilisees().
+    """
+    relations_champs = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        fields, omit = champs_demandes(request.query_params)
+        for nom in list(self.fields):
+            if (fields and nom not in fields) or nom in omit:
+                self.fields.pop(nom)
+
+    def relations_utilisees(self):
+        """
+        Chemins de relations ('affectation__eleve_aff', 'versements'...) lus par les
+        champs conservés : ce qu'il reste à joindre (select_related / prefetch_related).
+        """
+        chemins = set()
+        for nom, champ in self.fields.items():
+            if nom in self.relations_champs:
+                chemins.update(self.relations_champs[nom])
+                continue
+            if champ.source == '*':
+                continue
+            attributs = champ.source.split('.')
+            if isinstance(champ, serializers.PrimaryKeyRelatedField):
+                attributs = attributs[:-1]  # lit seulement la colonne <fk>_id
+            modele, chemin = self.Meta.model, []
+            for attr in attributs:
+                try:
+                    relation = modele._meta.get_field(attr)
+                except FieldDoesNotExist:
+                    break
+                if not relation.is_relation:
+                    break
+                chemin.append(attr)
+                chemins.add('__'.join(chemin))
+                modele = relation.related_model
+        return chemins
+
+class AnneeSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = TableAnnee
         fields = '__all__'
 
-class NiveauSerializer(serializers.ModelSerializer):
+class NiveauSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = TableNiveau
         fields = '__all__'
 
-class OptionSerializer(serializers.ModelSerializer):
+class OptionSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = TableOption
         fields = '__all__'
 
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = TableRole
         fields = '__all__'
 
-class PermissionSerializer(serializers.ModelSerializer):
+class PermissionSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = TablePermission
         fields = '__all__'
 
-class UtilisateurSerializer(serializers.ModelSerializer):
+class UtilisateurSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     role_nom = serializers.ReadOnlyField(source='role.role')
+    # {"64": url, "256": url} (null tant que les miniatures ne sont pas prêtes)
+    photo_thumb = serializers.SerializerMethodField()
     
     class Meta:
         model = TableUtilisateur
-        fields = '__all__'
+        exclude = ('photo_miniatures',)
         extra_kwargs = {'password': {'write_only': True}} # Sécurité : ne jamais renvoyer le mdp
 
-class EleveSerializer(serializers.ModelSerializer):
+    def get_photo_thumb(self, obj):
+        return urls_miniatures(obj, self.context.get('request'))
+
+class EleveSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     # Les champs calculés (fullname, date_naissance) sont automatiquement inclus 
     # car ils sont définis dans le save() ou comme propriétés
+    # {"64": url, "256": url} (null tant que les miniatures ne sont pas prêtes)
+    photo_thumb = serializers.SerializerMethodField()
+
     class Meta:
         model = TableEleve
-        fields = '__all__'
+        exclude = ('cle_recherche', 'cle_recherche_nom', 'photo_miniatures')  # usage interne
         read_only_fields = ('matricule', 'fullname', 'date_naissance')
 
-class ClasseSerializer(serializers.ModelSerializer):
+    def get_photo_thumb(self, obj):
+        return urls_miniatures(obj, self.context.get('request'))
+
+class ClasseSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = TableClasse
         fields = ['id', 'code_classe', 'lib_classe', 'niveau_classe', 'option_classe']
 
-class FraisScolariteSerializer(serializers.ModelSerializer):
+class FraisScolariteSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     classe_libelle = serializers.ReadOnlyField(source='classe_fs.lib_classe')
     annee_libelle = serializers.ReadOnlyField(source='annee_fs.annee_scolaire')
     classe_niveau = serializers.ReadOnlyField(source='classe_fs.niveau_classe')
@@ -57,7 +131,7 @@ class FraisScolariteSerializer(serializers.ModelSerializer):
         model = TableFraisScolarite
         fields = '__all__'
 
-class AffectationSerializer(serializers.ModelSerializer):
+class AffectationSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     eleve_details = EleveSerializer(source='eleve_aff', read_only=True)
     classe_nom = serializers.ReadOnlyField(source='classe_aff.lib_classe')
     annee_nom = serializers.ReadOnlyField(source='annee_aff.annee_scolaire')
@@ -70,9 +144,17 @@ class AffectationSerializer(serializers.ModelSerializer):
         fields = '__all__'
         depth = 0
 
-class RecouvrementSerializer(serializers.ModelSerializer):
+class VersementSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    class Meta:
+        model = TableVersement
+        fields = '__all__'
+
+class RecouvrementSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     # 1. DÉCLARER LE CHAMP ICI (C'est ce qui manque !)
     affectation_details = serializers.SerializerMethodField()
+    relations_champs = {
+        'affectation_details': ('affectation__eleve_aff', 'affectation__annee_aff', 'affectation__classe_aff'),
+    }
     affectation_id = serializers.ReadOnlyField(source='affectation.id')
      # Expose à plat pour le front :
     annee_nom = serializers.ReadOnlyField(source='affectation.annee_aff.annee_scolaire')
@@ -86,11 +168,13 @@ class RecouvrementSerializer(serializers.ModelSerializer):
     # Harmoniser les noms des montants:
     frais_total = serializers.ReadOnlyField(source='frais_paiement')
     montant_paye = serializers.ReadOnlyField(source='total_paye')
+    # Journal des versements (ajout via POST /api/recouvrements/<id>/versements/)
+    versements = VersementSerializer(many=True, read_only=True)
 
     class Meta:
         model = TableRecouvrement
         fields = '__all__' # affectation_details sera inclus automatiquement ici
-        read_only_fields = ('tranche1_paiement', 'tranche2_paiement', 'tranche3_paiement')
+        read_only_fields = ('tranche1_paiement', 'tranche2_paiement', 'tranche3_paiement', 'total_paye')
         
     def get_affectation_details(self, obj):
         if obj.affectation and obj.affectation.eleve_aff:
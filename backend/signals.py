@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import jetons
+from .miniatures import planifier as planifier_miniatures, version_miniatures
+from .models import (
+    TableAffectation, TableAnnee, TableClasse, TableCompteurModif, TableEleve, TableFraisScolarite, TableRecouvrement,
+    TableStatRecouvrement, TableUtilisateur, TableVersement,
+)
+
+
+# Les suppressions passent par des signaux (et non par delete()) pour couvrir aussi
+# les suppressions en cascade (élève -> affectations -> recouvrements) et en masse.
+
+@receiver(pre_delete, sender=TableRecouvrement)
+def stats_recouvrement_cle(sender, instance, **kwargs):
+    # En cascade, l'affectation peut être supprimée avant le post_delete du recouvrement
+    instance._cle_stats = instance.cle_stats()
+
+
+@receiver(post_delete, sender=TableRecouvrement)
+def stats_recouvrement_supprime(sender, instance, **kwargs):
+    TableStatRecouvrement.appliquer(
+        *instance._cle_stats,
+        **TableStatRecouvrement.contribution(instance.frais_paiement, instance.total_paye, signe=-1)
+    )
+
+
+@receiver(post_delete, sender=TableVersement)
+def versement_supprime(sender, instance, origin=None, **kwargs):
+    # Suppression en cascade du dossier : son total disparaît avec lui (voir ci-dessus)
+    if isinstance(origin, TableVersement) or getattr(origin, 'model', None) is TableVersement:
+        TableRecouvrement.objects.get(pk=instance.recouvrement_id).recalculer_total_paye()
+
+
+@receiver(post_delete, sender=TableAffectation)
+def stats_affectation_supprimee(sender, instance, **kwargs):
+    TableStatRecouvrement.appliquer(instance.annee_aff_id, instance.classe_aff_id, nb_affectations=-1)
+
+
+@receiver(post_delete, sender=TableAnnee)
+@receiver(post_delete, sender=TableClasse)
+def stats_reference_supprimee(sender, instance, **kwargs):
+    # Les affectations passent à NULL par un UPDATE en masse (SET_NULL) : on reconstruit.
+    TableStatRecouvrement.reconstruire()
+
+
+@receiver(pre_save, sender=TableFraisScolarite)
+def frais_cle_precedente(sender, instance, **kwargs):
+    instance._cle_precedente = None
+    if instance.pk:
+        instance._cle_precedente = TableFraisScolarite.objects.filter(pk=instance.pk).values_list('annee_fs_id', 'classe_fs_id').first()
+
+
+@receiver(post_save, sender=TableFraisScolarite)
+def frais_propages(sender, instance, **kwargs):
+    # Les dossiers existants suivent la nouvelle grille (et l'ancienne (année, classe) si elle a changé)
+    cles = {(instance.annee_fs_id, instance.classe_fs_id), getattr(instance, '_cle_precedente', None)} - {None}
+    with transaction.atomic():
+        for annee_id, classe_id in cles:
+            TableRecouvrement.recalculer_frais(annee_id, classe_id)
+
+
+@receiver(post_save, sender=TableEleve)
+@receiver(post_save, sender=TableUtilisateur)
+def photo_enregistree(sender, instance, update_fields=None, **kwargs):
+    # Nouvelle photo (ou miniatures manquantes) : génération hors de la requête.
+    # Enregistrements partiels sans la photo (matricule de TableEleve.save(), dernière
+    # connexion...) ignorés : une seule génération par photo, sans écritures concurrentes.
+    if update_fields is not None and 'photo' not in update_fields:
+        return
+    if instance.photo and version_miniatures(instance) is None:
+        planifier_miniatures(instance)
+
+
+@receiver(post_save, sender=TableUtilisateur)
+def utilisateur_statut(sender, instance, **kwargs):
+    # Jetons d'accès d'un compte désactivé refusés tout de suite dans ce processus
+    if instance.statut == 'Off':
+        jetons.revoquer(instance.pk)
+    else:
+        jetons.retablir(instance.pk)
+
+
+@receiver(post_delete, sender=TableUtilisateur)
+def utilisateur_supprime(sender, instance, **kwargs):
+    jetons.revoquer(instance.pk, supprime=True)
+
+
+# Compteurs de modifications (ETag du tableau de bord, cache des statistiques)
+MODELES_SUIVIS = (
+    TableAnnee, TableClasse, TableEleve, TableAffectation, TableRecouvrement, TableVersement, TableFraisScolarite,
+)
+
+
+def compteur_modif(sender, **kwargs):
+    TableCompteurModif.incrementer(sender)
+
+
+for _modele in MODELES_SUIVIS:
+    post_save.connect(compteur_modif, sender=_modele, dispatch_uid=f'compteur_save_{_modele._meta.model_name}')
+    post_delete.connect(compteur_modif, sender=_modele, dispatch_uid=f'compteur_delete_{_modele._meta.model_name}')
+
+
+@receiver(connection_created)
+def pragmas_sqlite(sender, connection, **kwargs):
+    """Réglages SQLite de settings.ECO_SQLITE_PRAGMAS, à chaque nouvelle connexion"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nom, valeur in getattr(settings, 'ECO_SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f"PRAGMA {nom} = {valeur}")
@@ -1,3 +1,1219 @@
-from django.test import TestCase
+import io
+import json
+import os
+import threading
+from tempfile import NamedTemporaryFile
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q, Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import *
+from .views import StatsRecouvrementAPIView, _apply_filters_aff, _apply_filters_rec
+
+
+def creer_donnees(nb_eleves, annee=None, classe=None, frais=True):
+    """
+    Crée `nb_eleves` élèves affectés dans une même classe/année,
+    avec leur dossier de recouvrement.
+    """
+    annee = annee or TableAnnee.objects.create(debut=2025, fin=2026)
+    classe = classe or TableClasse.objects.create(
+        code_classe=f"C{TableClasse.objects.count() + 1}", lib_classe="6ème A",
+        niveau_classe='clg', option_classe='aut',
+    )
+    if frais:
+        TableFraisScolarite.objects.get_or_create(
+            annee_fs=annee, classe_fs=classe,
+            defaults={'frais_annuel': 300000, 't1_fs': 100000, 't2_fs': 100000, 't3_fs': 100000},
+        )
+    recouvrements = []
+    for i in range(nb_eleves):
+        eleve = TableEleve.objects.create(nom=f"Diallo{i}", prenom1="Aïssatou", sexe='F')
+        aff = TableAffectation.objects.create(annee_aff=annee, classe_aff=classe, eleve_aff=eleve, etat_aff='Nouv')
+        recouvrements.append(TableRecouvrement.objects.create(affectation=aff))
+    return annee, classe, recouvrements
+
+
+class ListeSansNPlusUnTests(TestCase):
+    """Le nombre de requêtes des listes ne doit pas dépendre du nombre de lignes."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _compter_requetes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_recouvrements_nombre_constant_de_requetes(self):
+        annee, classe, _ = creer_donnees(2)
+        peu = self._compter_requetes('/api/recouvrements/')
+        creer_donnees(20, annee=annee, classe=classe)
+        beaucoup = self._compter_requetes('/api/recouvrements/')
+        self.assertEqual(peu, beaucoup)
+
+    def test_affectations_nombre_constant_de_requetes(self):
+        annee, classe, _ = creer_donnees(2)
+        peu = self._compter_requetes('/api/affectations/')
+        creer_donnees(20, annee=annee, classe=classe)
+        beaucoup = self._compter_requetes('/api/affectations/')
+        self.assertEqual(peu, beaucoup)
+
+    def test_recouvrements_details_affectation(self):
+        creer_donnees(1)
+        row = self.client.get('/api/recouvrements/').json()[0]
+        self.assertEqual(row['annee_nom'], '2025-2026')
+        self.assertEqual(row['classe_nom'], '6ème A')
+        self.assertEqual(row['affectation_details']['eleve_fullname'], 'Aïssatou Diallo0')
+
+
+class PaginationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        creer_donnees(5)
+
+    def test_sans_parametre_liste_complete(self):
+        data = self.client.get('/api/recouvrements/').json()
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), 5)
+
+    def test_pagination_par_page(self):
+        data = self.client.get('/api/recouvrements/?page=2&page_size=2').json()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(len(data['results']), 2)
+
+    def test_pagination_curseur_parcourt_tout(self):
+        url, ids = '/api/eleves/?mode=cursor&page_size=2', []
+        while url:
+            data = self.client.get(url).json()
+            ids += [r['id'] for r in data['results']]
+            url = data['next']
+        self.assertEqual(ids, sorted(TableEleve.objects.values_list('id', flat=True)))
+
+    def test_taille_max(self):
+        with self.settings(ECO_PAGINATION={'MAX_PAGE_SIZE': 3}):
+            data = self.client.get('/api/affectations/?page_size=100').json()
+        self.assertEqual(len(data['results']), 3)
+
+    def test_tables_de_reference_non_paginees(self):
+        self.assertIsInstance(self.client.get('/api/annees/?page=1').json(), list)
+        self.assertIsInstance(self.client.get('/api/classes/?page_size=1').json(), list)
+
+
+def client_connecte():
+    client = APIClient()
+    client.force_authenticate(user=User(username='test'))
+    return client
+
+
+def donnees_stats_variees():
+    """Plusieurs années, niveaux et options ; une classe sans dossier, un dossier sans classe"""
+    a1 = TableAnnee.objects.create(debut=2024, fin=2025)
+    a2 = TableAnnee.objects.create(debut=2025, fin=2026)
+    c6 = TableClasse.objects.create(code_classe='6A', lib_classe='6ème A', niveau_classe='clg', option_classe='aut')
+    c5 = TableClasse.objects.create(code_classe='5B', lib_classe='5ème B', niveau_classe='clg', option_classe='sm')
+    ct = TableClasse.objects.create(code_classe='TSM', lib_classe='Terminale SM', niveau_classe='lyc', option_classe='sm')
+    cv = TableClasse.objects.create(code_classe='CP', lib_classe='CP', niveau_classe='pri', option_classe='aut')
+    _, _, r1 = creer_donnees(3, annee=a1, classe=c6)
+    _, _, r2 = creer_donnees(2, annee=a2, classe=c6)
+    _, _, r3 = creer_donnees(2, annee=a2, classe=c5)
+    _, _, r4 = creer_donnees(2, annee=a2, classe=ct)
+    creer_donnees(1, annee=a2, classe=cv, frais=False)
+    TableRecouvrement.objects.filter(affectation__classe_aff=cv).delete()
+    for rec, montant in ((r1[0], 300000), (r1[1], 50000), (r2[0], 100000), (r3[1], 20000), (r4[0], 150000)):
+        TableVersement.objects.create(recouvrement=rec, montant=montant)
+    sans_classe = r4[1].affectation
+    sans_classe.classe_aff = None
+    sans_classe.save()
+
+
+class StatsRecouvrementTests(TestCase):
+    """TableStatRecouvrement doit toujours égaler une reconstruction complète."""
+
+    def setUp(self):
+        # Les compteurs de version repartent de zéro à chaque test (rollback) : cache vidé
+        cache.clear()
+
+    def _etat(self):
+        return sorted(
+            TableStatRecouvrement.objects.filter(Q(nb_affectations__gt=0) | Q(nb_recouvrements__gt=0))
+            .values_list('annee_id', 'classe_id', *TableStatRecouvrement.CHAMPS_TOTAUX),
+            key=str,
+        )
+
+    def assertStatsCoherentes(self):
+        incremental = self._etat()
+        TableStatRecouvrement.reconstruire()
+        self.assertEqual(incremental, self._etat())
+
+    def test_maintenance_incrementale(self):
+        annee, classe, recs = creer_donnees(3)
+        autre = TableClasse.objects.create(code_classe='X1', lib_classe='5ème B', niveau_classe='clg', option_classe='aut')
+        self.assertStatsCoherentes()
+
+        TableVersement.objects.create(recouvrement=recs[0], montant=50000)
+        self.assertStatsCoherentes()
+
+        recs[0].reduction = 10
+        recs[0].save()
+        self.assertStatsCoherentes()
+
+        aff = recs[1].affectation
+        aff.classe_aff = autre
+        aff.save()
+        self.assertStatsCoherentes()
+
+        recs[2].delete()
+        self.assertStatsCoherentes()
+
+        aff.eleve_aff.delete()  # cascade affectation -> recouvrement
+        self.assertStatsCoherentes()
+
+        autre.delete()
+        self.assertStatsCoherentes()
+
+    def test_reduction_au_resultat_non_entier(self):
+        annee, classe, (rec,) = creer_donnees(1)
+        frais = TableFraisScolarite.objects.get()
+        frais.frais_annuel = 100001
+        frais.save()
+        rec = TableRecouvrement.objects.select_related('affectation').get(pk=rec.pk)
+        for reduction in (33, 34, 50):  # 67000.67, 66000.66, 50000.5
+            rec.reduction = reduction
+            rec.save()
+            self.assertStatsCoherentes()
+        self.assertEqual(TableRecouvrement.objects.get(pk=rec.pk).frais_paiement, rec.frais_paiement)
+        self.assertEqual(rec.frais_paiement, 50001)
+
+        frais.frais_annuel = 100003  # propagation SQL : 50001.5 -> 50002, comme save()
+        frais.save()
+        self.assertStatsCoherentes()
+        self.assertEqual(TableRecouvrement.objects.get(pk=rec.pk).frais_paiement, 50002)
+
+    def test_endpoint(self):
+        annee, classe, recs = creer_donnees(3)
+        TableVersement.objects.create(recouvrement=recs[0], montant=100000)
+        eleve = TableEleve.objects.create(nom="Camara", prenom1="Ibrahima", sexe='M')
+        TableAffectation.objects.create(annee_aff=annee, classe_aff=classe, eleve_aff=eleve)
+
+        data = client_connecte().get('/api/stats/recouvrement/', {'annee': '2025-2026', 'niveau': 'clg'}).json()
+        self.assertEqual(data['total_affectations'], 4)
+        self.assertEqual(data['total_recouvrements'], 3)
+        self.assertEqual(data['nb_affectes_filtre'], 4)
+        self.assertEqual(data['total_frais'], 900000)
+        self.assertEqual(data['total_paye'], 100000)
+        self.assertEqual(data['total_restant'], 800000)
+        self.assertEqual(data['par_classe'], [{'name': '6ème A', 'paye': 100000, 'restant': 800000, 'total': 900000}])
+        self.assertEqual(data['par_niveau'], [{'name': 'clg', 'total': 1}])
+
+        data = client_connecte().get('/api/stats/recouvrement/', {'option': 'sm'}).json()
+        self.assertEqual(data['nb_recouv_filtre'], 0)
+        self.assertEqual(data['par_classe'], [])
+
+
+    def test_sortie_inchangee_en_une_requete(self):
+        # Référence : sortie de l'ancienne implémentation (une requête par agrégat / répartition)
+        donnees_stats_variees()
+        with CaptureQueriesContext(connection) as ctx:
+            data = StatsRecouvrementAPIView().calculer({})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(data, {
+            'total_affectations': 10, 'total_recouvrements': 9, 'nb_affectes_filtre': 10, 'nb_recouv_filtre': 9,
+            'total_frais': 2700000, 'total_paye': 620000, 'total_restant': 2080000, 'pct_paye': 23.0, 'pct_restant': 77.0,
+            'par_classe': [
+                {'name': 'N/A', 'paye': 0, 'restant': 300000, 'total': 300000},
+                {'name': '5ème B', 'paye': 20000, 'restant': 580000, 'total': 600000},
+                {'name': '6ème A', 'paye': 450000, 'restant': 1050000, 'total': 1500000},
+                {'name': 'Terminale SM', 'paye': 150000, 'restant': 150000, 'total': 300000},
+            ],
+            'par_niveau': [{'name': 'N/A', 'total': 0}, {'name': 'clg', 'total': 4}, {'name': 'lyc', 'total': 1}],
+            'par_option': [{'name': 'N/A', 'total': 0}, {'name': 'aut', 'total': 3}, {'name': 'sm', 'total': 2}],
+        })
+
+        data = client_connecte().get('/api/stats/recouvrement/', {'option': 'sm', 'annee': '2025-2026'}).json()
+        self.assertEqual(data, {
+            'total_affectations': 10, 'total_recouvrements': 9, 'nb_affectes_filtre': 3, 'nb_recouv_filtre': 3,
+            'total_frais': 900000, 'total_paye': 170000, 'total_restant': 730000, 'pct_paye': 18.9, 'pct_restant': 81.1,
+            'par_classe': [
+                {'name': '5ème B', 'paye': 20000, 'restant': 580000, 'total': 600000},
+                {'name': 'Terminale SM', 'paye': 150000, 'restant': 150000, 'total': 300000},
+            ],
+            'par_niveau': [{'name': 'clg', 'total': 1}, {'name': 'lyc', 'total': 1}],
+            'par_option': [{'name': 'sm', 'total': 2}],
+        })
+
+
+class VersementTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        _, _, (self.rec,) = creer_donnees(1)
+
+    def test_ajout_via_endpoint_imbrique(self):
+        url = f'/api/recouvrements/{self.rec.pk}/versements/'
+        r = self.client.post(url, {'montant': 100000, 'date_versement': '2025-10-01'}, format='json')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()['total_paye'], '100000')
+        self.client.post(url, {'montant': 50000, 'date_versement': '2025-11-03'}, format='json')
+
+        self.rec.refresh_from_db()
+        self.assertEqual(self.rec.total_paye, 150000)
+        self.assertEqual(len(self.client.get(url).json()), 2)
+
+    def test_plus_de_douze_versements(self):
+        for i in range(15):
+            TableVersement.objects.create(recouvrement=self.rec, montant=1000)
+        self.rec.refresh_from_db()
+        self.assertEqual(self.rec.total_paye, 15000)
+
+    def test_total_non_ecrase_par_instance_perimee(self):
+        perimee = TableRecouvrement.objects.get(pk=self.rec.pk)
+        TableVersement.objects.create(recouvrement=self.rec, montant=20000)
+        perimee.tuteur_paiement = "Mamadou Bah"
+        perimee.save()
+        self.rec.refresh_from_db()
+        self.assertEqual(self.rec.total_paye, 20000)
+
+    def test_suppression_et_correction(self):
+        v = TableVersement.objects.create(recouvrement=self.rec, montant=20000)
+        self.client.patch(f'/api/versements/{v.pk}/', {'montant': 25000}, format='json')
+        self.rec.refresh_from_db()
+        self.assertEqual(self.rec.total_paye, 25000)
+
+        self.client.delete(f'/api/versements/{v.pk}/')
+        self.rec.refresh_from_db()
+        self.assertEqual(self.rec.total_paye, 0)
+
+    def test_suppression_dossier_en_cascade(self):
+        TableVersement.objects.create(recouvrement=self.rec, montant=20000)
+        self.rec.delete()
+        self.assertFalse(TableVersement.objects.exists())
+        self.assertEqual(TableStatRecouvrement.objects.aggregate(s=Sum('total_paye'))['s'], 0)
+
+
+class EncaissementsTests(TestCase):
+
+    def test_totaux_par_jour_semaine_mois(self):
+        _, _, (r1, r2) = creer_donnees(2)
+        autre = TableClasse.objects.create(code_classe='P1', lib_classe='CP', niveau_classe='pri')
+        _, _, (r3,) = creer_donnees(1, annee=TableAnnee.objects.get(), classe=autre)
+        for rec, montant, jour in ((r1, 1000, '2025-10-01'), (r2, 2000, '2025-10-01'),
+                                   (r1, 500, '2025-10-09'), (r3, 700, '2025-11-02')):
+            TableVersement.objects.create(recouvrement=rec, montant=montant, date_versement=jour)
+        TableVersement.objects.create(recouvrement=r2, montant=9999)  # sans date : ignoré
+
+        data = client_connecte().get('/api/stats/encaissements/').json()
+        self.assertEqual(data['total'], 4200)
+        self.assertEqual(data['par_jour'][0], {'date': '2025-10-01', 'total': 3000, 'nb': 2})
+        self.assertEqual(data['par_mois'], [
+            {'mois': '2025-10', 'total': 3500, 'nb': 3},
+            {'mois': '2025-11', 'total': 700, 'nb': 1},
+        ])
+        self.assertEqual([s['semaine'] for s in data['par_semaine']], ['2025-S40', '2025-S41', '2025-S44'])
+
+        data = client_connecte().get('/api/stats/encaissements/', {'du': '2025-10-02', 'niveau': 'clg'}).json()
+        self.assertEqual(data['total'], 500)
+
+
+class ImportElevesTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_import_json_meme_matricule_que_save(self):
+        ligne = {'nom': "Bah", 'prenom1': "Aïssatou", 'prenom2': "Mariam", 'sexe': 'F',
+                 'jour_naissance': 3, 'mois_naissance': 7, 'annee_naissance': 2012}
+        r = self.client.post('/api/eleves/bulk/', [ligne, {**ligne, 'nom': "Sow"}], format='json')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()['crees'], 2)
+
+        importe = TableEleve.objects.get(nom="Bah")
+        unitaire = TableEleve.objects.create(**ligne)
+        self.assertEqual(importe.fullname, "Aïssatou Mariam Bah")
+        self.assertEqual(importe.date_naissance, "03/07/2012")
+        self.assertEqual(importe.matricule, importe.generer_matricule())
+        self.assertEqual(importe.matricule, f"BAAIMA030712F{importe.pk}{unitaire.matricule[-2:]}")
+        self.assertEqual(unitaire.matricule, f"BAAIMA030712F{unitaire.pk}{unitaire.matricule[-2:]}")
+
+    def test_import_csv(self):
+        contenu = "nom;prenom1;sexe\nCamara;Ibrahima;M\nKeïta;Sékou;M\n".encode('utf-8')
+        fichier = SimpleUploadedFile("eleves.csv", contenu, content_type="text/csv")
+        r = self.client.post('/api/eleves/bulk/', {'fichier': fichier}, format='multipart')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(
+            sorted(TableEleve.objects.values_list('fullname', flat=True)), ["Ibrahima Camara", "Sékou Keïta"]
+        )
+        self.assertFalse(TableEleve.objects.filter(matricule__isnull=True).exists())
+
+    def test_erreurs_par_ligne(self):
+        lignes = [{'nom': "Bah", 'prenom1': "Alpha"}, {'nom': "Sow"}, {'nom': "Diallo", 'prenom1': "Oumar", 'sexe': 'X'}]
+        r = self.client.post('/api/eleves/bulk/', lignes, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual([e['ligne'] for e in r.json()['erreurs']], [2, 3])
+        self.assertFalse(TableEleve.objects.exists())
+
+        r = self.client.post('/api/eleves/bulk/?partiel=1', lignes, format='json')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()['crees'], 1)
+
+
+class AffectationEnMasseTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.annee = TableAnnee.objects.create(debut=2025, fin=2026)
+        self.classe = TableClasse.objects.create(code_classe='6A', lib_classe='6ème A', niveau_classe='clg')
+        self.autre = TableClasse.objects.create(code_classe='6B', lib_classe='6ème B', niveau_classe='clg')
+        TableFraisScolarite.objects.create(annee_fs=self.annee, classe_fs=self.classe, frais_annuel=300000,
+                                           t1_fs=100000, t2_fs=100000, t3_fs=100000)
+        self.eleves = TableEleve.creer_en_masse([TableEleve(nom=f"Bah{i}", prenom1="Alpha") for i in range(50)])
+
+    def _ligne(self, eleve, classe=None):
+        return {'eleve_aff': eleve.pk, 'classe_aff': (classe or self.classe).pk, 'annee_aff': self.annee.pk, 'etat_aff': 'Nouv'}
+
+    def test_creation_puis_existantes(self):
+        deja = TableAffectation.objects.create(eleve_aff=self.eleves[0], classe_aff=self.autre, annee_aff=self.annee)
+        lignes = [self._ligne(e) for e in self.eleves]
+
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post('/api/affectations/bulk/', lignes, format='json')
+        self.assertLess(len(ctx.captured_queries), len(lignes))  # pas de requête par ligne
+        self.assertEqual(r.status_code, 201)
+        data = r.json()
+        self.assertEqual(data['affectations_creees'], 49)
+        self.assertEqual(data['affectations_existantes'], 1)
+        self.assertEqual(data['recouvrements_crees'], 50)
+        self.assertEqual(data['conflits'][0]['classe_actuelle'], self.autre.pk)
+        self.assertEqual(TableAffectation.objects.get(pk=deja.pk).classe_aff, self.autre)
+
+        rec = TableRecouvrement.objects.get(affectation__eleve_aff=self.eleves[1])
+        self.assertEqual((rec.frais_paiement, rec.tranche1_paiement), (300000, 100000))
+
+        data = self.client.post('/api/affectations/bulk/', lignes, format='json').json()
+        self.assertEqual((data['affectations_creees'], data['recouvrements_crees']), (0, 0))
+
+        stats = list(TableStatRecouvrement.objects.order_by('classe_id').values_list('classe_id', 'nb_affectations', 'nb_recouvrements', 'total_frais'))
+        TableStatRecouvrement.reconstruire()
+        self.assertEqual(stats, list(TableStatRecouvrement.objects.order_by('classe_id').values_list('classe_id', 'nb_affectations', 'nb_recouvrements', 'total_frais')))
+
+    def test_erreurs(self):
+        lignes = [self._ligne(self.eleves[0]), {**self._ligne(self.eleves[1]), 'classe_aff': 999}, {'eleve_aff': 'x'}]
+        r = self.client.post('/api/affectations/bulk/', {'affectations': lignes}, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual([e['ligne'] for e in r.json()['erreurs']], [3])
+        r = self.client.post('/api/affectations/bulk/', lignes[:2], format='json')
+        self.assertEqual([e['ligne'] for e in r.json()['erreurs']], [2])
+        self.assertFalse(TableAffectation.objects.exists())
+
+
+class PromotionTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.source, self.c6, self.recs6 = creer_donnees(3)
+        self.c5 = TableClasse.objects.create(code_classe='5A', lib_classe='5ème A', niveau_classe='clg')
+        self.c3 = TableClasse.objects.create(code_classe='3A', lib_classe='3ème A', niveau_classe='clg')
+        _, _, self.recs3 = creer_donnees(2, annee=self.source, classe=self.c3)
+        self.cible = TableAnnee.objects.create(debut=2026, fin=2027)
+        TableFraisScolarite.objects.create(annee_fs=self.cible, classe_fs=self.c5, frais_annuel=400000)
+        self.redoublant = self.recs6[0].affectation.eleve_aff_id
+        self.params = {
+            'annee_source': '2025-2026', 'annee_cible': self.cible.pk,
+            'promotions': {self.c6.code_classe: '5A'},  # 3A : classe terminale, élèves sortants
+            'redoublants': [self.redoublant],
+        }
+
+    def test_dry_run_puis_promotion(self):
+        r = self.client.post('/api/affectations/promotion/', {**self.params, 'dry_run': True}, format='json')
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertEqual((data['admis'], data['redoublants'], data['sortants']), (2, 1, 2))
+        self.assertEqual(data['affectations_creees'], 3)
+        self.assertFalse(TableAffectation.objects.filter(annee_aff=self.cible).exists())
+
+        r = self.client.post('/api/affectations/promotion/', self.params, format='json')
+        self.assertEqual(r.status_code, 201)
+        cible = TableAffectation.objects.filter(annee_aff=self.cible)
+        self.assertEqual(cible.filter(classe_aff=self.c5, etat_aff='adm').count(), 2)
+        self.assertEqual(cible.get(etat_aff='red').eleve_aff_id, self.redoublant)
+        self.assertEqual(
+            sorted(TableRecouvrement.objects.filter(affectation__annee_aff=self.cible).values_list('frais_paiement', flat=True), key=lambda v: v or 0),
+            [None, 400000, 400000],  # pas de grille 6ème en 2026-2027
+        )
+
+    def test_parametres_invalides(self):
+        url = '/api/affectations/promotion/'
+        for invalides in ({'promotions': [['6A', '5A']]}, {'promotions': '6A'}, {'redoublants': '12'}):
+            r = self.client.post(url, {**self.params, **invalides, 'dry_run': True}, format='json')
+            self.assertEqual(r.status_code, 400, invalides)
+
+        # Code tout en chiffres égal à l'id d'une autre classe : refusé plutôt que deviné
+        TableClasse.objects.create(code_classe=str(self.c5.pk), lib_classe='Autre', niveau_classe='clg')
+        r = self.client.post(url, {**self.params, 'promotions': {self.c6.code_classe: str(self.c5.pk)}, 'dry_run': True}, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertIn('ambiguë', r.json()['detail'])
+
+    def test_commande(self):
+        plan = NamedTemporaryFile('w', suffix='.json', delete=False)
+        json.dump({'6ème': '5A'}, plan)
+        plan.close()
+        self.addCleanup(os.unlink, plan.name)
+        with self.assertRaises(CommandError):
+            call_command('promotion', '2025-2026', '2026-2027', plan=plan.name, stdout=io.StringIO())
+
+        with open(plan.name, 'w') as f:
+            json.dump({str(self.c6.pk): '5A'}, f)
+        sortie = io.StringIO()
+        call_command('promotion', '2025-2026', '2026-2027', plan=plan.name, dry_run=True, stdout=sortie)
+        self.assertIn("admis : 3, redoublants : 0, sortants : 2", sortie.getvalue())
+        self.assertFalse(TableAffectation.objects.filter(annee_aff=self.cible).exists())
+
+
+class CacheFraisTests(TestCase):
+
+    def setUp(self):
+        TableFraisScolarite.vider_cache()
+        self.annee, self.classe, (self.rec,) = creer_donnees(1)
+        self.frais = TableFraisScolarite.objects.get()
+
+    def test_cache_evite_la_requete_de_frais(self):
+        rec = TableRecouvrement.objects.select_related('affectation').get(pk=self.rec.pk)
+        rec.save()  # remplit le cache
+        with CaptureQueriesContext(connection) as ctx:
+            rec.save()
+        self.assertFalse([q for q in ctx.captured_queries if '"backend_tablefraisscolarite"' in q['sql']])
+
+    def test_coherence_apres_modification_des_frais(self):
+        self.rec.save()
+        self.frais.frais_annuel = 450000
+        self.frais.save()
+        rec = TableRecouvrement.objects.get(pk=self.rec.pk)
+        rec.save()
+        self.assertEqual(rec.frais_paiement, 450000)
+
+        self.frais.delete()
+        self.assertIsNone(TableFraisScolarite.pour(self.annee.pk, self.classe.pk))
+        nouvelle = TableFraisScolarite.objects.create(annee_fs=self.annee, classe_fs=self.classe, frais_annuel=100)
+        self.assertEqual(TableFraisScolarite.pour(self.annee.pk, self.classe.pk), nouvelle)
+
+    def test_frais_fournis_par_l_appelant(self):
+        grille = TableFraisScolarite(frais_annuel=1000, t1_fs=500, t2_fs=300, t3_fs=200)
+        rec = TableRecouvrement.objects.select_related('affectation').get(pk=self.rec.pk)
+        rec.reduction = 50
+        with CaptureQueriesContext(connection) as ctx:
+            rec.save(frais=grille)
+        self.assertFalse([q for q in ctx.captured_queries if 'tablefraisscolarite' in q['sql']])
+        self.assertEqual((rec.frais_paiement, rec.tranche1_paiement), (500, 250))
+
+    def test_entree_perimee_d_un_autre_processus(self):
+        # Autre worker : grille en cache, puis modifiée ici (ses signaux ne le touchent pas)
+        rec = TableRecouvrement.objects.select_related('affectation').get(pk=self.rec.pk)
+        rec.save()
+        cache_autre_worker = dict(TableFraisScolarite._cache)
+        self.frais.frais_annuel = 450000
+        self.frais.save()
+        TableFraisScolarite._cache.update(cache_autre_worker)
+
+        rec = TableRecouvrement.objects.select_related('affectation').get(pk=self.rec.pk)
+        rec.reduction = 10
+        rec.save()
+        rec.refresh_from_db()
+        self.assertEqual(rec.frais_paiement, 405000)
+
+
+class PropagationFraisTests(TestCase):
+
+    def setUp(self):
+        self.annee, self.classe, self.recs = creer_donnees(3)
+        self.recs[1].reduction = 25
+        self.recs[1].save()
+        self.recs[2].reduction = 33
+        self.recs[2].save()
+        self.frais = TableFraisScolarite.objects.get()
+
+    def _frais(self):
+        return [
+            (r.frais_paiement, r.tranche1_paiement)
+            for r in TableRecouvrement.objects.order_by('id')
+        ]
+
+    def test_modification_de_grille_propagee(self):
+        self.frais.frais_annuel = 600000
+        self.frais.t1_fs = 200001
+        self.frais.save()
+        self.assertEqual(self._frais(), [(600000, 200001), (450000, 150001), (402000, 134001)])
+
+        stat = TableStatRecouvrement.objects.get(annee=self.annee, classe=self.classe)
+        self.assertEqual(stat.total_frais, 600000 + 450000 + 402000)
+
+        # même résultat que save() ligne par ligne
+        attendu = self._frais()
+        for r in TableRecouvrement.objects.all():
+            r.save()
+        self.assertEqual(self._frais(), attendu)
+
+    def test_commande(self):
+        TableFraisScolarite.objects.filter(pk=self.frais.pk).update(frais_annuel=100)  # sans signal
+        sortie = io.StringIO()
+        call_command('recalculer_frais', annee=self.annee.pk, stdout=sortie)
+        self.assertIn("3 dossier(s) recalculé(s)", sortie.getvalue())
+        self.assertEqual([f for f, _ in self._frais()], [100, 75, 67])
+
+
+class FiltresRecouvrementTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.annee, self.classe, recs = creer_donnees(3)
+        TableVersement.objects.create(recouvrement=recs[1], montant=100000)
+        TableVersement.objects.create(recouvrement=recs[2], montant=300000)
+        autre_classe = TableClasse.objects.create(code_classe="5A", lib_classe="5ème A", niveau_classe='clg', option_classe='aut')
+        creer_donnees(2, annee=self.annee, classe=autre_classe)
+
+    def _page(self, params=''):
+        response = self.client.get(f'/api/recouvrements/?page_size=2{params}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_statut_paiement_calcule_en_sql(self):
+        attendus = {'aucun_paiement': 3, 'Aucun_Paiement': 3, 'en_cours': 1, 'termine': 1}
+        for statut, nb in attendus.items():
+            self.assertEqual(self._page(f'&statut_paiement={statut}')['count'], nb)
+        self.assertEqual(self._page(f'&classe={self.classe.pk}&statut_paiement=aucun_paiement')['count'], 1)
+        self.assertEqual(self.client.get('/api/recouvrements/?page=1&statut_paiement=x').status_code, 400)
+
+    def test_recherche_et_filtres(self):
+        self.assertEqual(self._page('&search=diallo1')['count'], 2)
+        matricule = TableEleve.objects.order_by('id').first().matricule
+        self.assertEqual(self._page(f'&search={matricule}')['count'], 1)
+        self.assertEqual(self._page('&classe=5ème A')['count'], 2)
+        self.assertEqual(self._page(f'&annee={self.annee.annee_scolaire}&niveau=clg')['count'], 5)
+
+    def test_kpi_sur_toute_la_selection(self):
+        data = self._page(f'&classe={self.classe.pk}')
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(data['kpi'], {
+            'count': 3, 'total_frais': 900000, 'total_paye': 400000, 'total_restant': 500000,
+            'pct_paye': 44.4, 'pct_restant': 55.6,
+        })
+
+
+class DashboardTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        # Compteurs incrémentés au commit : rappels exécutés ici, chaque test capture les siens
+        with self.captureOnCommitCallbacks(execute=True):
+            self.annee, self.classe, recs = creer_donnees(3)
+            TableVersement.objects.create(recouvrement=recs[0], montant=50000)
+            TableEleve.objects.create(nom="Camara", prenom1="Mamadou", sexe='M')
+
+    def test_agregats(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/stats/dashboard/').json()
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+
+        self.assertEqual(data['eleves']['total'], 4)
+        self.assertEqual(data['eleves']['par_sexe'], {'M': 1, 'F': 3, 'O': 0})
+        self.assertEqual(data['affectations']['total'], 3)
+        self.assertEqual(data['affectations']['par_niveau'], {'clg': 3})
+        self.assertEqual(data['affectations']['par_annee'][0]['annee'], '2025-2026')
+        self.assertEqual(data['affectations']['par_annee'][0]['par_etat'], {'Nouv': 3})
+        rec = data['recouvrement']
+        self.assertEqual((rec['nb_recouvrements'], rec['total_frais'], rec['total_paye']), (3, 900000, 50000))
+        self.assertEqual(rec['lignes'][0]['classe_nom'], '6ème A')
+
+    def test_etag_304_tant_que_rien_ne_change(self):
+        etag = self.client.get('/api/stats/dashboard/')['ETag']
+        response = self.client.get('/api/stats/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TableEleve.creer_en_masse([TableEleve(nom="Bah", prenom1="Oumou", sexe='F')])
+        response = self.client.get('/api/stats/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['eleves']['total'], 5)
+
+    def test_compteurs_incrementes_une_fois_au_commit(self):
+        rec = TableRecouvrement.objects.first()
+        avant = TableCompteurModif.versions(TableVersement, TableRecouvrement)
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            with CaptureQueriesContext(connection) as ctx:
+                for montant in (10000, 20000, 30000):
+                    TableVersement.objects.create(recouvrement=rec, montant=montant)
+        self.assertEqual(len(rappels), 1)
+        self.assertFalse([q for q in ctx.captured_queries if 'tablecompteurmodif' in q['sql']])
+        apres = TableCompteurModif.versions(TableVersement, TableRecouvrement)
+        self.assertEqual({t: apres[t] - avant[t] for t in apres}, {'tableversement': 1, 'tablerecouvrement': 1})
+
+    def test_recouvrement_sans_changement_de_frais_sans_maj_des_stats(self):
+        rec = TableRecouvrement.objects.select_related('affectation').first()
+        rec.tuteur_paiement = "Diallo Mamadou"
+        with CaptureQueriesContext(connection) as ctx:
+            rec.save()
+        self.assertFalse([q for q in ctx.captured_queries if 'tablestatrecouvrement' in q['sql']])
+
+        rec.reduction = 50
+        rec.save()
+        stat = TableStatRecouvrement.objects.get(annee=self.annee, classe=self.classe)
+        self.assertEqual(stat.total_frais, 750000)
+
+
+class CacheStatsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = client_connecte()
+        with self.captureOnCommitCallbacks(execute=True):  # voir DashboardTests.setUp
+            self.annee, self.classe, self.recs = creer_donnees(2)
+
+    def _get(self, params=None):
+        response = self.client.get('/api/stats/recouvrement/', params or {})
+        return response['X-Cache'], response.json()
+
+    def test_hit_puis_invalidation_par_ecriture(self):
+        self.assertEqual(self._get({'niveau': 'clg'})[0], 'MISS')
+        # Même filtres normalisés (ordre, espaces, paramètres vides)
+        etat, data = self._get({'annee': '', 'niveau': ' clg '})
+        self.assertEqual((etat, data['total_paye']), ('HIT', 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TableVersement.objects.create(recouvrement=self.recs[0], montant=100000)
+        etat, data = self._get({'niveau': 'clg'})
+        self.assertEqual((etat, data['total_paye']), ('MISS', 100000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.classe.niveau_classe = 'lyc'
+            self.classe.save()
+        etat, data = self._get({'niveau': 'clg'})
+        self.assertEqual((etat, data['nb_recouv_filtre']), ('MISS', 0))
+
+    def test_miss_apres_reconstruction(self):
+        self.assertEqual(self._get()[0], 'MISS')
+        # Dérive réparée par la commande : update() sans signal, puis reconstruction
+        TableStatRecouvrement.objects.update(total_frais=1)
+        self.assertEqual(self._get()[0], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_stats_recouvrement', stdout=io.StringIO())
+        etat, data = self._get()
+        self.assertEqual((etat, data['total_frais']), ('MISS', 600000))
+
+    def test_compteurs(self):
+        self._get()
+        self._get()
+        data = self.client.get('/api/stats/cache/').json()
+        self.assertEqual((data['hits'], data['misses'], data['ratio']), (1, 1, 0.5))
+
+
+class PlansRequetesTests(TestCase):
+    """
+    Les requêtes des chemins de filtre doivent passer par un index (EXPLAIN).
+    Vérifié sur le nom de l'index, présent dans le plan SQLite (USING INDEX ...) comme
+    PostgreSQL (Index Scan using ...). Sur PostgreSQL le seq scan est désactivé :
+    sur des tables de test minuscules il serait toujours préféré.
+    """
+
+    def setUp(self):
+        creer_donnees(3)
+
+    def assertUtiliseIndex(self, qs, index):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = qs.explain()
+        self.assertIn(index, plan, f"{index} absent du plan :\n{plan}")
+
+    def test_filtres_affectations(self):
+        qs = TableAffectation.objects.order_by()
+        self.assertUtiliseIndex(_apply_filters_aff(qs, {'annee': '2025-2026'}), 'annee_scolaire_idx')
+        self.assertUtiliseIndex(_apply_filters_aff(qs, {'classe': '6ème A'}), 'classe_lib_idx')
+        self.assertUtiliseIndex(_apply_filters_aff(qs, {'niveau': 'clg', 'option': 'aut'}), 'classe_niveau_option_idx')
+        self.assertUtiliseIndex(qs.filter(annee_aff_id=1, classe_aff_id=1), 'aff_annee_classe_idx')
+
+    def test_filtres_recouvrements(self):
+        qs = TableRecouvrement.objects.order_by()
+        self.assertUtiliseIndex(_apply_filters_rec(qs, {'annee': '2025-2026'}), 'annee_scolaire_idx')
+        self.assertUtiliseIndex(_apply_filters_rec(qs, {'classe': '6ème A'}), 'classe_lib_idx')
+
+    def test_recherche_eleves(self):
+        plan = TableEleve.rechercher('dia').explain()
+        self.assertIn('eleve_cle_recherche_idx', plan)
+        self.assertIn('eleve_cle_recherche_nom_idx', plan)
+
+    def test_eleves(self):
+        self.assertUtiliseIndex(TableEleve.objects.all()[:50], 'eleve_prenom1_idx')
+        self.assertUtiliseIndex(TableEleve.objects.filter(fullname='Aïssatou Diallo0'), 'eleve_fullname_idx')
+
+
+class ConcurrenceEcrituresTests(TransactionTestCase):
+    """Plusieurs caisses enregistrent des paiements en même temps (rentrée)."""
+
+    def test_enregistrements_simultanes(self):
+        if connection.vendor == 'sqlite':
+            if connection.is_in_memory_db():
+                self.skipTest("base SQLite en mémoire : pas de WAL")
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+
+        _, _, recs = creer_donnees(16)
+        erreurs = []
+
+        def caisse(rec_id):
+            try:
+                for _ in range(20):
+                    rec = TableRecouvrement.objects.get(pk=rec_id)
+                    TableVersement.objects.create(recouvrement=rec, montant=1000)
+                    rec.reduction = (rec.reduction or 0) + 1
+                    rec.save()
+            except Exception as e:
+                erreurs.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=caisse, args=(r.pk,)) for r in recs]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(erreurs, [])
+        self.assertEqual(TableVersement.objects.count(), 320)
+        self.assertEqual(TableRecouvrement.objects.aggregate(s=Sum('total_paye'))['s'], 320000)
+        self.assertEqual(set(TableRecouvrement.objects.values_list('reduction', flat=True)), {20})
+        stats = TableStatRecouvrement.objects.aggregate(paye=Sum('total_paye'), nb=Sum('nb_avec_paiement'))
+        self.assertEqual((stats['paye'], stats['nb']), (320000, 16))
+
+
+@skipUnless(connection.vendor == 'sqlite', "réglages propres à SQLite")
+class PragmasSqliteTests(TestCase):
+
+    def _pragmas(self, conn, *noms):
+        with conn.cursor() as cursor:
+            valeurs = []
+            for nom in noms:
+                cursor.execute(f'PRAGMA {nom}')
+                valeurs.append(cursor.fetchone()[0])
+        return valeurs
+
+    def test_appliques_a_chaque_connexion(self):
+        self.assertEqual(self._pragmas(connection, 'synchronous', 'cache_size', 'temp_store'), [1, -65536, 2])
+
+        pragmas = {'synchronous': 'FULL', 'cache_size': -4000, 'busy_timeout': 1234}
+        with self.settings(ECO_SQLITE_PRAGMAS=pragmas):
+            nouvelle = connection.copy()
+            try:
+                self.assertEqual(self._pragmas(nouvelle, 'synchronous', 'cache_size', 'busy_timeout'), [2, -4000, 1234])
+            finally:
+                nouvelle.close()
+
+
+class RechercheElevesTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.aicha = TableEleve.objects.create(nom="Diallo", prenom1="Aïcha", prenom2="Marie-Hélène", sexe='F')
+        TableEleve.creer_en_masse([
+            TableEleve(nom="Bah", prenom1="Mamadou", prenom2="Aliou", sexe='M'),
+            TableEleve(nom="Diakité", prenom1="Sékou", sexe='M'),
+        ])
+
+    def _noms(self, q, **params):
+        data = self.client.get('/api/eleves/recherche/', {'q': q, **params}).json()
+        return sorted(e['fullname'] for e in data)
+
+    def test_cles_calculees(self):
+        self.assertEqual(self.aicha.cle_recherche, 'AICHA MARIE HELENE DIALLO')
+        self.assertEqual(self.aicha.cle_recherche_nom, 'DIALLO AICHA MARIE HELENE')
+        self.assertEqual(TableEleve.objects.get(nom="Diakité").cle_recherche, 'SEKOU DIAKITE')
+
+    def test_prefixes_sans_accents(self):
+        self.assertEqual(self._noms('dia'), ['Aïcha Marie-Hélène Diallo', 'Sékou Diakité'])
+        self.assertEqual(self._noms('aïc'), ['Aïcha Marie-Hélène Diallo'])
+        self.assertEqual(self._noms('sek dia'), ['Sékou Diakité'])
+        self.assertEqual(self._noms('bah ali'), ['Mamadou Aliou Bah'])
+        self.assertEqual(self._noms('helene'), [])  # début du nom ou des prénoms, pas d'un mot au milieu
+        self.assertEqual(self._noms(self.aicha.matricule.lower()), ['Aïcha Marie-Hélène Diallo'])
+        self.assertEqual(self._noms(''), [])
+
+    def test_limite(self):
+        self.assertEqual(len(self._noms('d', limit=1)), 1)
+        self.assertNotIn('cle_recherche', self.client.get('/api/eleves/recherche/', {'q': 'bah'}).json()[0])
+
+    def test_lookup_compact(self):
+        data = self.client.get('/api/lookup/eleves/', {'q': 'sek dia'}).json()
+        self.assertEqual(data, [{'id': data[0]['id'], 'fullname': 'Sékou Diakité', 'matricule': data[0]['matricule']}])
+        self.assertEqual(len(self.client.get('/api/lookup/eleves/', {'q': 'd', 'limit': 1}).json()), 1)
+        par_id = self.client.get('/api/lookup/eleves/', {'id': f'{self.aicha.id},x'}).json()
+        self.assertEqual([e['fullname'] for e in par_id], ['Aïcha Marie-Hélène Diallo'])
+        self.assertEqual(self.client.get('/api/lookup/eleves/').json(), [])
+
+
+class ChampsDynamiquesTests(TestCase):
+    """?fields= / ?omit= : champs sérialisés et jointures SQL réduits à la demande."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.annee, self.classe, recs = creer_donnees(3)
+        TableVersement.objects.create(recouvrement=recs[0], montant=100000)
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), ' '.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_recouvrements_fields(self):
+        data, sql = self._get('/api/recouvrements/?fields=id,montant_paye,inconnu')
+        self.assertEqual([set(r) for r in data], [{'id', 'montant_paye'}] * 3)
+        self.assertEqual(sorted(r['montant_paye'] for r in data), [0, 0, 100000])
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('backend_tableversement', sql)
+
+        data, sql = self._get('/api/recouvrements/?fields=id,info_eleve')
+        self.assertIn('backend_tableeleve', sql)
+        self.assertNotIn('backend_tableclasse', sql)
+
+    def test_affectations_omit(self):
+        data, sql = self._get('/api/affectations/?omit=eleve_details')
+        self.assertNotIn('eleve_details', data[0])
+        self.assertEqual(data[0]['classe_nom'], '6ème A')
+        self.assertNotIn('backend_tableeleve', sql)
+
+        data, sql = self._get('/api/affectations/')
+        self.assertEqual(data[0]['eleve_details']['nom'], 'Diallo0')
+
+    def test_ecriture_non_concernee(self):
+        eleve = TableEleve.objects.create(nom="Bah", prenom1="Oumar", sexe='M')
+        response = self.client.post(
+            '/api/affectations/?fields=id',
+            {'eleve_aff': eleve.id, 'classe_aff': self.classe.id, 'annee_aff': self.annee.id, 'etat_aff': 'Nouv'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['classe_nom'], '6ème A')
+
+
+def photo_jpeg(largeur=1200, hauteur=900, nom='photo.jpg'):
+    from PIL import Image
+    tampon = io.BytesIO()
+    Image.new('RGB', (largeur, hauteur), (200, 120, 40)).save(tampon, format='JPEG')
+    return SimpleUploadedFile(nom, tampon.getvalue(), content_type='image/jpeg')
+
+
+class MiniaturesTests(TestCase):
+
+    def setUp(self):
+        from tempfile import TemporaryDirectory
+        from django.test import override_settings
+        dossier = TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        reglages = override_settings(
+            MEDIA_ROOT=dossier.name,
+            ECO_MINIATURES={'TAILLES': (64, 256), 'FORMAT': 'WEBP', 'QUALITE': 80, 'WORKERS': 0},
+        )
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.client = APIClient()
+
+    def _tailles(self, eleve):
+        from PIL import Image
+        from .miniatures import chemin_miniature, version_miniatures
+        tailles = []
+        for taille in (64, 256):
+            with eleve.photo.storage.open(chemin_miniature(eleve.photo.name, taille, version_miniatures(eleve))) as f:
+                image = Image.open(f)
+                self.assertEqual(image.format, 'WEBP')
+                tailles.append(image.size)
+        return tailles
+
+    def test_upload_genere_les_miniatures(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/eleves/', {'nom': 'Bah', 'prenom1': 'Awa', 'sexe': 'F', 'photo': photo_jpeg()})
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.json()['photo_thumb'])  # générées après la réponse
+
+        eleve = TableEleve.objects.get(pk=response.json()['id'])
+        self.assertTrue(eleve.photo_miniatures.startswith(f'{eleve.photo.name}#'))
+        self.assertEqual(self._tailles(eleve), [(64, 48), (256, 192)])
+
+        data = self.client.get(f'/api/eleves/{eleve.pk}/').json()
+        self.assertEqual(set(data['photo_thumb']), {'64', '256'})
+        self.assertTrue(data['photo_thumb']['64'].endswith('.webp'))
+        self.assertNotIn('photo_miniatures', data)
+
+    def test_commande_rattrapage(self):
+        eleve = TableEleve.objects.create(nom='Sow', prenom1='Ali', sexe='M', photo=photo_jpeg(300, 600))
+        TableEleve.objects.create(nom='Sans', prenom1='Photo', sexe='M')
+        self.assertEqual(TableEleve.objects.get(pk=eleve.pk).photo_miniatures, '')  # callback jamais exécuté
+
+        sortie = io.StringIO()
+        call_command('miniatures', workers=1, stdout=sortie)
+        self.assertIn('1 photo(s) traitée(s)', sortie.getvalue())
+        eleve.refresh_from_db()
+        self.assertEqual(self._tailles(eleve), [(32, 64), (128, 256)])
+
+        call_command('miniatures', workers=1, stdout=sortie)
+        self.assertIn('0 photo(s) traitée(s)', sortie.getvalue())
+
+
+    def test_une_seule_generation_par_photo(self):
+        from unittest import mock
+        # TableEleve.save() enregistre deux fois (matricule) : une seule planification
+        with mock.patch('backend.signals.planifier_miniatures') as planifier:
+            eleve = TableEleve.objects.create(nom='Sow', prenom1='Ali', sexe='M', photo=photo_jpeg())
+        self.assertEqual(planifier.call_count, 1)
+        self.assertTrue(eleve.matricule)
+
+    def test_regeneration_sous_un_nouveau_nom(self):
+        from django.test import override_settings
+        with self.captureOnCommitCallbacks(execute=True):
+            eleve = TableEleve.objects.create(nom='Sow', prenom1='Ali', sexe='M', photo=photo_jpeg())
+        avant = self.client.get(f'/api/eleves/{eleve.pk}/').json()['photo_thumb']
+
+        call_command('miniatures', workers=1, toutes=True, stdout=io.StringIO())  # même contenu
+        self.assertEqual(self.client.get(f'/api/eleves/{eleve.pk}/').json()['photo_thumb'], avant)
+
+        with override_settings(ECO_MINIATURES={'TAILLES': (64, 256), 'FORMAT': 'WEBP', 'QUALITE': 30, 'WORKERS': 0}):
+            call_command('miniatures', workers=1, toutes=True, stdout=io.StringIO())
+        apres = self.client.get(f'/api/eleves/{eleve.pk}/').json()['photo_thumb']
+        self.assertNotEqual(apres['256'], avant['256'])
+        eleve.refresh_from_db()
+        self.assertEqual(self._tailles(eleve), [(64, 48), (256, 192)])
+        ancien = avant['256'].split('/media/', 1)[1]
+        self.assertFalse(eleve.photo.storage.exists(ancien))
+
+
+class MediasTests(TestCase):
+
+    def setUp(self):
+        from tempfile import TemporaryDirectory
+        from django.test import override_settings
+        dossier = TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        reglages = override_settings(MEDIA_ROOT=dossier.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        os.makedirs(os.path.join(dossier.name, 'photoeleves'))
+        self.contenu = bytes(range(256)) * 40
+        with open(os.path.join(dossier.name, 'photoeleves', 'a b.jpg'), 'wb') as f:
+            f.write(self.contenu)
+        self.url = '/media/photoeleves/a%20b.jpg'
+
+    def test_cache_et_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.contenu)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=0, must-revalidate')  # nom réutilisable
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'miniatures', '64'))
+        with open(os.path.join(settings.MEDIA_ROOT, 'miniatures', '64', 'a.0123abcd.webp'), 'wb') as f:
+            f.write(self.contenu)
+        miniature = self.client.get('/media/miniatures/64/a.0123abcd.webp')
+        self.assertEqual(miniature['Cache-Control'], 'private, max-age=31536000')  # nom versionné
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"autre"').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get('/media/../core/settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/photoeleves/').status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.contenu)}')
+        self.assertEqual(b''.join(response.streaming_content), self.contenu[100:200])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.contenu[-10:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.contenu)}-').status_code, 416)
+        # If-Range périmé : fichier complet
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"ancien"').status_code, 200)
+
+    def test_delegation_au_proxy(self):
+        from django.test import override_settings
+        with override_settings(ECO_MEDIA={'MODE': 'x-accel', 'X_ACCEL_PREFIX': '/interne/'}):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/interne/photoeleves/a%20b.jpg')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+        with override_settings(ECO_MEDIA={'MODE': 'x-sendfile'}):
+            response = self.client.get(self.url)
+        self.assertTrue(response['X-Sendfile'].endswith(os.path.join('photoeleves', 'a b.jpg')))
+
+
+class JetonsTests(TestCase):
+
+    def setUp(self):
+        from . import jetons
+        from django.test import override_settings
+        reglages = override_settings(ECO_DERNIERE_CONNEXION_DELAI=0)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        jetons._supprimes.clear()
+        jetons.recharger_revocations()
+        self.client = APIClient()
+        role = TableRole.objects.create(role="Comptable")
+        self.user = TableUtilisateur.objects.create(username="awa", contact="620000000", password="secret", role=role)
+
+    def _connexion(self):
+        response = self.client.post('/api/login/', {'username': 'awa', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _get(self, acces):
+        return self.client.get('/api/stats/cache/', HTTP_AUTHORIZATION=f'Bearer {acces}')
+
+    def test_jeton_verifie_sans_requete(self):
+        data = self._connexion()
+        self.assertEqual(data['user']['role'], 'Comptable')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._get(data['access']).status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'utilisateur' in q['sql']])
+        self.assertEqual(self.client.get('/api/stats/cache/').status_code, 401)
+        self.assertEqual(self._get(data['access'] + 'x').status_code, 401)
+        self.assertEqual(self._get(data['refresh']).status_code, 401)  # pas un jeton d'accès
+
+    def test_expiration_et_rafraichissement(self):
+        from django.test import override_settings
+        data = self._connexion()
+        with override_settings(ECO_JETONS={'ACCES_TTL': -1}):
+            response = self._get(data['access'])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'Jeton expiré')
+
+        nouveaux = self.client.post('/api/token/refresh/', {'refresh': data['refresh']}, format='json').json()
+        self.assertEqual(self._get(nouveaux['access']).status_code, 200)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': data['access']}, format='json').status_code, 401)
+
+    def test_compte_desactive_revoque(self):
+        data = self._connexion()
+        self.user.statut = 'Off'
+        self.user.save()
+        self.assertEqual(self._get(data['access']).status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': data['refresh']}, format='json').status_code, 401)
+
+        self.user.statut = 'On'
+        self.user.save()
+        self.assertEqual(self._get(data['access']).status_code, 200)
+
+
+class ConnexionTests(TestCase):
+
+    def setUp(self):
+        from django.test import override_settings
+        reglages = override_settings(ECO_DERNIERE_CONNEXION_DELAI=3600)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.addCleanup(TableUtilisateur.enregistrer_connexions)
+        self.client = APIClient()
+        self.awa = TableUtilisateur.objects.create(username="awa", contact="620000001", password="secret")
+        self.ali = TableUtilisateur.objects.create(username="ali", contact="620000002", password="secret")
+
+    def _connexion(self, username, password='secret'):
+        return self.client.post('/api/login/', {'username': username, 'password': password}, format='json')
+
+    def test_dernieres_connexions_ecrites_par_lot(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._connexion('awa').status_code, 200)
+            self.assertEqual(self._connexion('ali').status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+        self.assertIsNone(TableUtilisateur.objects.get(pk=self.awa.pk).derniereconnection)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(TableUtilisateur.enregistrer_connexions(), 2)
+        self.assertEqual(TableUtilisateur.objects.filter(derniereconnection__isnull=False).count(), 2)
+        self.assertEqual(TableUtilisateur.enregistrer_connexions(), 0)
+
+    def test_hachage_mis_a_niveau(self):
+        from django.contrib.auth.hashers import PBKDF2PasswordHasher, identify_hasher, make_password
+        anciens = {
+            'awa': PBKDF2PasswordHasher().encode('secret', 'selfixe', iterations=1000),  # itérations d'une ancienne version
+            'ali': make_password('secret', hasher='pbkdf2_sha1'),  # autre hacheur : n'est plus re-haché par save()
+        }
+        for username, ancien in anciens.items():
+            TableUtilisateur.objects.filter(username=username).update(password=ancien)
+            user = TableUtilisateur.objects.get(username=username)
+            user.save()
+            self.assertEqual(user.password, ancien)
+
+            self.assertEqual(self._connexion(username).status_code, 200)
+            nouveau = TableUtilisateur.objects.get(username=username).password
+            self.assertNotEqual(nouveau, ancien)
+            self.assertFalse(identify_hasher(nouveau).must_update(nouveau))
+            self.assertEqual(self._connexion(username).status_code, 200)
+        self.assertEqual(self._connexion('awa', 'faux').status_code, 401)
+
+
+class ExportsTests(TestCase):
+
+    def setUp(self):
+        self.client = client_connecte()
+
+    def _contenu(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_filtre(self):
+        annee, classe, recs = creer_donnees(3)
+        TableVersement.objects.create(recouvrement=recs[0], montant=100000)
+        TableVersement.objects.create(recouvrement=recs[1], montant=300000)
+        lignes = self._contenu('/api/exports/recouvrements.csv').decode('utf-8-sig').splitlines()
+        self.assertEqual(lignes[0], 'Matricule;Élève;Année;Classe;Frais;Payé;Reste;Statut')
+        self.assertEqual([l.split(';')[-2:] for l in lignes[1:]],
+                         [['200000', 'EN COURS'], ['0', 'TERMINÉ'], ['300000', 'AUCUN PAIEMENT']])
+
+        filtre = self._contenu('/api/exports/recouvrements.csv', statut_paiement='termine').decode('utf-8-sig')
+        self.assertEqual(len(filtre.splitlines()), 2)
+        self.assertEqual(self.client.get('/api/exports/recouvrements.csv', {'statut_paiement': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/exports/eleves.csv').status_code, 404)
+        self.assertIn(APIClient().get('/api/exports/recouvrements.csv').status_code, (401, 403))
+
+    def test_xlsx_lisible(self):
+        import zipfile
+        from xml.etree import ElementTree
+        creer_donnees(2)
+        contenu = self._contenu('/api/exports/affectations.xlsx', niveau='clg')
+        with zipfile.ZipFile(io.BytesIO(contenu)) as classeur:
+            self.assertIsNone(classeur.testzip())
+            feuille = ElementTree.fromstring(classeur.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        lignes = [[''.join(c.itertext()) for c in row] for row in feuille.iterfind('.//s:row', ns)]
+        self.assertEqual(lignes[0][:2], ['Matricule', 'Élève'])
+        self.assertEqual(sorted(l[1] for l in lignes[1:]), ['Aïssatou Diallo0', 'Aïssatou Diallo1'])
+
+    def test_memoire_bornee(self):
+        import tracemalloc
+        from unittest import mock
+        from .management.commands.bench import donnees_synthetiques
+        from .views import ExportAPIView
+        donnees_synthetiques(3000, nb_classes=30)
+        classe = TableClasse.objects.get(code_classe='BENCH0')
+
+        def pic(**params):
+            response = self.client.get('/api/exports/recouvrements.csv', params)
+            tracemalloc.start()
+            premier = next(iter(response.streaming_content))  # envoyé avant la lecture des lignes
+            taille = len(premier) + sum(len(m) for m in response.streaming_content)
+            pic = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return taille, pic
+
+        from . import exports
+        with mock.patch.object(ExportAPIView, 'taille_lot', 100), mock.patch.object(exports, 'LIGNES_PAR_MORCEAU', 50):
+            petite, pic_petit = pic(classe=classe.pk)  # 100 lignes
+            grande, pic_grand = pic()  # 3000 lignes
+        self.assertGreater(grande, 25 * petite)
+        self.assertLess(pic_grand, 1.5 * pic_petit)  # 30 fois plus de lignes, même mémoire
@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from .views import *
 
@@ -14,11 +14,19 @@ router.register(r'classes', ClasseViewSet)
 router.register(r'frais', FraisScolariteViewSet)
 router.register(r'affectations', AffectationViewSet)
 router.register(r'recouvrements', RecouvrementViewSet)
+router.register(r'versements', VersementViewSet)
 
 
 urlpatterns = [
     # 👉 Endpoint d’API de stats (APIView)
     path('stats/recouvrement/', StatsRecouvrementAPIView.as_view(), name='stats-recouvrement'),
+    path('stats/encaissements/', EncaissementsAPIView.as_view(), name='stats-encaissements'),
+    path('stats/dashboard/', DashboardAPIView.as_view(), name='stats-dashboard'),
+    path('stats/cache/', CacheStatsAPIView.as_view(), name='stats-cache'),
+    # 👉 Exports en flux (CSV / Excel), mêmes filtres que les listes
+    re_path(r'^exports/(?P<table>recouvrements|affectations)\.(?P<extension>csv|xlsx)$', ExportAPIView.as_view(), name='exports'),
+    # 👉 Listes compactes pour les listes déroulantes
+    path('lookup/eleves/', LookupElevesAPIView.as_view(), name='lookup-eleves'),
     # 👉 Tous les ViewSets (router DRF)
     path('', include(router.urls)),
 ]
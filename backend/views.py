@@ -2,17 +2,34 @@ from rest_framework import permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import viewsets, filters,status
-from django.contrib.auth.hashers import check_password
 from django_filters.rest_framework import DjangoFilterBackend
-from django.utils import timezone
 from .models import *
 from .serializers import *
+from .exports import flux_csv, flux_xlsx
+from .jetons import emettre as emettre_jetons, lire_refresh
+from django.core import signing
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 # views.py
+import csv
+import hashlib
+import io
+import logging
+from datetime import date
 from decimal import Decimal
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import Coalesce
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import Coalesce, ExtractYear, Greatest
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+logger = logging.getLogger(__name__)
 
 def _to_int(x):
     try:
@@ -89,6 +106,134 @@ def _apply_filters_rec(qs, params):
     return qs
 
 
+STATUTS_PAIEMENT = {
+    # Mêmes règles que le badge de app/recouvrements/page.tsx (reste = frais - payé)
+    "termine": Q(total_paye__gte=Coalesce("frais_paiement", Decimal(0))),
+    "aucun_paiement": Q(total_paye__lte=0, frais_paiement__gt=0),
+    "en_cours": Q(total_paye__gt=0, total_paye__lt=F("frais_paiement")),
+}
+
+
+def _apply_search_rec(qs, params):
+    """
+    Recherche + statut de paiement pour la liste des recouvrements :
+    - search : fragment du nom complet ou du matricule de l'élève
+    - statut_paiement : aucun_paiement | en_cours | termine (insensible à la casse)
+    """
+    search = (params.get("search") or "").strip()
+    statut = (params.get("statut_paiement") or "").strip().lower()
+
+    if search:
+        qs = qs.filter(
+            Q(affectation__eleve_aff__fullname__icontains=search)
+            | Q(affectation__eleve_aff__matricule__icontains=search)
+        )
+
+    if statut:
+        if statut not in STATUTS_PAIEMENT:
+            raise ValidationError({"statut_paiement": f"Valeurs possibles : {', '.join(STATUTS_PAIEMENT)}"})
+        qs = qs.filter(STATUTS_PAIEMENT[statut])
+
+    return qs
+
+
+def _kpi_recouvrements(qs):
+    """Totaux de la sélection (une seule requête d'agrégat), pour les cartes de la page"""
+    frais = Coalesce("frais_paiement", Decimal(0))
+    agg = qs.order_by().aggregate(
+        nb=Count("id"),
+        frais=Coalesce(Sum(frais), Decimal(0)),
+        paye=Coalesce(Sum("total_paye"), Decimal(0)),
+        restant=Coalesce(Sum(Greatest(frais - F("total_paye"), Decimal(0))), Decimal(0)),
+    )
+    total_frais = _to_int(agg["frais"])
+    total_paye = _to_int(agg["paye"])
+    total_restant = _to_int(agg["restant"])
+    return {
+        "count": agg["nb"],
+        "total_frais": total_frais,
+        "total_paye": total_paye,
+        "total_restant": total_restant,
+        # En pourcentage (0-100), comme StatsRecouvrementAPIView
+        "pct_paye": round(total_paye * 100 / total_frais, 1) if total_frais else 0.0,
+        "pct_restant": round(total_restant * 100 / total_frais, 1) if total_frais else 0.0,
+    }
+
+
+def _q_filters_stats(params):
+    """
+    Mêmes filtres que _apply_filters_aff / _apply_filters_rec, sur TableStatRecouvrement,
+    sous forme de Q (utilisable dans un agrégat conditionnel : Sum(..., filter=q))
+    """
+    annee = params.get("annee")
+    classe = params.get("classe")
+    niveau = params.get("niveau")
+    option = params.get("option")
+    q = Q()
+
+    if annee:
+        if str(annee).isdigit():
+            q &= Q(annee_id=int(annee))
+        else:
+            q &= Q(annee__annee_scolaire=annee)
+
+    if classe:
+        if str(classe).isdigit():
+            q &= Q(classe_id=int(classe))
+        else:
+            q &= Q(classe__lib_classe=classe)
+
+    if niveau:
+        q &= Q(classe__niveau_classe=niveau)
+
+    if option:
+        q &= Q(classe__option_classe=option)
+
+    return q
+
+
+def _apply_filters_stats(qs, params):
+    return qs.filter(_q_filters_stats(params))
+
+
+# Écritures qui invalident le cache des statistiques (compteurs TableCompteurModif ;
+# un versement passe par TableRecouvrement.recalculer_total_paye)
+TABLES_STATS = (TableAnnee, TableClasse, TableAffectation, TableRecouvrement)
+FILTRES_STATS = ("annee", "classe", "niveau", "option")
+
+
+def version_donnees_stats():
+    """Version globale des données : somme de compteurs qui ne font que croître"""
+    return sum(TableCompteurModif.versions(*TABLES_STATS).values())
+
+
+def _cle_cache_stats(params):
+    filtres = sorted((k, str(params.get(k)).strip()) for k in FILTRES_STATS if str(params.get(k) or "").strip())
+    empreinte = hashlib.md5(repr(filtres).encode()).hexdigest()
+    return f"eco:stats:recouvrement:v{version_donnees_stats()}:{empreinte}"
+
+
+def _compteur_cache(nom):
+    cle = f"eco:stats:compteur:{nom}"
+    cache.add(cle, 0, timeout=None)
+    try:
+        cache.incr(cle)
+    except ValueError:  # expulsée entre add() et incr()
+        cache.set(cle, 1, timeout=None)
+
+
+def compteurs_cache_stats():
+    hits = cache.get("eco:stats:compteur:hits", 0)
+    misses = cache.get("eco:stats:compteur:misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        "version_donnees": version_donnees_stats(),
+        "backend": settings.CACHES["default"]["BACKEND"],
+    }
+
+
 class StatsRecouvrementAPIView(APIView):
     """
     GET /api/stats/recouvrement/?annee=2025-2026&classe=4ème A&niveau=clg&option=sm
@@ -98,104 +243,89 @@ class StatsRecouvrementAPIView(APIView):
     - totaux filtrés
     - stats (payé, restant)
     - répartitions (classe, niveau, option)
+
+    Lit TableStatRecouvrement (quelques lignes par année/classe) au lieu de
+    parcourir tous les dossiers de recouvrement.
     """
 
     permission_classes = [permissions.IsAuthenticated]  # ajuste selon ton projet
 
     def get(self, request, *args, **kwargs):
-        params = request.query_params
-
-        # --- QuerySets de base
-        qs_aff_all = TableAffectation.objects.all()
-        qs_rec_all = TableRecouvrement.objects.all()
-
-        # --- Totaux globaux (sans filtre)
-        total_affectations_global = qs_aff_all.values("id").distinct().count()
-        total_recouvrements_global = qs_rec_all.values("id").distinct().count()
-
-        # --- Application des filtres
-        qs_aff = _apply_filters_aff(qs_aff_all, params)
-        qs_rec = _apply_filters_rec(qs_rec_all, params)
-
-        # --- Comptages DISTINCT
-        nb_affectes_filtre = qs_aff.values("id").distinct().count()
-        nb_recouv_filtre = qs_rec.values("affectation_id").distinct().count()
-
-        # --- Agrégations monétaires (filtres appliqués)
-        agg_rec = qs_rec.aggregate(
-            frais=Coalesce(Sum("frais_paiement"), 0),
-            paye=Coalesce(Sum("total_paye"), 0),
+        """
+        Réponse mise en cache (cache Django, voir CACHES / ECO_CACHE) par filtres normalisés
+        et par version des données : toute écriture sur les tables suivies change la clé.
+        """
+        cle = _cle_cache_stats(request.query_params)
+        data = cache.get(cle)
+        if data is None:
+            _compteur_cache("misses")
+            data = self.calculer(request.query_params)
+            cache.set(cle, data)
+            etat = "MISS"
+        else:
+            _compteur_cache("hits")
+            etat = "HIT"
+        response = Response(data, status=status.HTTP_200_OK)
+        response["X-Cache"] = etat
+        return response
+
+    def calculer(self, params):
+        """
+        Une seule requête : GROUP BY (classe, niveau, option) sur TableStatRecouvrement.
+        Totaux globaux = agrégats simples, totaux filtrés = agrégats conditionnels
+        (Sum(..., filter=q)) ; totaux et répartitions sont ensuite dérivés en Python.
+        """
+        zero = Decimal(0)
+        filtre = _q_filters_stats(params) or None
+        # Seules les lignes ayant des dossiers de recouvrement apparaissent dans les répartitions
+        avec_rec = Q(nb_recouvrements__gt=0) & (filtre or Q())
+
+        groupes = list(
+            TableStatRecouvrement.objects.order_by()
+            .values("classe__lib_classe", "classe__niveau_classe", "classe__option_classe")
+            .annotate(
+                aff_global=Coalesce(Sum("nb_affectations"), 0),
+                rec_global=Coalesce(Sum("nb_recouvrements"), 0),
+                aff=Coalesce(Sum("nb_affectations", filter=filtre), 0),
+                rec=Coalesce(Sum("nb_recouvrements", filter=filtre), 0),
+                # total_frais / total_paye d'une ligne viennent de ses dossiers : 0 sans dossier
+                frais=Coalesce(Sum("total_frais", filter=filtre), zero),
+                paye=Coalesce(Sum("total_paye", filter=filtre), zero),
+                nb_paye=Coalesce(Sum("nb_avec_paiement", filter=avec_rec), 0),
+                lignes_rec=Count("id", filter=avec_rec),
+            )
         )
-        total_frais = _to_int(agg_rec["frais"])
-        total_paye = _to_int(agg_rec["paye"])
+
+        total_frais = sum(_to_int(g["frais"]) for g in groupes)
+        total_paye = sum(_to_int(g["paye"]) for g in groupes)
         total_restant = max(0, total_frais - total_paye)
 
         pct_paye = float((total_paye / total_frais) * 100) if total_frais > 0 else 0.0
         pct_restant = float((total_restant / total_frais) * 100) if total_frais > 0 else 0.0
 
-        # --- Par classe (empilé payé / restant)
-        # group by libellé de classe
-        par_classe_rows = (
-            qs_rec
-            .values("affectation__classe_aff__lib_classe")
-            .annotate(
-                total_frais=Coalesce(Sum("frais_paiement"), 0),
-                total_paye=Coalesce(Sum("total_paye"), 0),
-            )
-            .order_by("affectation__classe_aff__lib_classe")
-        )
-
-        par_classe = []
-        for r in par_classe_rows:
-            name = r["affectation__classe_aff__lib_classe"] or "N/A"
-            paye = _to_int(r["total_paye"])
-            frais = _to_int(r["total_frais"])
-            restant = max(0, frais - paye)
-            par_classe.append({
-                "name": name,
-                "paye": paye,
-                "restant": restant,
-                "total": frais,
-            })
-
-        # --- Par niveau : nb dossiers avec paiement > 0
-        par_niveau_rows = (
-            qs_rec
-            .values("affectation__classe_aff__niveau_classe")
-            .annotate(nb=Count("id", filter=Q(total_paye__gt=0)))
-            .order_by("affectation__classe_aff__niveau_classe")
-        )
-        par_niveau = [
-            {
-                "name": r["affectation__classe_aff__niveau_classe"] or "N/A",
-                "total": r["nb"] or 0,
-            }
-            for r in par_niveau_rows
-        ]
-
-        # --- Par option : nb dossiers avec paiement > 0
-        par_option_rows = (
-            qs_rec
-            .values("affectation__classe_aff__option_classe")
-            .annotate(nb=Count("id", filter=Q(total_paye__gt=0)))
-            .order_by("affectation__classe_aff__option_classe")
-        )
-        par_option = [
-            {
-                "name": r["affectation__classe_aff__option_classe"] or "N/A",
-                "total": r["nb"] or 0,
-            }
-            for r in par_option_rows
-        ]
+        # --- Répartitions (même ordre que ORDER BY : NULL en tête, puis ordre du texte)
+        par_classe, par_niveau, par_option = {}, {}, {}
+        for g in groupes:
+            if not g["lignes_rec"]:
+                continue
+            ligne = par_classe.setdefault(g["classe__lib_classe"], {"paye": 0, "frais": 0})
+            ligne["paye"] += _to_int(g["paye"])
+            ligne["frais"] += _to_int(g["frais"])
+            # Par niveau / par option : nb dossiers avec paiement > 0
+            par_niveau[g["classe__niveau_classe"]] = par_niveau.get(g["classe__niveau_classe"], 0) + g["nb_paye"]
+            par_option[g["classe__option_classe"]] = par_option.get(g["classe__option_classe"], 0) + g["nb_paye"]
+
+        def ordre(cle):
+            return (cle is not None, cle or "")
 
         data = {
             # --- Totaux globaux (sans filtre)
-            "total_affectations": total_affectations_global,
-            "total_recouvrements": total_recouvrements_global,
+            "total_affectations": sum(g["aff_global"] for g in groupes),
+            "total_recouvrements": sum(g["rec_global"] for g in groupes),
 
             # --- Totaux filtrés
-            "nb_affectes_filtre": nb_affectes_filtre,     # ← Doit pouvoir afficher 27 si filtres larges
-            "nb_recouv_filtre": nb_recouv_filtre,
+            "nb_affectes_filtre": sum(g["aff"] for g in groupes),     # ← Doit pouvoir afficher 27 si filtres larges
+            "nb_recouv_filtre": sum(g["rec"] for g in groupes),
 
             # --- Montants filtrés
             "total_frais": total_frais,
@@ -205,35 +335,304 @@ class StatsRecouvrementAPIView(APIView):
             "pct_restant": round(pct_restant, 1),
 
             # --- Répartitions
-            "par_classe": par_classe,
-            "par_niveau": par_niveau,
-            "par_option": par_option,
+            "par_classe": [
+                {
+                    "name": nom or "N/A",
+                    "paye": v["paye"],
+                    "restant": max(0, v["frais"] - v["paye"]),
+                    "total": v["frais"],
+                }
+                for nom, v in sorted(par_classe.items(), key=lambda kv: ordre(kv[0]))
+            ],
+            "par_niveau": [{"name": k or "N/A", "total": v} for k, v in sorted(par_niveau.items(), key=lambda kv: ordre(kv[0]))],
+            "par_option": [{"name": k or "N/A", "total": v} for k, v in sorted(par_option.items(), key=lambda kv: ordre(kv[0]))],
         }
 
+        return data
+
+
+class CacheStatsAPIView(APIView):
+    """
+    GET /api/stats/cache/  -> compteurs hits / misses du cache des statistiques,
+    version courante des données et backend de cache utilisé (supervision).
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(compteurs_cache_stats(), status=status.HTTP_200_OK)
+
+def _statut_paiement(frais, paye):
+    """Libellé du badge de app/recouvrements/page.tsx (voir STATUTS_PAIEMENT)"""
+    reste = (frais or 0) - (paye or 0)
+    if reste <= 0:
+        return "TERMINÉ"
+    return "AUCUN PAIEMENT" if not paye else "EN COURS"
+
+
+class ExportAPIView(APIView):
+    """
+    GET /api/exports/recouvrements.csv|.xlsx  ?annee=&classe=&niveau=&option=&search=&statut_paiement=
+    GET /api/exports/affectations.csv|.xlsx   ?annee=&classe=&niveau=&option=
+    Mêmes filtres que les listes. Les lignes sont lues par lots de `taille_lot`
+    (values_list().iterator()) et envoyées au fur et à mesure : mémoire constante et
+    premiers octets envoyés avant la fin de la lecture, quel que soit le nombre de lignes.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]  # noms, matricules et paiements de toute la sélection
+    taille_lot = 2000
+    COLONNES = {
+        'recouvrements': (
+            ("Matricule", 'affectation__eleve_aff__matricule'),
+            ("Élève", 'affectation__eleve_aff__fullname'),
+            ("Année", 'affectation__annee_aff__annee_scolaire'),
+            ("Classe", 'affectation__classe_aff__lib_classe'),
+            ("Frais", 'frais_paiement'),
+            ("Payé", 'total_paye'),
+        ),
+        'affectations': (
+            ("Matricule", 'eleve_aff__matricule'),
+            ("Élève", 'eleve_aff__fullname'),
+            ("Sexe", 'eleve_aff__sexe'),
+            ("Année", 'annee_aff__annee_scolaire'),
+            ("Classe", 'classe_aff__lib_classe'),
+            ("Niveau", 'classe_aff__niveau_classe'),
+            ("Option", 'classe_aff__option_classe'),
+            ("État", 'etat_aff'),
+        ),
+    }
+
+    def _lignes(self, table, params):
+        entetes = [e for e, _ in self.COLONNES[table]]
+        champs = [c for _, c in self.COLONNES[table]]
+        if table == 'recouvrements':
+            qs = _apply_search_rec(_apply_filters_rec(TableRecouvrement.objects.all(), params), params)
+        else:
+            qs = _apply_filters_aff(TableAffectation.objects.all(), params)
+        lignes = qs.order_by('id').values_list(*champs).iterator(chunk_size=self.taille_lot)
+
+        if table == 'recouvrements':
+            entetes += ["Reste", "Statut"]
+            lignes = (
+                (*ligne, max((ligne[4] or 0) - (ligne[5] or 0), 0), _statut_paiement(ligne[4], ligne[5]))
+                for ligne in lignes
+            )
+        return entetes, lignes
+
+    def get(self, request, table, extension):
+        entetes, lignes = self._lignes(table, request.query_params)
+        nom = f"{table}_{timezone.localdate():%Y%m%d}.{extension}"
+        if extension == 'csv':
+            reponse = StreamingHttpResponse(flux_csv(entetes, lignes), content_type='text/csv; charset=utf-8')
+        else:
+            reponse = StreamingHttpResponse(
+                flux_xlsx(table.capitalize(), entetes, lignes),
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
+        reponse['Content-Disposition'] = f'attachment; filename="{nom}"'
+        return reponse
+
+
+class LookupElevesAPIView(APIView):
+    """
+    Liste compacte pour les listes déroulantes (AffectationModal...) :
+    - GET /api/lookup/eleves/?q=dia&limit=20  -> recherche indexée (TableEleve.rechercher)
+    - GET /api/lookup/eleves/?id=12,15        -> élèves donnés (pré-sélection d'un formulaire)
+    Renvoie seulement [{id, fullname, matricule}, ...], sans instancier les modèles.
+    """
+
+    CHAMPS = ('id', 'fullname', 'matricule')
+    LIMITE = 50
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        if params.get('id'):
+            ids = [i for i in (_to_int(v) for v in params['id'].split(',')) if i]
+            qs = TableEleve.objects.filter(id__in=ids[:self.LIMITE])
+        else:
+            limite = min(max(_to_int(params.get('limit')) or 20, 1), self.LIMITE)
+            qs = TableEleve.rechercher(params.get('q', ''), limite)
+        return Response(list(qs.values(*self.CHAMPS)), status=status.HTTP_200_OK)
+
+def _parse_date(valeur):
+    try:
+        return date.fromisoformat(valeur) if valeur else None
+    except ValueError:
+        return None
+
+
+class EncaissementsAPIView(APIView):
+    """
+    GET /api/stats/encaissements/?du=2025-10-01&au=2025-10-31&annee=2025-2026&classe=...&niveau=...&option=...
+
+    Montants encaissés (journal TableVersement) :
+    - par jour, par semaine (ISO) et par mois
+    - total de la période
+    Un seul GROUP BY sur date_versement (indexé) ; semaines et mois sont
+    déduits des lignes journalières. Les versements sans date sont ignorés.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]  # ajuste selon ton projet
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        du = _parse_date(params.get("du"))
+        au = _parse_date(params.get("au"))
+
+        qs = TableVersement.objects.filter(date_versement__isnull=False)
+        if du:
+            qs = qs.filter(date_versement__gte=du)
+        if au:
+            qs = qs.filter(date_versement__lte=au)
+        if any(params.get(k) for k in ("annee", "classe", "niveau", "option")):
+            qs = qs.filter(recouvrement__in=_apply_filters_rec(TableRecouvrement.objects.all(), params))
+
+        jours = (
+            qs.values("date_versement")
+            .annotate(total=Sum("montant"), nb=Count("id"))
+            .order_by("date_versement")
+        )
+
+        par_jour, semaines, mois = [], {}, {}
+        for r in jours:
+            d, total, nb = r["date_versement"], _to_int(r["total"]), r["nb"]
+            par_jour.append({"date": d.isoformat(), "total": total, "nb": nb})
+
+            annee_iso, semaine_iso, _ = d.isocalendar()
+            for cle, acc in ((f"{annee_iso}-S{semaine_iso:02d}", semaines), (d.strftime("%Y-%m"), mois)):
+                ligne = acc.setdefault(cle, {"total": 0, "nb": 0})
+                ligne["total"] += total
+                ligne["nb"] += nb
+
+        data = {
+            "du": du.isoformat() if du else None,
+            "au": au.isoformat() if au else None,
+            "total": sum(r["total"] for r in par_jour),
+            "nb_versements": sum(r["nb"] for r in par_jour),
+            "par_jour": par_jour,
+            "par_semaine": [{"semaine": k, **v} for k, v in semaines.items()],
+            "par_mois": [{"mois": k, **v} for k, v in mois.items()],
+        }
         return Response(data, status=status.HTTP_200_OK)
 
+# Tables lues par le tableau de bord : leur compteur de modifications fait l'ETag
+TABLES_DASHBOARD = (TableAnnee, TableClasse, TableEleve, TableAffectation, TableRecouvrement, TableVersement)
+
+
+def _etag_dashboard(request, *args, **kwargs):
+    versions = TableCompteurModif.versions(*TABLES_DASHBOARD)
+    return hashlib.md5(repr(sorted(versions.items())).encode()).hexdigest()
+
+
+def _compter(acc, cle, nb):
+    acc[cle] = acc.get(cle, 0) + nb
+
+
+@method_decorator(condition(etag_func=_etag_dashboard), name='get')
+class DashboardAPIView(APIView):
+    """
+    GET /api/stats/dashboard/
+
+    Tous les agrégats du tableau de bord en une réponse (GROUP BY côté base) :
+    - eleves : total, par sexe, par année d'ajout
+    - affectations : total, par niveau / option / état, et le détail par année scolaire
+    - recouvrement : totaux + une ligne par (année, classe) issue de TableStatRecouvrement,
+      que le front filtre sans recharger les dossiers
+
+    ETag calculé à partir de TableCompteurModif : If-None-Match identique -> 304 sans calcul.
+    """
+
+    def get(self, request, *args, **kwargs):
+        # --- Élèves : GROUP BY (année d'ajout, sexe)
+        eleves = {"total": 0, "par_sexe": {"M": 0, "F": 0, "O": 0}, "par_annee_ajout": []}
+        par_annee_ajout = {}
+        rows = (
+            TableEleve.objects.order_by()
+            .annotate(annee=ExtractYear("dateajout"))
+            .values("annee", "sexe")
+            .annotate(nb=Count("id"))
+        )
+        for r in rows:
+            eleves["total"] += r["nb"]
+            _compter(eleves["par_sexe"], r["sexe"], r["nb"])
+            ligne = par_annee_ajout.setdefault(r["annee"], {"annee": r["annee"], "total": 0})
+            ligne["total"] += r["nb"]
+            _compter(ligne, r["sexe"], r["nb"])
+        eleves["par_annee_ajout"] = [par_annee_ajout[a] for a in sorted(par_annee_ajout, key=lambda a: a or 0)]
+
+        # --- Affectations : GROUP BY (année, niveau, option, état)
+        affectations = {"total": 0, "par_niveau": {}, "par_option": {}, "par_etat": {}, "par_annee": []}
+        par_annee = {}
+        rows = (
+            TableAffectation.objects.order_by()
+            .values("annee_aff__annee_scolaire", "classe_aff__niveau_classe", "classe_aff__option_classe", "etat_aff")
+            .annotate(nb=Count("id"))
+        )
+        for r in rows:
+            nom = r["annee_aff__annee_scolaire"] or "N/A"
+            ligne = par_annee.setdefault(nom, {"annee": nom, "total": 0, "par_niveau": {}, "par_option": {}, "par_etat": {}})
+            for acc in (affectations, ligne):
+                acc["total"] += r["nb"]
+                _compter(acc["par_niveau"], r["classe_aff__niveau_classe"] or "aut", r["nb"])
+                _compter(acc["par_option"], r["classe_aff__option_classe"] or "aut", r["nb"])
+                _compter(acc["par_etat"], r["etat_aff"] or "Aut", r["nb"])
+        affectations["par_annee"] = [par_annee[a] for a in sorted(par_annee)]
+
+        # --- Recouvrement : lignes matérialisées (année, classe)
+        lignes = [
+            {
+                "annee_nom": r["annee__annee_scolaire"] or "",
+                "classe_nom": r["classe__lib_classe"] or "",
+                "niveau_classe": r["classe__niveau_classe"] or "",
+                "option_classe": r["classe__option_classe"] or "",
+                "nb_affectations": r["nb_affectations"],
+                "nb_recouvrements": r["nb_recouvrements"],
+                "nb_avec_paiement": r["nb_avec_paiement"],
+                "total_frais": _to_int(r["total_frais"]),
+                "total_paye": _to_int(r["total_paye"]),
+            }
+            for r in TableStatRecouvrement.objects.order_by("annee__annee_scolaire", "classe__lib_classe").values(
+                "annee__annee_scolaire", "classe__lib_classe", "classe__niveau_classe", "classe__option_classe",
+                *TableStatRecouvrement.CHAMPS_TOTAUX,
+            )
+        ]
+        recouvrement = {k: sum(l[k] for l in lignes) for k in TableStatRecouvrement.CHAMPS_TOTAUX}
+        recouvrement["total_restant"] = max(0, recouvrement["total_frais"] - recouvrement["total_paye"])
+        recouvrement["pct_paye"] = (
+            round(recouvrement["total_paye"] * 100 / recouvrement["total_frais"], 1) if recouvrement["total_frais"] else 0.0
+        )
+        recouvrement["lignes"] = lignes
+
+        data = {"eleves": eleves, "affectations": affectations, "recouvrement": recouvrement}
+        response = Response(data, status=status.HTTP_200_OK)
+        # Le navigateur garde la réponse mais la revalide à chaque fois (-> 304 via l'ETag)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
 class LoginView(APIView):
     # On autorise tout le monde à essayer de se connecter
     permission_classes = [AllowAny] 
+    authentication_classes = []  # un jeton expiré envoyé par le front ne doit pas bloquer la connexion
 
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
 
         try:
-            user = TableUtilisateur.objects.get(username=username)
-            print(f"Utilisateur trouvé : {user.username}") # DEBUG
+            user = TableUtilisateur.objects.select_related('role').get(username=username)
+            logger.debug("Connexion : utilisateur %s trouvé", user.username)
 
-            is_correct = check_password(password, user.password)
-            print(f"Mot de passe valide ? {is_correct}") # DEBUG
+            # Re-hache au passage si le hacheur / ses itérations ont changé
+            is_correct = user.verifier_mot_de_passe(password)
 
             if is_correct:
                 if user.statut == 'Off':
+                    logger.warning("Connexion refusée : compte %s désactivé", user.username)
                     return Response({"error": "Compte désactivé"}, status=status.HTTP_403_FORBIDDEN)
                 
-                # Mise à jour de la date de connexion
-                user.derniereconnection = timezone.now()
-                user.save(update_fields=['derniereconnection'])
+                # Date de connexion : écrite par lot (TableUtilisateur.noter_connexion), pas un UPDATE par connexion
+                TableUtilisateur.noter_connexion(user.pk)
+                logger.info("Connexion de %s", user.username)
 
                 # On prépare uniquement les données de profil
                 user_data = {
@@ -244,44 +643,168 @@ class LoginView(APIView):
                     "photo": request.build_absolute_uri(user.photo.url) if user.photo else None
                 }
 
-                # On renvoie juste l'utilisateur, pas de tokens !
+                # Profil + jetons signés (Authorization: Bearer <access>, voir backend/jetons.py)
                 return Response({
                     "user": user_data,
-                    "message": "Connexion réussie"
+                    "message": "Connexion réussie",
+                    **emettre_jetons(user),
                 }, status=status.HTTP_200_OK)
             
             # Si le mot de passe est faux
+            logger.warning("Connexion refusée : mot de passe incorrect pour %s", user.username)
             return Response({"error": "Identifiants incorrects"}, status=status.HTTP_401_UNAUTHORIZED)
             
         except TableUtilisateur.DoesNotExist:
+            logger.warning("Connexion refusée : utilisateur %r inconnu", username)
             return Response({"error": "Utilisateur introuvable"}, status=status.HTTP_401_UNAUTHORIZED)
 
+class RafraichirJetonView(APIView):
+    """
+    POST /api/token/refresh/ {"refresh": "..."} -> nouvelle paire {access, refresh, expires_in}
+    Relit l'utilisateur : un compte désactivé ou supprimé n'obtient plus de jeton.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        try:
+            charge = lire_refresh(str(request.data.get('refresh', '')))
+        except signing.BadSignature:  # SignatureExpired compris
+            return Response({"error": "Jeton de rafraîchissement invalide ou expiré"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user = TableUtilisateur.objects.select_related('role').filter(pk=charge['id']).first()
+        if user is None or user.statut == 'Off':
+            return Response({"error": "Compte désactivé"}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(emettre_jetons(user), status=status.HTTP_200_OK)
+
+def _lire_lignes_import(request):
+    """Lignes d'un import en masse : liste JSON ou fichier CSV (champ "fichier")"""
+    fichier = request.FILES.get('fichier')
+    if fichier is not None:
+        texte = fichier.read().decode('utf-8-sig')
+        try:
+            dialecte = csv.Sniffer().sniff(texte[:4096], delimiters=',;\t')
+        except csv.Error:
+            dialecte = csv.excel
+        return [
+            {k.strip(): v.strip() for k, v in ligne.items() if k and v not in (None, '')}
+            for ligne in csv.DictReader(io.StringIO(texte), dialect=dialecte)
+        ]
+
+    data = request.data
+    if isinstance(data, dict) and 'eleves' in data:
+        data = data['eleves']
+    if not isinstance(data, list):
+        raise ValueError("Envoyer une liste JSON d'élèves ou un fichier CSV (champ 'fichier').")
+    return data
+
+def _valider_lignes_affectation(lignes):
+    """
+    Vérifie (en 3 requêtes pour tout le lot) que chaque ligne référence un élève,
+    une classe et une année existants. Normalise les ids en int. Retourne les erreurs par ligne.
+    """
+    champs = {'eleve_aff': TableEleve, 'classe_aff': TableClasse, 'annee_aff': TableAnnee}
+    etats = {c for c, _ in TableAffectation.etat_choix}
+    erreurs = []
+
+    for i, ligne in enumerate(lignes, start=1):
+        if not isinstance(ligne, dict):
+            erreurs.append({"ligne": i, "erreurs": "Objet attendu"})
+            continue
+        manquants = [c for c in champs if not str(ligne.get(c, '')).isdigit()]
+        if manquants:
+            erreurs.append({"ligne": i, "erreurs": {c: "Identifiant requis" for c in manquants}})
+            continue
+        for c in champs:
+            ligne[c] = int(ligne[c])
+        if ligne.get('etat_aff') and ligne['etat_aff'] not in etats:
+            erreurs.append({"ligne": i, "erreurs": {"etat_aff": f"Valeur invalide : {ligne['etat_aff']}"}})
+    if erreurs:
+        return erreurs
+
+    for champ, modele in champs.items():
+        demandes = {l[champ] for l in lignes}
+        inconnus = demandes - set(modele.objects.filter(pk__in=demandes).values_list('pk', flat=True))
+        erreurs += [
+            {"ligne": i, "erreurs": {champ: f"{l[champ]} introuvable"}}
+            for i, l in enumerate(lignes, start=1) if l[champ] in inconnus
+        ]
+    return erreurs
+
+def _elaguer_jointures(qs, chemins):
+    """
+    Retire de `qs` les select_related / prefetch_related qui ne mènent à aucun des
+    `chemins` de relations encore lus par le serializer (voir ChampsDynamiquesMixin).
+    """
+    jointures = qs.query.select_related
+    if isinstance(jointures, dict):
+        gardees = set()
+
+        def parcourir(arbre, prefixe):
+            for nom, sous_arbre in arbre.items():
+                chemin = prefixe + nom
+                if chemin in chemins:
+                    gardees.add(chemin)
+                parcourir(sous_arbre, chemin + '__')
+
+        parcourir(jointures, '')
+        qs = qs.select_related(None)
+        if gardees:
+            qs = qs.select_related(*gardees)
+
+    prefetchs = [
+        p for p in qs._prefetch_related_lookups
+        if (p if isinstance(p, str) else p.prefetch_to) in chemins
+    ]
+    return qs.prefetch_related(None).prefetch_related(*prefetchs)
+
+
+class ChampsDynamiquesViewSetMixin:
+    """
+    ?fields= / ?omit= (voir ChampsDynamiquesMixin) : le serializer ne garde que les
+    champs demandés et le queryset ne joint plus que les relations qu'ils lisent.
+    """
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.request.method not in ('GET', 'HEAD') or not any(champs_demandes(self.request.query_params)):
+            return qs
+        return _elaguer_jointures(qs, self.get_serializer().relations_utilisees())
+
+
 # Utilisation de ModelViewSet pour gérer automatiquement le CRUD
-class AnneeViewSet(viewsets.ModelViewSet):
+# (?fields= / ?omit= sur toutes les listes et fiches : ChampsDynamiquesViewSetMixin)
+# (les petites tables de référence ne sont jamais paginées : pagination_class = None)
+class AnneeViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
     queryset = TableAnnee.objects.all()
     serializer_class = AnneeSerializer
+    pagination_class = None
 
-class NiveauViewSet(viewsets.ModelViewSet):
+class NiveauViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
     queryset = TableNiveau.objects.all()
     serializer_class = NiveauSerializer
+    pagination_class = None
 
-class OptionViewSet(viewsets.ModelViewSet):
+class OptionViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
     queryset = TableOption.objects.all()
     serializer_class = OptionSerializer
+    pagination_class = None
 
-class RoleViewSet(viewsets.ModelViewSet):
+class RoleViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
     queryset = TableRole.objects.all()
     serializer_class = RoleSerializer
+    pagination_class = None
 
-class PermissionViewSet(viewsets.ModelViewSet):
+class PermissionViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
     queryset = TablePermission.objects.all()
     serializer_class = PermissionSerializer
+    pagination_class = None
 
-class UtilisateurViewSet(viewsets.ModelViewSet):
-    queryset = TableUtilisateur.objects.all()
+class UtilisateurViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
+    queryset = TableUtilisateur.objects.select_related('role').order_by('id')
     serializer_class = UtilisateurSerializer
 
-class EleveViewSet(viewsets.ModelViewSet):
+class EleveViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
     queryset = TableEleve.objects.all()
     serializer_class = EleveSerializer
     # C'EST CETTE LIGNE QUI PERMET D'ENREGISTRER SANS TOKEN :
@@ -291,18 +814,73 @@ class EleveViewSet(viewsets.ModelViewSet):
     # 2. On définit les champs sur lesquels on peut chercher
     # Le '^' signifie "commence par", le '@' est pour la recherche plein texte
     search_fields = ['fullname', 'matricule']
+    LIMITE_RECHERCHE = 100
+
+    @action(detail=False, methods=['get'])
+    def recherche(self, request):
+        """
+        GET /api/eleves/recherche/?q=aiss dia&limit=20
+        Recherche par début de mot, sans accents ni casse, sur le nom complet ou le
+        matricule (index, voir TableEleve.rechercher). Au plus `limit` résultats.
+        """
+        limite = min(max(_to_int(request.query_params.get('limit')) or 20, 1), self.LIMITE_RECHERCHE)
+        eleves = TableEleve.rechercher(request.query_params.get('q', ''), limite)
+        return Response(self.get_serializer(eleves, many=True).data)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, MultiPartParser, FormParser])
+    def bulk(self, request):
+        """
+        POST /api/eleves/bulk/           (?partiel=1 pour importer les lignes valides malgré des erreurs)
+        - JSON : [ {nom, prenom1, ...}, ... ]  ou  {"eleves": [...]}
+        - CSV  : multipart, champ "fichier" (séparateur , ou ; — en-têtes = noms des champs)
+
+        Toutes les lignes sont validées avant la première insertion ;
+        les erreurs sont renvoyées par numéro de ligne (1 = première ligne de données).
+        """
+        try:
+            lignes = _lire_lignes_import(request)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Un seul serializer pour toutes les lignes : ses champs ne sont construits qu'une fois
+        validateur = EleveSerializer()
+        valides, erreurs = [], []
+        for i, ligne in enumerate(lignes, start=1):
+            try:
+                valides.append(TableEleve(**validateur.run_validation(ligne)))
+            except ValidationError as e:
+                erreurs.append({"ligne": i, "erreurs": e.detail})
+
+        partiel = request.query_params.get('partiel') in ('1', 'true')
+        if erreurs and not partiel:
+            return Response(
+                {"crees": 0, "nb_lignes": len(lignes), "erreurs": erreurs},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-class ClasseViewSet(viewsets.ModelViewSet):
+        eleves = TableEleve.creer_en_masse(valides)
+        return Response({
+            "crees": len(eleves),
+            "nb_lignes": len(lignes),
+            "erreurs": erreurs,
+            "eleves": [{"id": e.id, "matricule": e.matricule, "fullname": e.fullname} for e in eleves],
+        }, status=status.HTTP_201_CREATED)
+
+class ClasseViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
     queryset = TableClasse.objects.all()
     serializer_class = ClasseSerializer
+    pagination_class = None
     search_fields = ['code_classe', 'lib_classe']
 
-class FraisScolariteViewSet(viewsets.ModelViewSet):
-    queryset = TableFraisScolarite.objects.all()
+class FraisScolariteViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
+    queryset = TableFraisScolarite.objects.select_related('classe_fs', 'annee_fs')
     serializer_class = FraisScolariteSerializer
 
-class AffectationViewSet(viewsets.ModelViewSet):
-    queryset = TableAffectation.objects.all().order_by('id')
+class AffectationViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
+    # Jointure unique : eleve_details / classe_nom / annee_nom sans requête par ligne
+    queryset = TableAffectation.objects.select_related(
+        'eleve_aff', 'classe_aff', 'annee_aff'
+    ).order_by('id')
     serializer_class = AffectationSerializer
     filterset_fields = ['eleve_aff', 'classe_aff', 'annee_aff']
 
@@ -321,11 +899,83 @@ class AffectationViewSet(viewsets.ModelViewSet):
         )
         return Response(self.get_serializer(obj).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-class RecouvrementViewSet(viewsets.ModelViewSet):
-    queryset = TableRecouvrement.objects.all().order_by('id')
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        POST /api/affectations/bulk/
+        [ {eleve_aff, classe_aff, annee_aff, etat_aff}, ... ]  ou  {"affectations": [...]}
+
+        Équivalent groupé de ensure (affectation) + ensure (recouvrement), en une transaction.
+        """
+        lignes = request.data.get('affectations') if isinstance(request.data, dict) else request.data
+        if not isinstance(lignes, list):
+            return Response({"detail": "Liste d'affectations attendue"}, status=status.HTTP_400_BAD_REQUEST)
+
+        erreurs = _valider_lignes_affectation(lignes)
+        if erreurs:
+            return Response({"erreurs": erreurs}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultat = TableAffectation.affecter_en_masse(lignes)
+        return Response(resultat, status=status.HTTP_201_CREATED if resultat['affectations_creees'] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def promotion(self, request):
+        """
+        POST /api/affectations/promotion/
+        {
+          "annee_source": "2024-2025",          (id ou libellé)
+          "annee_cible": "2025-2026",
+          "promotions": {"6A": "5A", "5A": "4A"},  (id ou code de classe)
+          "redoublants": [12, 57],              (ids d'élèves gardés dans leur classe)
+          "dry_run": true
+        }
+        """
+        data = request.data
+        try:
+            parametres = TableAffectation.parametres_promotion(
+                data.get('annee_source'), data.get('annee_cible'), data.get('promotions') or {}, data.get('redoublants') or []
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(data.get('dry_run', '')).lower() in ('1', 'true')
+        resultat = TableAffectation.promouvoir(*parametres, dry_run=dry_run)
+        return Response(resultat, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+class RecouvrementViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
+    # Les champs à plat du serializer (affectation.eleve_aff.fullname, ...) lisent
+    # tous la même chaîne de FK : on la charge en une seule requête jointe.
+    queryset = TableRecouvrement.objects.select_related(
+        'affectation__eleve_aff', 'affectation__classe_aff', 'affectation__annee_aff'
+    ).prefetch_related('versements').order_by('id')
     serializer_class = RecouvrementSerializer
     filterset_fields = ['affectation']  # si django-filter activé
 
+    def get_queryset(self):
+        """
+        GET /api/recouvrements/?annee=..&classe=..&niveau=..&option=..&search=..&statut_paiement=..
+        Mêmes filtres que /api/stats/recouvrement/, appliqués en SQL.
+        """
+        qs = super().get_queryset()
+        if self.action == 'list':
+            params = self.request.query_params
+            qs = _apply_search_rec(_apply_filters_rec(qs, params), params)
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        """
+        Page demandée (?page=&page_size= ou ?mode=cursor) + "kpi" : totaux de toute la
+        sélection filtrée, pas seulement de la page. Sans pagination : liste brute, comme avant.
+        """
+        qs = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(qs)
+        if page is None:
+            return Response(self.get_serializer(qs, many=True).data)
+
+        reponse = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        reponse.data['kpi'] = _kpi_recouvrements(qs)
+        return reponse
+
     @action(detail=False, methods=['post'])
     def ensure(self, request):
         aff_id = request.data.get('affectation')
@@ -333,3 +983,28 @@ class RecouvrementViewSet(viewsets.ModelViewSet):
             return Response({"detail": "affectation est requis"}, status=status.HTTP_400_BAD_REQUEST)
         rec, created = TableRecouvrement.objects.get_or_create(affectation_id=aff_id)
         return Response(self.get_serializer(rec).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get', 'post'])
+    def versements(self, request, pk=None):
+        """
+        GET  /api/recouvrements/<id>/versements/  -> journal des versements
+        POST /api/recouvrements/<id>/versements/  {montant, date_versement} -> ajoute un versement
+             et renvoie le recouvrement à jour (total_paye recalculé)
+        """
+        rec = self.get_object()
+        if request.method == 'GET':
+            return Response(VersementSerializer(rec.versements.all(), many=True).data)
+
+        data = request.data.copy()
+        data['recouvrement'] = rec.pk
+        serializer = VersementSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        rec = self.get_queryset().get(pk=rec.pk)
+        return Response(self.get_serializer(rec).data, status=status.HTTP_201_CREATED)
+
+class VersementViewSet(ChampsDynamiquesViewSetMixin, viewsets.ModelViewSet):
+    """Correction / suppression d'un versement (l'ajout passe par RecouvrementViewSet.versements)"""
+    queryset = TableVersement.objects.all().order_by('id')
+    serializer_class = VersementSerializer
+    filterset_fields = ['recouvrement']
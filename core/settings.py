@@ -59,7 +59,19 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny',], # Accès libre sans token
-    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.SessionAuthentication',], # Pour l'admin Django
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'backend.jetons.JetonAuthentication',  # Authorization: Bearer <jeton émis par LoginView>
+        'rest_framework.authentication.SessionAuthentication',  # Pour l'admin Django
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.EcoPagination', # ?page=, ?page_size= ou ?mode=cursor
+    'PAGE_SIZE': 50,
+}
+
+# Pagination des listes (voir backend/pagination.py)
+ECO_PAGINATION = {
+    'MAX_PAGE_SIZE': int(os.environ.get('ECO_MAX_PAGE_SIZE', 500)),
+    # True : sans paramètre de pagination, la liste complète est renvoyée (front actuel)
+    'OPTIONNELLE': os.environ.get('ECO_PAGINATION_OPTIONNELLE', '1') == '1',
 }
 
 # 3. Paramètres SimpleJWT (Optionnel mais recommandé)
@@ -72,6 +84,27 @@ REST_FRAMEWORK = {
 #    'AUTH_HEADER_TYPES': ('Bearer',),
 #}
 
+# Jetons signés émis par LoginView (voir backend/jetons.py), durées en secondes
+ECO_JETONS = {
+    'ACCES_TTL': int(os.environ.get('ECO_JETON_ACCES_TTL', 15 * 60)),
+    'REFRESH_TTL': int(os.environ.get('ECO_JETON_REFRESH_TTL', 12 * 3600)),
+    'REVOCATION_TTL': int(os.environ.get('ECO_JETON_REVOCATION_TTL', 60)),  # relecture des comptes désactivés
+}
+
+# Délai (s) avant l'écriture groupée des dates de dernière connexion (0 = à chaque connexion)
+ECO_DERNIERE_CONNEXION_DELAI = int(os.environ.get('ECO_DERNIERE_CONNEXION_DELAI', 30))
+
+# Journaux : console, niveau ECO_LOG_LEVEL pour l'application (DEBUG, INFO, WARNING...)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {'simple': {'format': '{asctime} {levelname} {name} : {message}', 'style': '{'}},
+    'handlers': {'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'}},
+    'loggers': {
+        'backend': {'handlers': ['console'], 'level': os.environ.get('ECO_LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -108,14 +141,83 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# ECO_DB = sqlite (défaut : développement, installation sur un seul poste)
+#        | postgresql (production : ECO_DB_NAME, ECO_DB_USER, ECO_DB_PASSWORD, ECO_DB_HOST, ECO_DB_PORT)
+ECO_DB = os.environ.get('ECO_DB', 'sqlite')
+
+if ECO_DB == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('ECO_DB_NAME', 'eco'),
+            'USER': os.environ.get('ECO_DB_USER', 'eco'),
+            'PASSWORD': os.environ.get('ECO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('ECO_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('ECO_DB_PORT', '5432'),
+            # Connexions persistantes (secondes), vérifiées avant d'être réutilisées
+            'CONN_MAX_AGE': int(os.environ.get('ECO_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
+    if os.environ.get('ECO_DB_POOL') == '1':
+        # Pool de connexions psycopg 3 (pip install "psycopg[pool]") ; remplace CONN_MAX_AGE
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('ECO_DB_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('ECO_DB_POOL_MAX', 10)),
+            },
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('ECO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Plusieurs caisses en même temps : WAL (voir ECO_SQLITE_PRAGMAS) et BEGIN IMMEDIATE
+                # (le verrou d'écriture est pris au début de la transaction : une écriture
+                # concurrente attend `timeout` secondes au lieu d'échouer en "database is locked").
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.environ.get('ECO_DB_TIMEOUT', 20)),
+            },
+            # Base de test sur fichier (et non en mémoire) : même mode WAL que la production,
+            # nécessaire aux tests d'écritures concurrentes.
+            'TEST': {'NAME': os.environ.get('ECO_DB_TEST_NAME', str(BASE_DIR / 'test_db.sqlite3'))},
+        }
+    }
+
+# PRAGMA appliqués à chaque nouvelle connexion SQLite (backend/signals.py, connection_created).
+# Installation sur un seul poste avec plusieurs caisses : voir `python manage.py bench ecritures`.
+ECO_SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('ECO_SQLITE_JOURNAL_MODE', 'WAL'),  # lectures et écriture en parallèle
+    'synchronous': os.environ.get('ECO_SQLITE_SYNCHRONOUS', 'NORMAL'),  # en WAL : pas de fsync à chaque commit
+    'cache_size': -int(os.environ.get('ECO_SQLITE_CACHE_KIO', 65536)),  # négatif = en Kio (64 Mio)
+    'busy_timeout': int(os.environ.get('ECO_DB_TIMEOUT', 20)) * 1000,  # ms
+    'mmap_size': int(os.environ.get('ECO_SQLITE_MMAP', 256 * 1024 * 1024)),  # octets, 0 = désactivé
+    'temp_store': 'MEMORY',
 }
 
 
+# Cache (réponses de /api/stats/recouvrement/, voir backend/views.py)
+# ECO_CACHE = locmem (défaut, par processus) | file (partagé entre workers d'une machine) | redis
+ECO_CACHE = os.environ.get('ECO_CACHE', 'locmem')
+_CACHES_ECO = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'eco',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('ECO_CACHE_DIR', str(BASE_DIR / 'cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('ECO_CACHE_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+CACHES = {'default': {**_CACHES_ECO[ECO_CACHE], 'TIMEOUT': int(os.environ.get('ECO_CACHE_TIMEOUT', 3600))}}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -154,4 +256,22 @@ STATIC_URL = 'static/'
 
 # Dossier où Django stockera les fichiers sur le disque
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Service des médias (voir backend/medias.py)
+# ECO_MEDIA_MODE = django (défaut) | x-accel (nginx) | x-sendfile (Apache) | aucun (le proxy sert MEDIA_URL)
+ECO_MEDIA = {
+    'MODE': os.environ.get('ECO_MEDIA_MODE', 'django'),
+    'X_ACCEL_PREFIX': os.environ.get('ECO_MEDIA_X_ACCEL_PREFIX', '/media-interne/'),
+    # Durées de cache navigateur (s), voir backend/medias.py
+    'MAX_AGE': int(os.environ.get('ECO_MEDIA_MAX_AGE', 365 * 24 * 3600)),  # miniatures (noms versionnés)
+    'MAX_AGE_PHOTOS': int(os.environ.get('ECO_MEDIA_MAX_AGE_PHOTOS', 0)),  # photos (nom réutilisable)
+}
+
+# Miniatures des photos élèves / utilisateurs (voir backend/miniatures.py)
+ECO_MINIATURES = {
+    'TAILLES': (64, 256),  # côté max, en px
+    'FORMAT': os.environ.get('ECO_MINIATURES_FORMAT', 'WEBP'),  # WEBP | JPEG
+    'QUALITE': int(os.environ.get('ECO_MINIATURES_QUALITE', 80)),
+    'WORKERS': int(os.environ.get('ECO_MINIATURES_WORKERS', 2)),  # 0 = au commit, dans la requête
+}
@@ -14,10 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from backend.medias import servir_media
 from backend.views import *
 #from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
@@ -29,6 +31,12 @@ urlpatterns = [
     path('api/login/', LoginView.as_view(), name='login_custom'), 
     # Route pour obtenir le Token (Login)
     #path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    # Route pour rafraîchir le Token
-    #path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Route pour rafraîchir le Token (jetons signés, voir backend/jetons.py)
+    path('api/token/refresh/', RafraichirJetonView.as_view(), name='token_refresh'),
+]
+
+# Photos et miniatures : en-têtes de cache, 304, Range, ou délégation au proxy (voir backend/medias.py)
+if settings.ECO_MEDIA['MODE'] != 'aucun':
+    urlpatterns.append(
+        re_path(r'^%s(?P<chemin>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), servir_media, name='media')
+    )
@@ -5,7 +5,7 @@ import React, { useState, useEffect } from "react";
 import axios from "axios";
 import { X, UserPlus, School, Calendar, Activity } from "lucide-react";
 import { toast } from "react-hot-toast";
-import Select from "react-select";
+import AsyncSelect from "react-select/async";
 
 interface Props {
     isOpen: boolean;
@@ -17,6 +17,22 @@ interface Props {
     onOpenRecouvrement?: (recouvrement: any) => void;
 }
 
+const API = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api";
+
+type OptionEleve = { value: string; label: string };
+
+/** Élève compact renvoyé par /lookup/eleves/ → option du select */
+function toOptionEleve(el: any): OptionEleve {
+    return { value: String(el.id), label: `${el.fullname} (${el.matricule})` };
+}
+
+/** Recherche indexée côté serveur (quelques Ko au lieu de toute la table élèves) */
+async function chercherEleves(q: string): Promise<OptionEleve[]> {
+    if (!q.trim()) return [];
+    const { data } = await axios.get(`${API}/lookup/eleves/`, { params: { q, limit: 20 } });
+    return data.map(toOptionEleve);
+}
+
 /** Convertit en entier sûr, sinon renvoie null */
 function toInt(value: any): number | null {
     const n = parseInt(String(value), 10);
@@ -101,34 +117,43 @@ async function ensureRecouvrement(affectationId: number) {
 /* ===================== Composant ===================== */
 export default function AffectationModal({isOpen,onClose,refreshList,selectedAffectation, initialEleveId,onOpenRecouvrement,}: Props) {
     const [formData, setFormData] = useState({annee_aff: "",classe_aff: "",eleve_aff: "",etat_aff: "Nouv",});
-    const [listes, setListes] = useState({annees: [] as any[], classes: [] as any[], eleves: [] as any[],});
+    const [listes, setListes] = useState({annees: [] as any[], classes: [] as any[],});
+    const [eleveChoisi, setEleveChoisi] = useState<OptionEleve | null>(null);
     const [saving, setSaving] = useState(false);
     const [openingRecouvrement, setOpeningRecouvrement] = useState(false);
 
-    /* ===================== Helpers communs ===================== */
-    const API = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api" || "http://127.0.0.1:8000/api" || "http://beapc:8000/api";
-
-
     /* ---------- Chargement listes + (ré)init form à l’ouverture ---------- */
     useEffect(() => {
         if (!isOpen) return;
 
         const fetchData = async () => {
             try {
-                const [resAn, resCl, resEl] = await Promise.all([
+                const [resAn, resCl] = await Promise.all([
                 axios.get(`${API}/annees/`),
                 axios.get(`${API}/classes/`),
-                axios.get(`${API}/eleves/`),
                 ]);
-                setListes({ annees: resAn.data, classes: resCl.data, eleves: resEl.data });
+                setListes({ annees: resAn.data, classes: resCl.data });
             } catch (error) {
                 toast.error("Erreur lors du chargement des listes");
                 console.error(error);
             }
         };
 
+        // Libellé de l'élève déjà sélectionné (modification / ouverture depuis la fiche élève)
+        const fetchEleve = async (id: number) => {
+            try {
+                const { data } = await axios.get(`${API}/lookup/eleves/`, { params: { id } });
+                setEleveChoisi(data.length ? toOptionEleve(data[0]) : null);
+            } catch (error) {
+                console.error(error);
+            }
+        };
+
         // (Re)chargement des listes
         fetchData();
+        const eleveId = toInt(selectedAffectation?.eleve_aff ?? initialEleveId);
+        setEleveChoisi(null);
+        if (eleveId) fetchEleve(eleveId);
 
         // Remplissage / Reset du formulaire
         if (selectedAffectation) {
@@ -247,14 +272,6 @@ export default function AffectationModal({isOpen,onClose,refreshList,selectedAff
 
   if (!isOpen) return null;
 
-  const eleveOptions = listes.eleves.map((el: any) => ({
-    value: el.id.toString(),
-    label: `${el.fullname} (${el.matricule})`,
-  }));
-
-  const selectedEleveOption =
-    formData.eleve_aff ? eleveOptions.find((opt) => opt.value === formData.eleve_aff.toString()) : null;
-
   return (
     <div className="fixed inset-0 z-[100] flex items-center justify-center p-4 bg-slate-900/40 backdrop-blur-sm">
       <div className="bg-white rounded-3xl w-full max-w-lg shadow-2xl border border-slate-100 overflow-hidden">
@@ -280,14 +297,18 @@ export default function AffectationModal({isOpen,onClose,refreshList,selectedAff
             <label className="flex items-center gap-2 text-xs font-bold text-slate-500 uppercase mb-2 ml-1">
               Élève
             </label>
-            <Select
-              options={eleveOptions}
-              value={selectedEleveOption}
-              onChange={(selected: any) => setFormData({ ...formData, eleve_aff: selected ? selected.value : "" })}
-              placeholder="Rechercher un élève..."
-              isSearchable
+            <AsyncSelect
+              loadOptions={chercherEleves}
+              cacheOptions
+              value={eleveChoisi}
+              onChange={(selected: any) => {
+                setEleveChoisi(selected);
+                setFormData({ ...formData, eleve_aff: selected ? selected.value : "" });
+              }}
+              placeholder="Rechercher un élève (nom ou matricule)..."
               isClearable
-              noOptionsMessage={() => "Aucun élève trouvé"}
+              noOptionsMessage={({ inputValue }) => (inputValue ? "Aucun élève trouvé" : "Tapez un nom ou un matricule")}
+              loadingMessage={() => "Recherche..."}
               styles={{
                 control: (base, state) => ({
                   ...base,
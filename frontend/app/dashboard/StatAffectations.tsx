@@ -21,13 +21,17 @@ const OPTION_CHOIX = [
   { value: 'aut', label: 'Autres' },
 ];
 
-interface Affectation {
-  annee_nom: string;
-  option_classe: string;
-  niveau_classe: string;
+type Comptes = Record<string, number>;
+
+export interface StatsAffectations {
+  total: number;
+  par_niveau: Comptes;
+  par_option: Comptes;
+  par_etat: Comptes;
+  par_annee: { annee: string; total: number; par_niveau: Comptes; par_option: Comptes; par_etat: Comptes }[];
 }
 
-export default function StatAffectations({ affectations = [] }: { affectations?: Affectation[] }) {
+export default function StatAffectations({ stats: donnees }: { stats?: StatsAffectations }) {
   const [selectedAnnee, setSelectedAnnee] = useState("");
 
   // Fonctions de traduction pour les graphiques
@@ -35,46 +39,29 @@ export default function StatAffectations({ affectations = [] }: { affectations?:
   const getOptionLabel = (val: string) => OPTION_CHOIX.find(o => o.value === val)?.label || val;
 
   const listeAnnees = useMemo(() => {
-    const annees = affectations.map(a => a.annee_nom).filter(Boolean); // Utilisation de annee_nom simplifié
-    return Array.from(new Set(annees)).sort().reverse();
-  }, [affectations]);
-
-  const dataFiltree = useMemo(() => {
-    return selectedAnnee 
-      ? affectations.filter(a => a.annee_nom === selectedAnnee)
-      : affectations;
-  }, [affectations, selectedAnnee]);
+    return (donnees?.par_annee ?? []).map(a => a.annee).sort().reverse();
+  }, [donnees]);
 
   const stats = useMemo(() => {
-    // 1. Par Année
-    const anneesMap = affectations.reduce((acc: Record<string, number>, a) => {
-      const label = a.annee_nom || "N/A";
-      acc[label] = (acc[label] || 0) + 1;
-      return acc;
-    }, {});
+    // Comptes déjà groupés par /api/stats/dashboard/ ; l'année choisie sélectionne son détail
+    const detail = selectedAnnee
+      ? donnees?.par_annee.find(a => a.annee === selectedAnnee)
+      : donnees;
 
-    // 2. Par Option (Traduction du code en Label)
-    const optionsMap = dataFiltree.reduce((acc: Record<string, number>, a) => {
-      const rawValue = a.option_classe || "aut";
-      const label = getOptionLabel(rawValue);
-      acc[label] = (acc[label] || 0) + 1;
-      return acc;
-    }, {});
-
-    // 3. Par Niveau (Traduction du code en Label)
-    const niveauxMap = dataFiltree.reduce((acc: Record<string, number>, a) => {
-      const rawValue = a.niveau_classe || "aut";
-      const label = getNiveauLabel(rawValue);
-      acc[label] = (acc[label] || 0) + 1;
-      return acc;
-    }, {});
+    const versListe = (comptes: Comptes = {}, label: (v: string) => string) => {
+      const map: Comptes = {};
+      for (const [code, total] of Object.entries(comptes)) {
+        map[label(code)] = (map[label(code)] || 0) + total;
+      }
+      return Object.keys(map).map(k => ({ name: k, total: map[k] }));
+    };
 
     return {
-      dataAnnee: Object.keys(anneesMap).map(k => ({ name: k, total: anneesMap[k] })),
-      dataOption: Object.keys(optionsMap).map(k => ({ name: k, total: optionsMap[k] })),
-      dataNiveau: Object.keys(niveauxMap).map(k => ({ name: k, total: niveauxMap[k] }))
+      dataAnnee: (donnees?.par_annee ?? []).map(a => ({ name: a.annee, total: a.total })),
+      dataOption: versListe(detail?.par_option, getOptionLabel),
+      dataNiveau: versListe(detail?.par_niveau, getNiveauLabel)
     };
-  }, [affectations, dataFiltree]);
+  }, [donnees, selectedAnnee]);
 
   return (
     <div className="space-y-3">
@@ -2,16 +2,18 @@
 import React, { useMemo } from 'react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, Cell } from 'recharts';
 
-interface Eleve {
-  sexe: 'M' | 'F' | 'O';
+export interface StatsEleves {
+  total: number;
+  par_sexe: { M?: number; F?: number; O?: number };
 }
 
-export default function StatEleve({ eleves = [] }: { eleves?: Eleve[] }) {
+export default function StatEleve({ stats: donnees }: { stats?: StatsEleves }) {
     const stats = useMemo(() => {
-    const total = eleves.length;
-    const garcons = eleves.filter(e => e.sexe === 'M').length;
-    const filles = eleves.filter(e => e.sexe === 'F').length;
-    const autres = eleves.filter(e => e.sexe === 'O').length;
+    // Comptes calculés par /api/stats/dashboard/
+    const total = donnees?.total ?? 0;
+    const garcons = donnees?.par_sexe?.M ?? 0;
+    const filles = donnees?.par_sexe?.F ?? 0;
+    const autres = donnees?.par_sexe?.O ?? 0;
     
     const pourcentageG = total > 0 ? ((garcons / total) * 100).toFixed(1) : "0";
     const pourcentageF = total > 0 ? ((filles / total) * 100).toFixed(1) : "0";
@@ -25,7 +27,7 @@ export default function StatEleve({ eleves = [] }: { eleves?: Eleve[] }) {
     ];
 
     return { total, garcons, filles, autres, pourcentageG, pourcentageF, pourcentageO, chartData };
-  }, [eleves]);
+  }, [donnees]);
 
   return (
     <div className="space-y-5">
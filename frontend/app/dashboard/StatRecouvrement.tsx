@@ -34,45 +34,26 @@ const OPTION_CHOIX: { value: string; label: string }[] = [
 ];
 
 /** ------------------------ Types ------------------------ */
-export interface Affectation {
+/** Une ligne par (année, classe) : TableStatRecouvrement, via /api/stats/dashboard/ */
+export interface LigneStat {
   annee_nom: string;
+  classe_nom: string;
   niveau_classe?: string;
   option_classe?: string;
-  classe_nom?: string;
-  affectation_id?: string | number;
-  id?: string | number; // fallback éventuel
-  eleve_id?: string | number; // fallback ancien schéma
-}
-
-export interface Recouvrement {
-  annee_nom: string;
-  niveau_classe?: string;
-  option_classe?: string;
-  classe_nom?: string;
-  affectation_id?: string | number; // utilisé pour les KPI/comptes
-  eleve_id?: string | number; // optionnel
-  frais_total: number;
-  montant_paye: number;
+  nb_affectations: number;
+  nb_recouvrements: number;
+  nb_avec_paiement: number;
+  total_frais: number;
+  total_paye: number;
 }
 
 export type StatRecouvrementsProps = {
-  affectations: Affectation[];
-  recouvrements: Recouvrement[];
+  lignes: LigneStat[];
 };
 
 /** ------------------------ Helpers ------------------------ */
 const toKey = (x?: string | number) => (x ?? "").toString().trim().toLowerCase();
 
-const getAffId = (o: Partial<Affectation & Recouvrement>): string => {
-  const v =
-    (o.affectation_id as string | number | undefined) ??
-    (o as any)?.affectationId ??
-    (o.id as string | number | undefined) ??
-    (o.eleve_id as string | number | undefined) ??
-    "";
-  return String(v);
-};
-
 const getNiveauLabel = (val?: string) =>
   NIVEAU_CHOIX.find((n) => n.value === val)?.label ?? (val ?? "N/A");
 
@@ -89,10 +70,7 @@ const fmtMoneyGNF = (v: number) =>
 const fmtPct = (v: number) => `${(isFinite(v) ? v : 0).toFixed(1)}%`;
 
 /** ------------------------ Composant principal ------------------------ */
-export default function StatRecouvrements({
-  affectations = [],
-  recouvrements = [],
-}: StatRecouvrementsProps) {
+export default function StatRecouvrements({ lignes = [] }: StatRecouvrementsProps) {
   /** ---------------- Filtres (état) ---------------- */
   const [selectedAnnee, setSelectedAnnee] = useState<string>("");
   const [selectedClasse, setSelectedClasse] = useState<string>("");
@@ -102,17 +80,15 @@ export default function StatRecouvrements({
   /** ---------------- Listes pour les <select> ---------------- */
   const listeAnnees = useMemo(() => {
     const an = new Set<string>();
-    for (const a of affectations) a.annee_nom && an.add(a.annee_nom);
-    for (const r of recouvrements) r.annee_nom && an.add(r.annee_nom);
+    for (const l of lignes) l.annee_nom && an.add(l.annee_nom);
     return Array.from(an).sort().reverse();
-  }, [affectations, recouvrements]);
+  }, [lignes]);
 
   const listeClasses = useMemo(() => {
     const cl = new Set<string>();
-    for (const r of recouvrements) r.classe_nom && cl.add(r.classe_nom);
-    for (const a of affectations) a.classe_nom && cl.add(a.classe_nom);
+    for (const l of lignes) l.classe_nom && cl.add(l.classe_nom);
     return Array.from(cl).sort();
-  }, [affectations, recouvrements]);
+  }, [lignes]);
 
   const listeNiveaux = useMemo(
     () => NIVEAU_CHOIX.map((n) => ({ value: n.value, label: n.label })),
@@ -124,14 +100,9 @@ export default function StatRecouvrements({
     []
   );
 
-  /** ---------------- Application des filtres ---------------- */
+  /** ---------------- Application des filtres (quelques lignes par année/classe) ---------------- */
   const match = useCallback(
-    (x: {
-      annee_nom?: string;
-      classe_nom?: string;
-      niveau_classe?: string;
-      option_classe?: string;
-    }) => {
+    (x: LigneStat) => {
       if (selectedAnnee && toKey(x.annee_nom) !== toKey(selectedAnnee)) return false;
       if (selectedClasse && toKey(x.classe_nom) !== toKey(selectedClasse)) return false;
       if (selectedNiveau && toKey(x.niveau_classe) !== toKey(selectedNiveau)) return false;
@@ -141,23 +112,11 @@ export default function StatRecouvrements({
     [selectedAnnee, selectedClasse, selectedNiveau, selectedOption]
   );
 
-  const affectationsFiltrees = useMemo(
-    () => affectations.filter((a) => match(a)),
-    [affectations, match]
-  );
-
-  const recouvFiltre = useMemo(
-    () => recouvrements.filter((r) => match(r)),
-    [recouvrements, match]
-  );
+  const lignesFiltrees = useMemo(() => lignes.filter((l) => match(l)), [lignes, match]);
 
   /** ---------------- KPI (tous liés aux filtres) ---------------- */
-  const totalAffectationsFiltrees = useMemo(() => {
-    // 👉 Comme sur ta page Affectations: total = longueur du tableau filtré
-    return affectationsFiltrees.length;
-  }, [affectationsFiltrees]);
-
   const {
+    totalAffectationsFiltrees,
     nbRecouvrementsFiltres,
     totalFrais,
     totalPaye,
@@ -165,61 +124,61 @@ export default function StatRecouvrements({
     pctPaye,
     pctRestant,
   } = useMemo(() => {
-    // 👉 Recouvrements calculés SANS lier aux affectations, mais soumis aux mêmes filtres
-    // Compte par dossier unique (affectation_id) pour éviter double-compte si plusieurs lignes
-    const setRecouv = new Set<string>();
+    let aff = 0;
+    let nb = 0;
     let frais = 0;
     let paye = 0;
-    for (const r of recouvFiltre) {
-      const id = getAffId(r);
-      if (id) setRecouv.add(id);
-      frais += Number(r.frais_total || 0);
-      paye += Number(r.montant_paye || 0);
+    for (const l of lignesFiltrees) {
+      aff += l.nb_affectations;
+      nb += l.nb_recouvrements;
+      frais += Number(l.total_frais || 0);
+      paye += Number(l.total_paye || 0);
     }
     const restant = Math.max(0, frais - paye);
     return {
-      nbRecouvrementsFiltres: setRecouv.size,
+      totalAffectationsFiltrees: aff,
+      nbRecouvrementsFiltres: nb,
       totalFrais: frais,
       totalPaye: paye,
       totalRestant: restant,
       pctPaye: frais > 0 ? (paye / frais) * 100 : 0,
       pctRestant: frais > 0 ? (restant / frais) * 100 : 0,
     };
-  }, [recouvFiltre]);
+  }, [lignesFiltrees]);
 
   /** ---------------- Données Graphiques (filtrées) ---------------- */
+  const lignesRecouv = useMemo(() => lignesFiltrees.filter((l) => l.nb_recouvrements > 0), [lignesFiltrees]);
+
   const parClasse = useMemo(() => {
     const map = new Map<string, { name: string; paye: number; restant: number; total: number }>();
-    for (const r of recouvFiltre) {
-      const key = r.classe_nom || "N/A";
+    for (const l of lignesRecouv) {
+      const key = l.classe_nom || "N/A";
       if (!map.has(key)) map.set(key, { name: key, paye: 0, restant: 0, total: 0 });
-      const m = Number(r.montant_paye || 0);
-      const f = Number(r.frais_total || 0);
       const row = map.get(key)!;
-      row.paye += m;
-      row.restant += Math.max(0, f - m);
-      row.total += f;
+      row.paye += Number(l.total_paye || 0);
+      row.total += Number(l.total_frais || 0);
+      row.restant = Math.max(0, row.total - row.paye);
     }
     return Array.from(map.values()).sort((a, b) => a.name.localeCompare(b.name));
-  }, [recouvFiltre]);
+  }, [lignesRecouv]);
 
   const parNiveau = useMemo(() => {
     const map = new Map<string, number>();
-    for (const r of recouvFiltre) {
-      const key = getNiveauLabel(r.niveau_classe);
-      map.set(key, (map.get(key) || 0) + (r.montant_paye > 0 ? 1 : 0));
+    for (const l of lignesRecouv) {
+      const key = getNiveauLabel(l.niveau_classe);
+      map.set(key, (map.get(key) || 0) + l.nb_avec_paiement);
     }
     return Array.from(map, ([name, total]) => ({ name, total }));
-  }, [recouvFiltre]);
+  }, [lignesRecouv]);
 
   const parOption = useMemo(() => {
     const map = new Map<string, number>();
-    for (const r of recouvFiltre) {
-      const key = getOptionLabel(r.option_classe);
-      map.set(key, (map.get(key) || 0) + (r.montant_paye > 0 ? 1 : 0));
+    for (const l of lignesRecouv) {
+      const key = getOptionLabel(l.option_classe);
+      map.set(key, (map.get(key) || 0) + l.nb_avec_paiement);
     }
     return Array.from(map, ([name, total]) => ({ name, total }));
-  }, [recouvFiltre]);
+  }, [lignesRecouv]);
 
   /** ---------------- Rendu ---------------- */
   return (
@@ -4,28 +4,20 @@ import React, { useState, useEffect } from 'react';
 import AuthGuard from '@/components/AuthGuard';
 import StatEleve from './StatEleves';
 import StatAffectations from './StatAffectations';
-import StatRecouvrement from './StatRecouvrement';
 import StatsRecouvrementContainer from "./StatsRecouvrementContainer";
 
 export default function DashboardPage() {
-  const [eleves, setEleves] = useState([]);
-  const [affectations, setAffectations] = useState([]);
-  const [recouvrements, setRecouvrements]= useState([]);
+  const [stats, setStats] = useState<any>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api" || "http://127.0.0.1:8000/api" || "http://beapc:8000/api";
+    const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api";
 
-    // Utilisation de Promise.all pour charger les deux sources
-    Promise.all([
-      fetch(`${apiUrl}/eleves/`).then(res => res.ok ? res.json() : []),
-      fetch(`${apiUrl}/affectations/`).then(res => res.ok ? res.json() : []),
-      fetch(`${apiUrl}/recouvrements/`).then(res => res.ok ? res.json() : []),
-    ])
-    .then(([elevesData, affData, RecData]) => {
-      setEleves(elevesData);
-      setAffectations(affData);
-      setRecouvrements(RecData);
+    // Un seul appel : tous les agrégats sont calculés par le serveur (ETag -> 304 si rien n'a changé)
+    fetch(`${apiUrl}/stats/dashboard/`)
+    .then(res => res.ok ? res.json() : null)
+    .then(data => {
+      setStats(data);
       setLoading(false);
     })
     .catch(err => {
@@ -45,15 +37,12 @@ export default function DashboardPage() {
         </div>
         
         {/* Ton code StatEleve corrigé s'affichera ici */}
-        <StatEleve eleves={eleves} />
+        <StatEleve stats={stats?.eleves} />
         
         {/* Ton code StatAffectations corrigé s'affichera ici */}
-        <StatAffectations affectations={affectations} />
+        <StatAffectations stats={stats?.affectations} />
 
-        {/* Ton code StatAffectations corrigé s'affichera ici */}
-        {/*<StatRecouvrement recouvrements={recouvrements} />*/}
-
-        <StatsRecouvrementContainer />
+        <StatsRecouvrementContainer lignes={stats?.recouvrement?.lignes} />
       </div>
     </AuthGuard>
   );
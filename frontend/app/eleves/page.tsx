@@ -32,14 +32,21 @@ export default function ElevesPage() {
 
     const fetchEleves = async () => {
         try {
-            const res = await axios.get(`${API}/eleves/?search=${search}`);
+            // Recherche : début de mot, sans accents (index côté serveur), 100 résultats au plus
+            const res = search.trim()
+                ? await axios.get(`${API}/eleves/recherche/`, { params: { q: search, limit: 100 } })
+                : await axios.get(`${API}/eleves/`);
             setEleves(res.data);
             setCurrentPage(1); // Reset Ã  la page 1 lors d'une recherche
         } 
         catch (error) { console.error("Erreur chargement Ã©lÃ¨ves:", error);}
     };
 
-    useEffect(() => { fetchEleves(); }, [search]);
+    // Une requête quand la frappe s'arrête, pas à chaque touche
+    useEffect(() => {
+        const t = setTimeout(fetchEleves, 250);
+        return () => clearTimeout(t);
+    }, [search]);
 
     // LOGIQUE PAGINATION
     const indexOfLastItem = currentPage * itemsPerPage;
@@ -188,7 +195,7 @@ export default function ElevesPage() {
                                 <tr key={eleve.id} className="hover:bg-slate-50/80 transition-colors group text-sm">
                                     <td className="p-3">
                                         <div className="flex items-center gap-3">
-                                            {eleve.photo ? <img src={eleve.photo} className="w-8 h-8 rounded-full object-cover shadow-sm" /> : 
+                                            {eleve.photo ? <img src={eleve.photo_thumb?.["64"] ?? eleve.photo} loading="lazy" className="w-8 h-8 rounded-full object-cover shadow-sm" /> : 
                                                 <div className="w-8 h-8 bg-slate-100 rounded-full flex items-center justify-center text-slate-400">
                                                     <UserCircle size={18}/>
                                                 </div>
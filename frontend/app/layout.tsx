@@ -5,16 +5,23 @@ import './globals.css';
 import { Toaster } from 'react-hot-toast';
 import { useEffect } from "react";
 import { useRouter } from "next/navigation";
+import { installerJetons } from "../lib/auth";
 
 export default function RootLayout({ children }: { children: React.ReactNode }) {
   const router = useRouter();
 
+  // Jeton d'API (Authorization: Bearer) sur toutes les requêtes axios
+  useEffect(() => {
+    installerJetons();
+  }, []);
+
   useEffect(() => {
     let timer: NodeJS.Timeout;
     const TIMEOUT = 20 * 60 * 1000; // 20 minutes
 
     const logout = () => {
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh');
       router.push("/login");
       alert("Session expirée pour inactivité.");
     };
@@ -7,6 +7,7 @@ import axios from 'axios';
 import { useRouter } from 'next/navigation';
 import toast from 'react-hot-toast';
 import { User, Lock, Eye, EyeOff, Loader2, ArrowRight } from 'lucide-react';
+import { enregistrerJetons } from '../../lib/auth';
 
 export default function LoginPage() {
   const [username, setUsername] = useState('');
@@ -31,6 +32,7 @@ export default function LoginPage() {
       const res = await axios.post(`${API_URL}/login/`, { username, password });
       const userData = res.data.user || res.data;
       localStorage.setItem('user', JSON.stringify(userData));
+      enregistrerJetons(res.data);
       
       const displayName = userData.prenom || userData.first_name || userData.username || "Utilisateur";
       toast.success(`Bienvenue, ${displayName} !`);
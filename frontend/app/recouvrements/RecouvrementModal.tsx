@@ -12,9 +12,11 @@ interface RecouvrementModalProps {
   onClose: () => void;
   onSuccess?: () => void;
   // On attend un objet recouvrement (ou au moins { id }).
-  recouvrement?: any; // { id, affectation, affectation_details, frais_paiement, v1..v12, d1..d12, reduction, statut_ar, montant_statut_ar, ... }
+  recouvrement?: any; // { id, affectation, affectation_details, frais_paiement, total_paye, versements, reduction, statut_ar, montant_statut_ar, ... }
 }
 
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api";
+
 const STATUT_OPTIONS = [
   { value: "Ins", label: "Inscription" },
   { value: "Reins", label: "Réinscription" },
@@ -44,7 +46,6 @@ export default function RecouvrementModal({
     const fetchRec = async () => {
       if (!recId || !isOpen) return;
       try {
-        const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api" || "http://127.0.0.1:8000/api" || "http://beapc:8000/api";
         const { data } = await axios.get(`${API_URL}/recouvrements/${recId}/`);
         setRec(data);
       } catch (e) {
@@ -75,23 +76,20 @@ export default function RecouvrementModal({
       reduction: Number(rec.reduction ?? 0), // 0-100
       statut_ar: rec.statut_ar ?? "Aut",
       montant_statut_ar: Number(rec.montant_statut_ar ?? 0),
-      // versements
-      ...Array.from({ length: 12 }).reduce((acc: Record<string, number | string>, _, i) => {
-        const n = i + 1;
-        acc[`v${n}`] = Number(rec[`v${n}`] ?? 0);
-        acc[`d${n}`] = rec[`d${n}`] ?? "";
-        return acc;
-      }, {}),
     });
   }, [rec]);
 
+  // Nouveau versement (ajouté au journal, sans renvoyer tout le dossier)
+  const [nouveauVersement, setNouveauVersement] = useState<{ montant: number; date_versement: string }>({
+    montant: 0,
+    date_versement: new Date().toISOString().slice(0, 10),
+  });
+  const [ajoutEnCours, setAjoutEnCours] = useState(false);
+
   // ----- 3) Dérivés (affichage) -----
   const fraisTotal = Number(rec?.frais_paiement ?? 0);
-  const totalPaye = useMemo(() => {
-    let s = 0;
-    for (let i = 1; i <= 12; i++) s += Number(formData?.[`v${i}`] ?? 0);
-    return s;
-  }, [formData]);
+  const totalPaye = Number(rec?.total_paye ?? 0); // calculé par le serveur à partir du journal
+  const versements: any[] = useMemo(() => rec?.versements ?? [], [rec]);
   const resteAPayer = Math.max(0, fraisTotal - totalPaye);
 
   // ----- 4) Handlers -----
@@ -100,9 +98,7 @@ export default function RecouvrementModal({
   ) => {
     const { name, value } = e.target;
 
-    if (/^v\d{1,2}$/.test(name)) {
-      setFormData((prev: any) => ({ ...prev, [name]: Number(value || 0) }));
-    } else if (name === "reduction" || name === "montant_statut_ar") {
+    if (name === "reduction" || name === "montant_statut_ar") {
       // nombres simples
       const asNum = Number(value || 0);
       setFormData((prev: any) => ({ ...prev, [name]: asNum }));
@@ -127,11 +123,7 @@ export default function RecouvrementModal({
         statut_ar: formData.statut_ar ?? "Aut",
         montant_statut_ar: Number(formData.montant_statut_ar ?? 0),
       };
-      for (let i = 1; i <= 12; i++) {
-        payload[`v${i}`] = Number(formData[`v${i}`] ?? 0);
-        payload[`d${i}`] = formData[`d${i}`] || null; // string ISO ou null
-      }
-      await axios.patch(`${process.env.NEXT_PUBLIC_API_URL}/recouvrements/${formData.id}/`, payload);
+      await axios.patch(`${API_URL}/recouvrements/${formData.id}/`, payload);
       toast.success("Recouvrement enregistré");
       onSuccess?.();
       onClose();
@@ -143,6 +135,26 @@ export default function RecouvrementModal({
     }
   };
 
+  const handleAjoutVersement = async () => {
+    if (!recId || !(nouveauVersement.montant > 0)) return;
+    setAjoutEnCours(true);
+    try {
+      const { data } = await axios.post(`${API_URL}/recouvrements/${recId}/versements/`, {
+        montant: nouveauVersement.montant,
+        date_versement: nouveauVersement.date_versement || null,
+      });
+      setRec(data);
+      setNouveauVersement((prev) => ({ ...prev, montant: 0 }));
+      toast.success("Versement ajouté");
+      onSuccess?.();
+    } catch (e: any) {
+      console.error(e?.response?.data || e);
+      toast.error("Erreur lors de l’ajout du versement");
+    } finally {
+      setAjoutEnCours(false);
+    }
+  };
+
   // ----- 5) Rendu -----
   if (!isOpen) return null;
   if (!rec) {
@@ -202,7 +214,7 @@ export default function RecouvrementModal({
             onClick={() => setActiveTab("versements")}
             className={`pb-3 text-sm font-bold transition-all ${activeTab === "versements" ? "border-b-2 border-blue-600 text-blue-600" : "text-zinc-400"}`}
           >
-            Versements (v1 - v12)
+            Versements ({versements.length})
           </button>
           <button
             onClick={() => setActiveTab("tuteur")}
@@ -318,35 +330,54 @@ export default function RecouvrementModal({
                 <div className="col-span-5">Date de Versement</div>
               </div>
               <div className="space-y-3">
-                {Array.from({ length: 12 }).map((_, i) => {
-                  const num = i + 1;
-                  return (
-                    <div key={num} className="grid grid-cols-12 gap-3 items-center bg-zinc-50 p-2 rounded-xl border border-zinc-100">
-                      <div className="col-span-1 text-center font-black text-zinc-400 text-sm">v{num}</div>
-                      <div className="col-span-6 relative">
-                        <Wallet className="absolute left-3 top-1/2 -translate-y-1/2 text-zinc-400" size={14} />
-                        <input
-                          type="number"
-                          name={`v${num}`}
-                          value={formData[`v${num}`] ?? 0}
-                          onChange={handleChange}
-                          className="w-full pl-9 pr-3 py-2 bg-white border border-zinc-200 rounded-lg text-sm outline-none focus:ring-2 focus:ring-blue-500"
-                          min={0}
-                        />
-                      </div>
-                      <div className="col-span-5 relative">
-                        <Calendar className="absolute left-3 top-1/2 -translate-y-1/2 text-zinc-400" size={14} />
-                        <input
-                          type="date"
-                          name={`d${num}`}
-                          value={formData[`d${num}`] || ""}
-                          onChange={handleChange}
-                          className="w-full pl-9 pr-3 py-2 bg-white border border-zinc-200 rounded-lg text-sm outline-none focus:ring-2 focus:ring-blue-500"
-                        />
-                      </div>
+                {versements.map((v: any, i: number) => (
+                  <div key={v.id} className="grid grid-cols-12 gap-3 items-center bg-zinc-50 p-2 rounded-xl border border-zinc-100">
+                    <div className="col-span-1 text-center font-black text-zinc-400 text-sm">{i + 1}</div>
+                    <div className="col-span-6 flex items-center gap-2 text-sm font-bold text-slate-700">
+                      <Wallet className="text-zinc-400" size={14} /> {Number(v.montant).toLocaleString()} FG
+                    </div>
+                    <div className="col-span-5 flex items-center gap-2 text-sm text-zinc-600">
+                      <Calendar className="text-zinc-400" size={14} /> {v.date_versement || "—"}
                     </div>
-                  );
-                })}
+                  </div>
+                ))}
+                {versements.length === 0 && (
+                  <p className="text-sm text-zinc-400 px-2">Aucun versement enregistré.</p>
+                )}
+
+                {/* Ajout d'un versement */}
+                <div className="grid grid-cols-12 gap-3 items-center bg-blue-50 p-2 rounded-xl border border-blue-100">
+                  <div className="col-span-1 text-center font-black text-blue-400 text-sm">+</div>
+                  <div className="col-span-5 relative">
+                    <Wallet className="absolute left-3 top-1/2 -translate-y-1/2 text-zinc-400" size={14} />
+                    <input
+                      type="number"
+                      min={0}
+                      value={nouveauVersement.montant}
+                      onChange={(e) => setNouveauVersement((prev) => ({ ...prev, montant: Number(e.target.value || 0) }))}
+                      className="w-full pl-9 pr-3 py-2 bg-white border border-zinc-200 rounded-lg text-sm outline-none focus:ring-2 focus:ring-blue-500"
+                    />
+                  </div>
+                  <div className="col-span-4 relative">
+                    <Calendar className="absolute left-3 top-1/2 -translate-y-1/2 text-zinc-400" size={14} />
+                    <input
+                      type="date"
+                      value={nouveauVersement.date_versement}
+                      onChange={(e) => setNouveauVersement((prev) => ({ ...prev, date_versement: e.target.value }))}
+                      className="w-full pl-9 pr-3 py-2 bg-white border border-zinc-200 rounded-lg text-sm outline-none focus:ring-2 focus:ring-blue-500"
+                    />
+                  </div>
+                  <div className="col-span-2">
+                    <button
+                      type="button"
+                      onClick={handleAjoutVersement}
+                      disabled={ajoutEnCours || !(nouveauVersement.montant > 0)}
+                      className="w-full py-2 bg-blue-600 text-white rounded-lg text-sm font-bold hover:bg-blue-700 transition-all disabled:opacity-50"
+                    >
+                      {ajoutEnCours ? "..." : "Ajouter"}
+                    </button>
+                  </div>
+                </div>
               </div>
             </div>
           )}
@@ -3,7 +3,6 @@
 import axios from "axios";
 import {Search, FileText, Download, Wallet, CheckCircle2,Edit, MessageCircleWarning, AlertCircle, Trash2, ChevronLeft, ChevronRight, FileSpreadsheet,} from "lucide-react";
 import DashboardLayout from "../dashboard/layout";
-import * as XLSX from "xlsx";
 import jsPDF from "jspdf";
 import autoTable from "jspdf-autotable";
 import RecouvrementModal from "./RecouvrementModal";
@@ -23,6 +22,9 @@ interface Recouvrement {
     affectation_details?: AffectationDetails;
 }
 
+// Fallback automatique si la variable NEXT_PUBLIC_API_URL n'est pas définie
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api";
+
 /* ====================== Helpers ====================== */
 function toNumber(n: number | string | undefined | null): number {
     const x = Number(n);
@@ -64,24 +66,35 @@ export default function RecouvrementsPage() {
     const [selectedRecouvrement, setSelectedRecouvrement] = useState<any>(null);
     const [isModalOpen, setIsModalOpen] = useState(false);
 
-    // --- Pagination (ajout) ---
+    // --- Pagination (côté serveur) ---
     const [currentPage, setCurrentPage] = useState(1);
     const itemsPerPage = 25;
+    const [totalCount, setTotalCount] = useState(0);
+    const [kpiServeur, setKpiServeur] = useState<any>(null);
+    const [annees, setAnnees] = useState<any[]>([]);
+    const [classes, setClasses] = useState<any[]>([]);
+
+    // Filtres envoyés à /api/recouvrements/ (filtrage, recherche et KPI calculés par le serveur)
+    const filtres = React.useMemo(() => {
+        const params: Record<string, string> = {};
+        if (searchTerm.trim()) params.search = searchTerm.trim();
+        if (filterAnnee) params.annee = filterAnnee;
+        if (filterClasse) params.classe = filterClasse;
+        if (filterStatut) params.statut_paiement = filterStatut;
+        return params;
+    }, [searchTerm, filterAnnee, filterClasse, filterStatut]);
 
     // --- 2. FETCH ---
 const fetchData = useCallback(async () => {
   setLoading(true);
 
-  // Fallback automatique si la variable NEXT_PUBLIC_API_URL n'est pas définie
-  const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api" || "http://127.0.0.1:8000/api" || "http://beapc:8000/api";
-
   try {
-    const res = await axios.get(`${API_URL}/recouvrements/`);
-    const data = res.data?.results ? res.data.results : res.data;
-    
-    if (Array.isArray(data)) {
-      setRecouvrements(data);
-    }
+    const res = await axios.get(`${API_URL}/recouvrements/`, {
+      params: { ...filtres, page: currentPage, page_size: itemsPerPage },
+    });
+    setRecouvrements(res.data?.results ?? []);
+    setTotalCount(res.data?.count ?? 0);
+    setKpiServeur(res.data?.kpi ?? null);
   } 
   catch (error) {
     console.error("Erreur lors du chargement", error);
@@ -89,102 +102,70 @@ const fetchData = useCallback(async () => {
   finally {
     setLoading(false);
   }
-}, []);
-    useEffect(() => { fetchData(); }, [fetchData]);
-
-    // --- 3. FILTRAGE ---
-    const filteredData = recouvrements.filter((item) => {
-        const nomEleve = item.affectation_details?.eleve_fullname || "";
-        const annee = item.affectation_details?.annee_nom || "";
-        const classe = item.affectation_details?.classe_lib || "";
-
-        const total = toNumber(item.frais_paiement);
-        const totalPaye = toNumber(item.total_paye);
-        const reste = Math.max(0, total - totalPaye);
-
-        //const matchesSearch = nomEleve.toLowerCase().includes(searchTerm.toLowerCase());
-        const matchesSearch =
-            nomEleve.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            (item.affectation_details?.eleve_matricule ?? "")
-                .toLowerCase()
-                .includes(searchTerm.toLowerCase());
-
-        const matchesAnnee = filterAnnee === "" || annee === filterAnnee;
-        const matchesClasse = filterClasse === "" || classe === filterClasse;
-
-        let matchesStatut = true;
-        if (filterStatut === "Aucun_Paiement") matchesStatut = (reste === total);
-        if (filterStatut === "en_cours") matchesStatut = reste > 0 && reste !== total;
-        if (filterStatut === "termine") matchesStatut = reste <= 0;
-        
-
-        return matchesSearch && matchesAnnee && matchesClasse && matchesStatut;
-    });
+}, [filtres, currentPage]);
+
+    // Petit délai pour ne pas lancer une requête à chaque frappe dans la recherche
+    useEffect(() => {
+        const t = setTimeout(fetchData, 250);
+        return () => clearTimeout(t);
+    }, [fetchData]);
+
+    // Listes des filtres (tables de référence non paginées)
+    useEffect(() => {
+        Promise.all([axios.get(`${API_URL}/annees/`), axios.get(`${API_URL}/classes/`)])
+            .then(([a, c]) => { setAnnees(a.data); setClasses(c.data); })
+            .catch((error) => console.error("Erreur lors du chargement des filtres", error));
+    }, []);
+
+    // Exports : toute la sélection filtrée (sans pagination)
+    const fetchSelection = async (): Promise<Recouvrement[]> => {
+        const res = await axios.get(`${API_URL}/recouvrements/`, { params: filtres });
+        return Array.isArray(res.data) ? res.data : res.data?.results ?? [];
+    };
 
-    // --- 3bis. KPIs dérivés sur les données filtrées ---
-    const kpi = React.useMemo(() => {
-        const count = filteredData.length;
-        let totalFrais = 0;
-        let totalEncaisse = 0;
-        let totalRestant = 0;
+    // --- 3. KPIs de la sélection filtrée (calculés par le serveur) ---
+    const kpi = {
+        count: kpiServeur?.count ?? 0,
+        totalFrais: kpiServeur?.total_frais ?? 0,
+        totalEncaisse: kpiServeur?.total_paye ?? 0,
+        totalRestant: kpiServeur?.total_restant ?? 0,
+        pctEncaisse: kpiServeur?.pct_paye ?? 0,
+        pctRestant: kpiServeur?.pct_restant ?? 0,
+    };
 
-        for (const item of filteredData) {
-            const total = toNumber(item.frais_paiement);
-            const paye = toNumber(item.total_paye);
-            totalFrais += total;
-            totalEncaisse += paye;
-            totalRestant += Math.max(0, total - paye);
-        }
-
-        const pctEncaisse = totalFrais > 0 ? totalEncaisse / totalFrais : 0;
-        const pctRestant = totalFrais > 0 ? totalRestant / totalFrais : 0;
-        return { count, totalFrais, totalEncaisse, totalRestant, pctEncaisse, pctRestant };
-    }, [filteredData]);
-
-    // Helper pour pourcentage à 1 décimale
-    const fmtPct = (x: number) => `${(Math.round(x * 1000) / 10).toLocaleString()}%`;
-
-    // --- Pagination: calcul pages + slice ---
-    const totalPages = Math.ceil(filteredData.length / itemsPerPage);
-    const paginatedData = React.useMemo(() => {
-        const start = (currentPage - 1) * itemsPerPage;
-        return filteredData.slice(start, start + itemsPerPage);
-    }, [filteredData, currentPage]);
+    // Helper pour pourcentage (déjà en %, 0-100) à 1 décimale
+    const fmtPct = (x: number) => `${(Math.round(x * 10) / 10).toLocaleString()}%`;
+
+    const totalPages = Math.ceil(totalCount / itemsPerPage);
 
     // Reset page à 1 lorsque les filtres/recherche changent
     useEffect(() => { setCurrentPage(1); }, [searchTerm, filterAnnee, filterClasse, filterStatut]);
 
     // --- 4. EXPORTS ---
     /* **************** ECXEL **************** */
-    const exportExcel = () => {
-        const data = filteredData.map((item) => {
-            const total = toNumber(item.frais_paiement);
-            const totalPaye = toNumber(item.total_paye);
-            const reste = Math.max(0, total - totalPaye);
-
-            return {
-            "Élève": item.affectation_details?.eleve_fullname,
-            "Classe": item.affectation_details?.classe_lib,
-            "Année": item.affectation_details?.annee_nom,
-            "Frais": total,
-            "Payé": totalPaye,
-            "Reste": reste,
-            "Statut": reste <= 0 ? "TERMINÉ" : reste === total ? "AUCUN PAIEMENT" : reste > total ? "EN COURS" : "EN COURS", };
-        });
-        const ws = XLSX.utils.json_to_sheet(data);
-        const wb = XLSX.utils.book_new();
-        XLSX.utils.book_append_sheet(wb, ws, "Recouvrements");
-        XLSX.writeFile(wb, "Recouvrements.xlsx");
+    // Fichier généré et envoyé en flux par le serveur (/api/exports/), mêmes filtres que la liste
+    // Export réservé aux utilisateurs connectés : téléchargé par axios (en-tête Authorization),
+    // une navigation (window.location) ne transmettrait pas le jeton.
+    const exportExcel = async () => {
+        const res = await axios.get(`${API_URL}/exports/recouvrements.xlsx`, { params: filtres, responseType: "blob" });
+        const url = URL.createObjectURL(res.data);
+        const lien = document.createElement("a");
+        lien.href = url;
+        lien.download = "recouvrements.xlsx";
+        document.body.appendChild(lien);
+        lien.click();
+        lien.remove();
+        URL.revokeObjectURL(url);
     };
     /* **************** PDF **************** */
-    const exportPDF = () => {
+    const exportPDF = async () => {
         const formatNumber = (n: number) =>
         new Intl.NumberFormat("fr-FR", { maximumFractionDigits: 0 })
             .format(n)
             // 🔧 On remplace les espaces insécables (U+202F et U+00A0) par un espace normal
             .replace(/\u202F|\u00A0/g, " ");
 
-        const rows = filteredData.map((item) => {
+        const rows = (await fetchSelection()).map((item) => {
             const total = toNumber(item.frais_paiement);
             const totalPaye = toNumber(item.total_paye);
             const reste = Math.max(0, total - totalPaye);
@@ -216,10 +197,6 @@ const fetchData = useCallback(async () => {
         return <div className="p-10 text-center font-bold text-blue-600 animate-pulse">Chargement des données...</div>;
     }
 
-    const totalEncaisse = recouvrements
-        .reduce((acc, curr) => acc + toNumber(curr.total_paye), 0)
-        .toLocaleString();
-
     return (
         <DashboardLayout>
             <div className="p-1 space-y-3">
@@ -257,8 +234,8 @@ const fetchData = useCallback(async () => {
                                 value={filterAnnee} onChange={(e) => setFilterAnnee(e.target.value)}
                             >
                                 <option value="">Toutes les années</option>
-                                {[...new Set(recouvrements.map(item => item.affectation_details?.annee_nom).filter(Boolean))].map((an: any) => (
-                                    <option key={an} value={an}>{an}</option>
+                                {annees.map((an: any) => (
+                                    <option key={an.id} value={an.annee_scolaire}>{an.annee_scolaire}</option>
                                 ))}
                             </select>
 
@@ -268,8 +245,8 @@ const fetchData = useCallback(async () => {
                                 value={filterClasse} onChange={(e) => setFilterClasse(e.target.value)}
                             >
                                 <option value="">Toutes les classes</option>
-                                {[...new Set(recouvrements.map(item => item.affectation_details?.classe_lib).filter(Boolean))].map((cl: any) => (
-                                    <option key={cl} value={cl}>{cl}</option>
+                                {classes.map((cl: any) => (
+                                    <option key={cl.id} value={cl.id}>{cl.lib_classe}</option>
                                 ))}
                             </select>
                             
@@ -304,7 +281,7 @@ const fetchData = useCallback(async () => {
                             </tr>
                         </thead>
                         <tbody className="divide-y divide-zinc-200">
-                            {paginatedData.map((item) => {
+                            {recouvrements.map((item) => {
                                 const total = toNumber(item.frais_paiement);
                                 const totalPaye = toNumber(item.total_paye);
                                 const reste = Math.max(0, total - totalPaye);
@@ -350,9 +327,9 @@ const fetchData = useCallback(async () => {
                         {/* Affichage X - Y sur Z */}
                         <div className="text-xs text-slate-500">
                             Affichage <span className=""> 
-                            {filteredData.length > 0 ? (currentPage - 1) * itemsPerPage + 1 : 0}
-                            </span>{" "} - <span className="">{Math.min(currentPage * itemsPerPage, filteredData.length)}</span> 
-                            sur <span className="">{filteredData.length}</span>
+                            {totalCount > 0 ? (currentPage - 1) * itemsPerPage + 1 : 0}
+                            </span>{" "} - <span className="">{Math.min(currentPage * itemsPerPage, totalCount)}</span> 
+                            sur <span className="">{totalCount}</span>
                         </div>
                         {/* Boutons de pagination */}
                         <div className="flex items-center gap-2">
@@ -1,6 +1,50 @@
+import axios from "axios";
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api";
+
+/** Jetons renvoyés par /login/ et /token/refresh/ : { access, refresh, expires_in } */
+export const enregistrerJetons = (data: { access?: string; refresh?: string }) => {
+    if (typeof window === 'undefined' || !data?.access) return;
+    localStorage.setItem('token', data.access);
+    if (data.refresh) localStorage.setItem('refresh', data.refresh);
+    axios.defaults.headers.common['Authorization'] = `Bearer ${data.access}`;
+};
+
+let intercepteurInstalle = false;
+
+/** En-tête Authorization sur toutes les requêtes axios + rafraîchissement automatique sur 401 */
+export const installerJetons = () => {
+    if (typeof window === 'undefined') return;
+    const access = localStorage.getItem('token');
+    if (access) axios.defaults.headers.common['Authorization'] = `Bearer ${access}`;
+    if (intercepteurInstalle) return;
+    intercepteurInstalle = true;
+
+    axios.interceptors.response.use(undefined, async (error) => {
+        const requete = error?.config;
+        const refresh = localStorage.getItem('refresh');
+        if (error?.response?.status !== 401 || !refresh || !requete || requete._reessai || requete.url?.includes('/token/refresh/')) {
+            throw error;
+        }
+        requete._reessai = true;
+        try {
+            const { data } = await axios.post(`${API_URL}/token/refresh/`, { refresh });
+            enregistrerJetons(data);
+            requete.headers['Authorization'] = `Bearer ${data.access}`;
+            return axios(requete);
+        } catch {
+            logout();
+            throw error;
+        }
+    });
+};
+
 export const logout = () => {
     if (typeof window !== 'undefined') {
         localStorage.removeItem('user');
+        localStorage.removeItem('token');
+        localStorage.removeItem('refresh');
+        delete axios.defaults.headers.common['Authorization'];
         window.location.href = '/login';
     }
-};
\ No newline at end of file
+};